@@ -0,0 +1,68 @@
+"""
+Socle commun des applications de challenges web
+- pages statiques: template compilé et rendu une seule fois au démarrage,
+  servies avec ETag (réponse 304 si inchangée), Cache-Control et une version
+  gzip précompressée
+- pages dynamiques: template compilé une seule fois, seul le rendu a lieu à
+  chaque requête (render_template_string recompile le template à chaque appel)
+- /health pour Docker et Traefik
+
+En production l'application tourne sous gunicorn (gunicorn.conf.py), chargée
+une fois avant le fork des workers.
+"""
+
+import os
+import gzip
+
+from flask import Flask, Response, request
+from werkzeug.http import generate_etag
+
+# Durée de cache navigateur/proxy des pages statiques (secondes)
+CACHE_MAX_AGE = int(os.getenv('CHALLENGE_CACHE_MAX_AGE', '300'))
+
+
+class StaticPage:
+    """Page rendue une fois, gardée en mémoire brute et gzip"""
+
+    def __init__(self, body, content_type='text/html; charset=utf-8'):
+        self.body = body.encode('utf-8') if isinstance(body, str) else body
+        self.gzipped = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.content_type = content_type
+        self.etag = generate_etag(self.body)
+
+    def response(self):
+        use_gzip = request.accept_encodings['gzip'] > 0 and len(self.gzipped) < len(self.body)
+        response = Response(self.gzipped if use_gzip else self.body, content_type=self.content_type)
+        if use_gzip:
+            response.content_encoding = 'gzip'
+            response.set_etag(f"{self.etag}-gz")
+        else:
+            response.set_etag(self.etag)
+        response.vary.add('Accept-Encoding')
+        response.cache_control.public = True
+        response.cache_control.max_age = CACHE_MAX_AGE
+        return response.make_conditional(request)
+
+
+def create_app(name):
+    """Application Flask d'un challenge, avec /health"""
+    app = Flask(name)
+
+    @app.route('/health')
+    def health():
+        """Health check endpoint"""
+        return {'status': 'ok'}, 200
+
+    return app
+
+
+def static_page(app, rule, source, endpoint=None, **context):
+    """Rendre le template `source` une seule fois avec `context` et le servir sur `rule`"""
+    page = StaticPage(app.jinja_env.from_string(source).render(**context))
+    app.add_url_rule(rule, endpoint or rule, page.response)
+    return page
+
+
+def compile_template(app, source):
+    """Template compilé une seule fois: appeler .render(**context) dans la vue"""
+    return app.jinja_env.from_string(source)
@@ -0,0 +1,27 @@
+"""
+Configuration gunicorn partagée par les challenges web
+Workers gthread (les requêtes lentes d'une équipe ne bloquent pas les autres),
+application chargée une fois avant le fork (templates compilés, pages rendues).
+"""
+
+import os
+import multiprocessing
+
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+
+# Plafonné: le conteneur voit tous les CPU de l'hôte
+workers = int(os.getenv('WEB_CONCURRENCY', min(multiprocessing.cpu_count() * 2 + 1, 8)))
+worker_class = 'gthread'
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+
+preload_app = True
+keepalive = 5
+timeout = 30
+graceful_timeout = 10
+
+# Recycler les workers régulièrement (fuites mémoire du code des challenges)
+max_requests = 10000
+max_requests_jitter = 1000
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG') or None
+errorlog = '-'
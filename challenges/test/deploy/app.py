@@ -1,9 +1,13 @@
 #!/usr/bin/env python3
+"""
+Challenge de test - page statique rendue une seule fois (socle challenges/common)
+Production: gunicorn -c gunicorn.conf.py app:app
+Local: PYTHONPATH=challenges/common python challenges/test/deploy/app.py
+"""
 
+from ace_challenge import create_app, static_page
 
-from flask import Flask, render_template_string
-
-app = Flask(__name__)
+app = create_app(__name__)
 
 # Le flag du challenge
 FLAG = "ACE{bienvenue_sur_la_plateforme_ctf}"
@@ -158,15 +162,8 @@ HTML_TEMPLATE = """
 </html>
 """
 
-@app.route('/')
-def index():
-    """Page principale du challenge"""
-    return render_template_string(HTML_TEMPLATE, flag=FLAG)
-
-@app.route('/health')
-def health():
-    """Health check endpoint"""
-    return {'status': 'ok'}, 200
+# Page principale du challenge: le flag ne change pas, elle est rendue au démarrage
+static_page(app, '/', HTML_TEMPLATE, endpoint='index', flag=FLAG)
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=False)
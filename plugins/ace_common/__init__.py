@@ -0,0 +1,135 @@
+"""
+Plugin ace_common - Utilitaires partagés par les plugins ACE 2025
+Fournit la connexion Redis commune (outbox des scores, etc.), la
+limitation de débit (ratelimit.py), l'utilisateur courant mémorisé par
+requête (user.py), l'initialisation différée des plugins (warmup.py), les
+métriques Prometheus (metrics.py), le profilage des requêtes et des jobs
+(profiling.py) et la découverte des challenge.yml (challenge_files.py)
+"""
+
+import os
+import logging
+
+from . import warmup
+from .warmup import timed_load
+
+# Chargé en premier (ordre alphabétique): configuration unique du logging pour tous les plugins
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Configuration
+REDIS_URL = os.getenv('REDIS_URL', '')
+# Token du scraper Prometheus pour /metrics (sinon réservé aux admins)
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Client Redis partagé (créé à la première utilisation)
+_redis_client = None
+
+
+def get_redis():
+    """
+    Retourner le client Redis partagé, ou None si REDIS_URL n'est pas défini
+    Les réponses sont décodées en str
+    """
+    global _redis_client
+
+    if _redis_client is None and REDIS_URL:
+        import redis
+        _redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+
+    return _redis_client
+
+
+@timed_load
+def load(app):
+    """Charger le plugin dans CTFd"""
+    import hmac
+    from flask import Blueprint, Response, request, send_from_directory, abort
+    from CTFd.utils.decorators import admins_only
+    from .ratelimit import limiters
+    from .user import is_admin_cached
+    from . import metrics, profiling
+
+    metrics.gauge(
+        'ace_rate_limit_throttled',
+        "Requêtes refusées par limiteur (tous workers avec Redis)",
+        lambda: {(('limiter', name),): limiter.throttled_count() for name, limiter in limiters.items()}
+    )
+    metrics.gauge(
+        'ace_plugin_load_milliseconds',
+        "Temps de chargement des plugins dans le worker qui répond",
+        lambda: {(('plugin', name),): elapsed for name, elapsed in warmup.load_timings.items()}
+    )
+
+    blueprint = Blueprint('ace_common', __name__, url_prefix='/admin/ace')
+
+    @blueprint.route('/rate-limits', methods=['GET'])
+    @admins_only
+    def rate_limit_stats():
+        """Configuration des limiteurs et nombre de requêtes refusées"""
+        return {
+            'success': True,
+            'data': {
+                name: {
+                    'burst': limiter.burst,
+                    'refill_rate': limiter.refill_rate,
+                    'throttled': limiter.throttled_count()
+                }
+                for name, limiter in limiters.items()
+            }
+        }
+
+    @blueprint.route('/startup', methods=['GET'])
+    @admins_only
+    def startup_stats():
+        """Temps de chargement et d'initialisation différée des plugins (ms)"""
+        return {
+            'success': True,
+            'data': {
+                'pid': os.getpid(),
+                'leader': warmup.is_leader(),
+                'load_ms': warmup.load_timings,
+                'warmup_ms': warmup.warmup_timings
+            }
+        }
+
+    @blueprint.route('/profiles', methods=['GET'])
+    @admins_only
+    def profile_stats():
+        """Dernières requêtes et jobs lents de ce worker, profils échantillonnés disponibles"""
+        return {
+            'success': True,
+            'data': {
+                'pid': os.getpid(),
+                'slow_ms': profiling.SLOW_MS,
+                'job_slow_ms': profiling.JOB_SLOW_MS,
+                'slow': list(profiling.recent_slow),
+                'dumps': profiling.list_dumps()
+            }
+        }
+
+    @blueprint.route('/profiles/<name>', methods=['GET'])
+    @admins_only
+    def profile_dump(name):
+        """Profil échantillonné (format folded)"""
+        if not name.endswith('.folded'):
+            abort(404)
+        return send_from_directory(profiling.PROFILE_DIR, name, mimetype='text/plain')
+
+    metrics_blueprint = Blueprint('ace_metrics', __name__)
+
+    @metrics_blueprint.route('/metrics', methods=['GET'])
+    def metrics_endpoint():
+        """Métriques au format texte Prometheus (Bearer METRICS_TOKEN ou session admin)"""
+        authorization = request.headers.get('Authorization', '')
+        token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(authorization, f"Bearer {METRICS_TOKEN}")
+        if not token_ok and not is_admin_cached():
+            return Response('Forbidden\n', status=403, mimetype='text/plain')
+
+        return Response(metrics.registry.render(), mimetype='text/plain; version=0.0.4')
+
+    app.register_blueprint(blueprint)
+    app.register_blueprint(metrics_blueprint)
+    profiling.init_app(app)
+    warmup.start(app)
+    logger.info("Plugin ace_common chargé")
@@ -0,0 +1,38 @@
+"""
+Découverte des challenge.yml montés dans le conteneur CTFd
+Mêmes règles que scripts/challenge_loader.py (import, archive): les
+plugins voient exactement les challenges que les scripts importent.
+"""
+
+import os
+
+
+def find_challenge_files(base_path):
+    """
+    Trouver tous les fichiers challenge.yml
+    Les dossiers cachés et le contenu d'un dossier de challenge (sources,
+    déploiement, pièces jointes) ne sont pas parcourus.
+    """
+    challenge_files = []
+    pending = [str(base_path)]
+
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if entry.name == 'challenge.yml' and entry.is_file():
+                challenge_files.append(entry.path)
+                subdirs = None
+                break
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                subdirs.append(entry.path)
+
+        if subdirs:
+            pending.extend(subdirs)
+
+    return sorted(challenge_files)
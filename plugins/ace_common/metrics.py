@@ -0,0 +1,290 @@
+"""
+Métriques des plugins au format texte Prometheus
+Compteurs et histogrammes accumulés en mémoire dans chaque worker puis
+additionnés dans un hash Redis (un HINCRBYFLOAT par série, toutes les
+FLUSH_SECONDS et avant chaque lecture); sans Redis, /metrics ne montre que le
+worker qui répond. Les jauges sont des fonctions évaluées à la lecture.
+"""
+
+import os
+import re
+import time
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+from . import get_redis, profiling
+
+logger = logging.getLogger(__name__)
+
+METRICS_KEY = 'ace:metrics'
+FLUSH_SECONDS = float(os.getenv('METRICS_FLUSH_SECONDS', '10'))
+
+# Bornes par défaut des histogrammes de durée (secondes)
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+_ID_SEGMENT = re.compile(r'/(?:[0-9a-fA-F-]{36}|\d+)(?=/|$)')
+_LE_LABEL = re.compile(r',?le="([^"]+)"')
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    parts = []
+    for name, value in labels:
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        parts.append(f'{name}="{value}"')
+    return '{' + ','.join(parts) + '}'
+
+
+def _series_key(series):
+    """Tri des séries: par labels, puis buckets par borne croissante"""
+    match = _LE_LABEL.search(series)
+    bound = float(match.group(1)) if match else float('inf')
+    return _LE_LABEL.sub('', series), bound
+
+
+def _format_value(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Registry:
+    """Séries en attente d'envoi, déclarations des métriques et jauges"""
+
+    def __init__(self):
+        self.metrics = {}       # nom -> métrique (ordre de déclaration)
+        self.gauges = {}        # nom -> (aide, fonction retournant {labels: valeur} ou une valeur)
+        self._pending = {}      # série -> incrément
+        self._local = {}        # série -> total (sans Redis)
+        self._lock = threading.Lock()
+        self._flusher = None
+
+    def add(self, series, amount):
+        with self._lock:
+            self._pending[series] = self._pending.get(series, 0.0) + amount
+        self._ensure_flusher()
+
+    def flush(self):
+        """Additionner les séries en attente dans Redis"""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+
+        if not pending:
+            return
+
+        redis_client = get_redis()
+        if redis_client is None:
+            with self._lock:
+                for series, amount in pending.items():
+                    self._local[series] = self._local.get(series, 0.0) + amount
+            return
+
+        try:
+            pipe = redis_client.pipeline(transaction=False)
+            for series, amount in pending.items():
+                pipe.hincrbyfloat(METRICS_KEY, series, amount)
+            pipe.execute()
+        except Exception as e:
+            # Remises en attente pour le prochain envoi
+            logger.error(f"Envoi des métriques à Redis échoué: {e}")
+            with self._lock:
+                for series, amount in pending.items():
+                    self._pending[series] = self._pending.get(series, 0.0) + amount
+
+    def _ensure_flusher(self):
+        if self._flusher is not None:
+            return
+        with self._lock:
+            if self._flusher is not None:
+                return
+            self._flusher = threading.Thread(target=self._flush_loop, name='metrics-flush', daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self):
+        while True:
+            time.sleep(FLUSH_SECONDS)
+            self.flush()
+
+    def values(self):
+        """Toutes les séries {série: valeur}"""
+        self.flush()
+
+        redis_client = get_redis()
+        if redis_client is not None:
+            try:
+                return {series: float(value) for series, value in redis_client.hgetall(METRICS_KEY).items()}
+            except Exception as e:
+                logger.error(f"Lecture des métriques dans Redis échouée: {e}")
+
+        with self._lock:
+            return dict(self._local)
+
+    def render(self):
+        """Exposition au format texte Prometheus"""
+        values = self.values()
+        lines = []
+
+        for name, metric in self.metrics.items():
+            lines.append(f"# HELP {name} {metric.help}")
+            lines.append(f"# TYPE {name} {metric.type}")
+            prefixes = tuple(f"{name}{suffix}" for suffix in metric.suffixes)
+            selected = (series for series in values if series.split('{', 1)[0] in prefixes)
+            for series in sorted(selected, key=_series_key):
+                lines.append(f"{series} {_format_value(values[series])}")
+
+        for name, (help_text, func) in self.gauges.items():
+            try:
+                result = func()
+            except Exception as e:
+                logger.error(f"Jauge {name} indisponible: {e}")
+                continue
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            if isinstance(result, dict):
+                for labels, value in sorted(result.items()):
+                    lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+            elif result is not None:
+                lines.append(f"{name} {_format_value(result)}")
+
+        return '\n'.join(lines) + '\n'
+
+
+registry = Registry()
+
+
+class Counter:
+    type = 'counter'
+    suffixes = ('',)
+
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        registry.metrics[name] = self
+
+    def inc(self, amount=1, **labels):
+        registry.add(f"{self.name}{_format_labels(sorted(labels.items()))}", amount)
+
+
+class Histogram:
+    type = 'histogram'
+    suffixes = ('_bucket', '_sum', '_count')
+
+    def __init__(self, name, help_text, buckets=DURATION_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(sorted(buckets))
+        registry.metrics[name] = self
+
+    def observe(self, value, **labels):
+        items = sorted(labels.items())
+        # Buckets cumulatifs: la valeur compte dans toutes les bornes >= value
+        # (les autres sont créés à 0 pour que chaque série ait tous ses buckets)
+        for bound in self.buckets:
+            registry.add(f"{self.name}_bucket{_format_labels(items + [('le', bound)])}", 1 if value <= bound else 0)
+        registry.add(f"{self.name}_bucket{_format_labels(items + [('le', '+Inf')])}", 1)
+        registry.add(f"{self.name}_sum{_format_labels(items)}", value)
+        registry.add(f"{self.name}_count{_format_labels(items)}", 1)
+
+    @contextmanager
+    def time(self, **labels):
+        """Mesurer la durée du bloc"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+
+def gauge(name, help_text, func):
+    """Déclarer une jauge évaluée à chaque lecture de /metrics"""
+    registry.gauges[name] = (help_text, func)
+
+
+# Métriques communes
+http_seconds = Histogram(
+    'ace_registration_http_seconds',
+    "Latence des appels HTTP au site d'inscription, par route"
+)
+scheduler_jobs = Counter(
+    'ace_scheduler_jobs_total',
+    "Exécutions des jobs planifiés (executed, error, missed)"
+)
+
+
+def endpoint_of(url):
+    """Route générique d'une URL (identifiants remplacés par <id>)"""
+    return _ID_SEGMENT.sub('/<id>', urlparse(url).path) or '/'
+
+
+def timed_request(method, url, **kwargs):
+    """requests.request avec mesure de la latence par route et statut"""
+    start = time.perf_counter()
+    status = 'error'
+    try:
+        with profiling.span('http'):
+            response = requests.request(method, url, **kwargs)
+        status = str(response.status_code)
+        return response
+    finally:
+        http_seconds.observe(
+            time.perf_counter() - start,
+            endpoint=endpoint_of(url),
+            method=method.upper(),
+            status=status
+        )
+
+
+def track_view(histogram):
+    """Décorateur de route: durée et statut HTTP de la réponse (hors preflight CORS)"""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            from flask import make_response, request
+
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            start = time.perf_counter()
+            status = '500'
+            try:
+                response = make_response(f(*args, **kwargs))
+                status = str(response.status_code)
+                return response
+            finally:
+                histogram.observe(time.perf_counter() - start, status=status)
+
+        return wrapper
+
+    return decorator
+
+
+def instrument_scheduler(scheduler):
+    """
+    Compter les exécutions, erreurs et exécutions manquées des jobs d'un scheduler APScheduler
+    Les jobs ajoutés ensuite sont profilés (profiling.profiled, nommés par leur id)
+    """
+    from apscheduler.events import EVENT_JOB_EXECUTED, EVENT_JOB_ERROR, EVENT_JOB_MISSED
+
+    results = {EVENT_JOB_EXECUTED: 'executed', EVENT_JOB_ERROR: 'error', EVENT_JOB_MISSED: 'missed'}
+
+    def listener(event):
+        scheduler_jobs.inc(job=event.job_id, result=results.get(event.code, 'unknown'))
+
+    scheduler.add_listener(listener, EVENT_JOB_EXECUTED | EVENT_JOB_ERROR | EVENT_JOB_MISSED)
+
+    add_job = scheduler.add_job
+
+    @wraps(add_job)
+    def profiled_add_job(*args, **kwargs):
+        if 'func' in kwargs:
+            func = kwargs['func']
+            kwargs['func'] = profiling.profiled(func, kwargs.get('id') or func.__name__)
+        elif args:
+            args = (profiling.profiled(args[0], kwargs.get('id') or args[0].__name__),) + args[1:]
+        return add_job(*args, **kwargs)
+
+    scheduler.add_job = profiled_add_job
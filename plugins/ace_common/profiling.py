@@ -0,0 +1,316 @@
+"""
+Profilage par requête et par job planifié
+Chaque requête (et chaque job des schedulers instrumentés) a un profil qui
+cumule le temps passé par catégorie: appels HTTP sortants (timed_request),
+SQL (événements SQLAlchemy, avec le nombre de requêtes), hachage bcrypt et
+décodage JWT (span() autour des appels). Au-delà de PROFILE_SLOW_MS (requête)
+ou PROFILE_JOB_SLOW_MS (job), la répartition est journalisée et gardée pour
+/admin/ace/profiles.
+
+L'en-tête X-ACE-Profile (session admin, ou valeur PROFILE_TOKEN pour les
+routes appelées sans session: SSO, webhooks) active pour cette seule requête
+un échantillonneur de piles, dont le résultat est écrit au format « folded »
+(flamegraph.pl, speedscope) dans PROFILE_DIR; la réponse porte alors les
+en-têtes Server-Timing et X-ACE-Profile-Dump.
+"""
+
+import os
+import sys
+import hmac
+import time
+import logging
+import threading
+import contextvars
+from collections import deque
+from functools import wraps
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+SLOW_MS = float(os.getenv('PROFILE_SLOW_MS', '500'))
+JOB_SLOW_MS = float(os.getenv('PROFILE_JOB_SLOW_MS', '5000'))
+PROFILE_TOKEN = os.getenv('PROFILE_TOKEN', '')
+PROFILE_DIR = os.getenv('PROFILE_DIR', '/var/uploads/ace_profiles')
+PROFILE_KEEP = int(os.getenv('PROFILE_KEEP', '20'))
+SAMPLE_INTERVAL = float(os.getenv('PROFILE_SAMPLE_MS', '5')) / 1000
+
+PROFILE_HEADER = 'X-ACE-Profile'
+
+# Derniers profils lents de ce worker (/admin/ace/profiles)
+recent_slow = deque(maxlen=50)
+
+_current = contextvars.ContextVar('ace_profile', default=None)
+
+
+class Profile:
+    """Temps et nombre d'appels par catégorie pour une requête ou un job"""
+
+    __slots__ = ('name', 'start', 'spans', 'sampler')
+
+    def __init__(self, name):
+        self.name = name
+        self.start = time.perf_counter()
+        self.spans = {}         # catégorie -> [appels, secondes]
+        self.sampler = None
+
+    def add(self, kind, seconds):
+        span = self.spans.get(kind)
+        if span is None:
+            self.spans[kind] = [1, seconds]
+        else:
+            span[0] += 1
+            span[1] += seconds
+
+    def elapsed(self):
+        return time.perf_counter() - self.start
+
+    def summary(self, elapsed):
+        """{total_ms, spans: {catégorie: {count, ms}}, other_ms}"""
+        spans = {kind: {'count': count, 'ms': round(seconds * 1000, 1)}
+                 for kind, (count, seconds) in self.spans.items()}
+        measured = sum(seconds for _, seconds in self.spans.values())
+        return {
+            'name': self.name,
+            'total_ms': round(elapsed * 1000, 1),
+            'spans': spans,
+            'other_ms': round(max(elapsed - measured, 0) * 1000, 1)
+        }
+
+    def breakdown(self, elapsed):
+        """Répartition sur une ligne: « 812 ms: http 640 ms (2), sql 95 ms (31), autre 77 ms »"""
+        summary = self.summary(elapsed)
+        parts = [f"{kind} {span['ms']:.0f} ms ({span['count']})"
+                 for kind, span in sorted(summary['spans'].items(), key=lambda item: -item[1]['ms'])]
+        parts.append(f"autre {summary['other_ms']:.0f} ms")
+        return f"{summary['total_ms']:.0f} ms: " + ', '.join(parts)
+
+
+def current():
+    """Profil en cours dans ce contexte (requête, job), ou None"""
+    return _current.get()
+
+
+@contextmanager
+def span(kind):
+    """Compter la durée du bloc dans la catégorie `kind` du profil en cours"""
+    profile = _current.get()
+    if profile is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profile.add(kind, time.perf_counter() - start)
+
+
+def _record_slow(profile, elapsed, threshold_ms, label):
+    if elapsed * 1000 < threshold_ms:
+        return
+    logger.warning(f"{label} {profile.name}: {profile.breakdown(elapsed)}")
+    recent_slow.append(dict(profile.summary(elapsed), at=time.time()))
+
+
+def profiled(func, name):
+    """Envelopper un job planifié: profil pendant son exécution, journalisé s'il est lent"""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        profile = Profile(name)
+        token = _current.set(profile)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _current.reset(token)
+            _record_slow(profile, profile.elapsed(), JOB_SLOW_MS, "Job lent")
+
+    return wrapper
+
+
+# SQL: un seul jeu d'écouteurs sur la classe Engine, actif seulement sous un profil
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault('ace_profile_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _current.get()
+    starts = conn.info.get('ace_profile_start')
+    if profile is not None and starts:
+        profile.add('sql', time.perf_counter() - starts.pop())
+
+
+def _handle_error(exception_context):
+    starts = exception_context.connection.info.get('ace_profile_start') if exception_context.connection else None
+    if starts:
+        starts.pop()
+
+
+def instrument_sql():
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    if not event.contains(Engine, 'before_cursor_execute', _before_cursor_execute):
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        event.listen(Engine, 'handle_error', _handle_error)
+
+
+# Échantillonneur de piles (une requête à la fois)
+
+def _frame_label(code):
+    path = code.co_filename.replace('\\', '/').rsplit('/', 2)
+    return f"{'/'.join(path[-2:])}:{code.co_name}"
+
+
+class StackSampler:
+    """
+    Relevé périodique de la pile d'une requête depuis un vrai thread système
+    Avec les workers gevent, la requête est un greenlet: quand il est suspendu
+    (attente réseau, autre greenlet actif), sa pile est lue dans gr_frame, ce
+    qui compte aussi le temps d'attente.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        self.interval = interval
+        self.counts = {}
+        self.samples = 0
+        self.thread_id = threading.get_ident()
+        self.greenlet = None
+        self._running = False
+
+        # Sous gevent, threading est remplacé par des greenlets: thread et sleep d'origine
+        self._start_thread = None
+        self._sleep = time.sleep
+        try:
+            from gevent import monkey
+            if monkey.is_module_patched('threading'):
+                import gevent
+                self.greenlet = gevent.getcurrent()
+                self.thread_id = monkey.get_original('_thread', 'get_ident')()
+                self._start_thread = monkey.get_original('_thread', 'start_new_thread')
+                self._sleep = monkey.get_original('time', 'sleep')
+        except ImportError:
+            pass
+
+    def start(self):
+        self._running = True
+        if self._start_thread is not None:
+            self._start_thread(self._run, ())
+        else:
+            threading.Thread(target=self._run, name='ace-profiler', daemon=True).start()
+        return self
+
+    def stop(self):
+        self._running = False
+
+    def _run(self):
+        while self._running:
+            self._sleep(self.interval)
+            frame = self.greenlet.gr_frame if self.greenlet is not None else None
+            if frame is None:
+                frame = sys._current_frames().get(self.thread_id)
+
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            if stack and self._running:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+                self.samples += 1
+
+    def folded(self):
+        """Piles au format folded: « a;b;c nombre » par ligne"""
+        return ''.join(f"{stack} {count}\n" for stack, count in sorted(dict(self.counts).items()))
+
+
+def write_dump(name, sampler):
+    """Écrire le résultat de l'échantillonneur dans PROFILE_DIR; retourne le nom du fichier"""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    slug = ''.join(c if c.isalnum() else '-' for c in name).strip('-')[:60]
+    filename = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{slug}.folded"
+    with open(os.path.join(PROFILE_DIR, filename), 'w', encoding='utf-8') as f:
+        f.write(sampler.folded())
+
+    # Seuls les PROFILE_KEEP derniers fichiers sont gardés
+    dumps = list_dumps()
+    for old in dumps[PROFILE_KEEP:]:
+        try:
+            os.unlink(os.path.join(PROFILE_DIR, old['name']))
+        except OSError:
+            pass
+
+    return filename
+
+
+def list_dumps():
+    """Fichiers de PROFILE_DIR, du plus récent au plus ancien"""
+    try:
+        entries = [entry for entry in os.scandir(PROFILE_DIR) if entry.name.endswith('.folded')]
+    except OSError:
+        return []
+    entries.sort(key=lambda entry: entry.stat().st_mtime, reverse=True)
+    return [{'name': entry.name, 'size': entry.stat().st_size} for entry in entries]
+
+
+def _sampling_requested():
+    """En-tête X-ACE-Profile présent et autorisé (jeton PROFILE_TOKEN ou session admin)"""
+    from flask import request
+
+    value = request.headers.get(PROFILE_HEADER)
+    if not value:
+        return False
+    if PROFILE_TOKEN and hmac.compare_digest(value, PROFILE_TOKEN):
+        return True
+
+    from .user import is_admin_cached
+    return is_admin_cached()
+
+
+def init_app(app):
+    """Profil de chaque requête de l'application"""
+    from flask import g, request
+
+    instrument_sql()
+
+    @app.before_request
+    def start_request_profile():
+        profile = Profile(f"{request.method} {request.path}")
+        g.ace_profile_token = _current.set(profile)
+        if _sampling_requested():
+            profile.sampler = StackSampler().start()
+
+    @app.after_request
+    def finish_request_profile(response):
+        profile = _current.get()
+        if profile is None:
+            return response
+
+        elapsed = profile.elapsed()
+        if profile.sampler is not None:
+            profile.sampler.stop()
+            try:
+                filename = write_dump(profile.name, profile.sampler)
+                response.headers['X-ACE-Profile-Dump'] = filename
+                logger.info(f"Profil de {profile.name} ({profile.sampler.samples} échantillons): {filename}")
+            except OSError as e:
+                logger.error(f"Écriture du profil impossible: {e}")
+            response.headers['Server-Timing'] = ', '.join(
+                [f"{kind};dur={seconds * 1000:.1f};desc=\"{count}\"" for kind, (count, seconds) in profile.spans.items()]
+                + [f"total;dur={elapsed * 1000:.1f}"]
+            )
+
+        _record_slow(profile, elapsed, SLOW_MS, "Requête lente")
+        return response
+
+    @app.teardown_request
+    def clear_request_profile(exception=None):
+        profile = _current.get()
+        if profile is not None and profile.sampler is not None:
+            profile.sampler.stop()
+        token = g.pop('ace_profile_token', None)
+        if token is not None:
+            _current.reset(token)
@@ -0,0 +1,163 @@
+"""
+Limitation de débit par seau à jetons (token bucket)
+L'état des seaux est dans Redis (script Lua atomique) pour être partagé par
+tous les workers; sans Redis, il reste en mémoire dans chaque worker.
+"""
+
+import time
+import math
+import logging
+import threading
+from functools import wraps
+from flask import request, jsonify
+
+from . import get_redis
+
+logger = logging.getLogger(__name__)
+
+THROTTLED_KEY = 'ace:ratelimit:throttled'
+
+# Retourne {autorisé (0/1), secondes avant le prochain jeton}
+_BUCKET_SCRIPT = """
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+local allowed = 0
+local retry_after = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+    allowed = 1
+else
+    retry_after = (1 - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class TokenBucketLimiter:
+    """
+    Seau de `burst` jetons rechargé de `refill_rate` jetons par seconde
+    Chaque requête consomme un jeton; seau vide -> requête refusée.
+    """
+
+    # Au-delà, les seaux pleins sont purgés du mode mémoire
+    MAX_MEMORY_BUCKETS = 10000
+
+    def __init__(self, name, burst, refill_rate, redis_client=None):
+        self.name = name
+        self.burst = burst
+        self.refill_rate = refill_rate
+        self.redis = redis_client
+        self._script = redis_client.register_script(_BUCKET_SCRIPT) if redis_client else None
+        self._buckets = {}
+        self._throttled = 0
+        self._lock = threading.Lock()
+
+    def consume(self, key):
+        """
+        Consommer un jeton pour `key`
+        Retourne (autorisé, secondes avant le prochain jeton)
+        """
+        now = time.time()
+
+        if self.redis is not None:
+            try:
+                allowed, retry_after = self._script(
+                    keys=[f"ace:ratelimit:{self.name}:{key}"],
+                    args=[self.burst, self.refill_rate, now]
+                )
+                allowed, retry_after = bool(int(allowed)), float(retry_after)
+                if not allowed:
+                    self.redis.hincrby(THROTTLED_KEY, self.name, 1)
+                return allowed, retry_after
+            except Exception as e:
+                # Redis indisponible: on ne bloque pas les logins, repli en mémoire
+                logger.error(f"Limiteur {self.name}: Redis indisponible ({e}), repli en mémoire")
+
+        with self._lock:
+            tokens, ts = self._buckets.get(key, (self.burst, now))
+            tokens = min(self.burst, tokens + max(0.0, now - ts) * self.refill_rate)
+
+            if tokens >= 1:
+                self._buckets[key] = (tokens - 1, now)
+                allowed, retry_after = True, 0.0
+            else:
+                self._buckets[key] = (tokens, now)
+                self._throttled += 1
+                allowed, retry_after = False, (1 - tokens) / self.refill_rate
+
+            if len(self._buckets) > self.MAX_MEMORY_BUCKETS:
+                self._purge(now)
+
+        return allowed, retry_after
+
+    def _purge(self, now):
+        """Retirer les seaux redevenus pleins (équivalents à un seau absent)"""
+        refill_time = self.burst / self.refill_rate
+        self._buckets = {
+            key: (tokens, ts) for key, (tokens, ts) in self._buckets.items()
+            if now - ts < refill_time
+        }
+
+    def throttled_count(self):
+        """Nombre de requêtes refusées (tous workers si Redis)"""
+        if self.redis is not None:
+            try:
+                return int(self.redis.hget(THROTTLED_KEY, self.name) or 0)
+            except Exception:
+                pass
+        return self._throttled
+
+
+# Limiteurs déclarés par les plugins, par nom
+limiters = {}
+
+
+def get_limiter(name, burst, refill_rate):
+    """Retourner (en le créant au besoin) le limiteur `name`"""
+    if name not in limiters:
+        limiters[name] = TokenBucketLimiter(name, burst, refill_rate, get_redis())
+    return limiters[name]
+
+
+def rate_limit(name, key_func, burst, refill_rate):
+    """
+    Décorateur de route: refuse avec 429 + Retry-After quand le seau de la
+    clé retournée par `key_func()` est vide. Une clé None n'est pas limitée.
+    Les requêtes OPTIONS (preflight CORS) ne consomment pas de jeton.
+    """
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            key = key_func()
+            if key is None:
+                return f(*args, **kwargs)
+
+            allowed, retry_after = get_limiter(name, burst, refill_rate).consume(key)
+            if not allowed:
+                logger.warning(f"Limite {name} atteinte pour {key}")
+                response = jsonify({
+                    'success': False,
+                    'error': 'Trop de requêtes, réessayez plus tard'
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+                return response
+
+            return f(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,26 @@
+"""
+Résolution de l'utilisateur courant, mémorisée pour la durée de la requête
+S'appuie sur get_current_user_attrs de CTFd (attributs en cache CTFd, partagés
+avec ses propres vérifications) et ne consulte rien pour un visiteur anonyme.
+"""
+
+from flask import g, has_request_context
+from CTFd.utils.user import authed, get_current_user_attrs
+
+
+def current_user_attrs():
+    """Attributs de l'utilisateur connecté (id, type, team_id...), ou None"""
+    if not has_request_context():
+        return None
+
+    if 'ace_user_attrs' not in g:
+        # authed() ne lit que le cookie de session: pas de cache ni de base pour un anonyme
+        g.ace_user_attrs = get_current_user_attrs() if authed() else None
+
+    return g.ace_user_attrs
+
+
+def is_admin_cached():
+    """is_admin() évalué au plus une fois par requête"""
+    user = current_user_attrs()
+    return user is not None and user.type == 'admin'
@@ -0,0 +1,151 @@
+"""
+Initialisation différée des plugins
+Au chargement, les plugins n'enregistrent que leurs routes; le travail lourd
+(schedulers, synchronisations initiales) est enregistré ici et exécuté après
+le démarrage:
+- on_ready: dans chaque worker, WARMUP_DELAY secondes après le chargement
+- on_leader: uniquement dans le worker élu (verrou fcntl sur un fichier local,
+  libéré automatiquement si le worker meurt; les autres retentent
+  périodiquement de prendre la relève)
+
+Les temps de chargement et d'initialisation sont journalisés et exposés sur
+/admin/ace/startup.
+"""
+
+import os
+import time
+import fcntl
+import logging
+import threading
+from functools import wraps
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+LEADER_LOCK_PATH = os.getenv('ACE_LEADER_LOCK', '/tmp/ace-ctfd-leader.lock')
+STARTUP_LOCK_PATH = os.getenv('ACE_STARTUP_LOCK', '/tmp/ace-ctfd-startup.lock')
+WARMUP_DELAY = float(os.getenv('ACE_WARMUP_DELAY', '5'))
+LEADER_RETRY_SECONDS = float(os.getenv('ACE_LEADER_RETRY', '30'))
+
+# Temps mesurés, en millisecondes
+load_timings = {}
+warmup_timings = {}
+
+_ready_tasks = []
+_leader_tasks = []
+_leader_file = None
+_timer = None
+_lock = threading.Lock()
+
+
+def timed_load(load):
+    """Décorateur de load(app): mesure et journalise le temps de chargement du plugin"""
+    name = load.__module__.rsplit('.', 1)[-1]
+
+    @wraps(load)
+    def wrapper(app):
+        start = time.perf_counter()
+        try:
+            return load(app)
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            load_timings[name] = round(elapsed, 1)
+            logger.info(f"Plugin {name} chargé en {elapsed:.0f} ms")
+
+    return wrapper
+
+
+def on_ready(name, func):
+    """Exécuter `func` dans chaque worker après le démarrage"""
+    _ready_tasks.append((name, func))
+
+
+def on_leader(name, func):
+    """Exécuter `func` une seule fois, dans le worker élu"""
+    _leader_tasks.append((name, func))
+
+
+def is_leader():
+    """Ce worker est-il le worker élu ?"""
+    return _leader_file is not None
+
+
+@contextmanager
+def startup_lock():
+    """Verrou exclusif bloquant entre les workers, pour une initialisation unique"""
+    with open(STARTUP_LOCK_PATH, 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _try_acquire_leadership():
+    """Prendre le verrou du worker élu sans attendre"""
+    global _leader_file
+
+    f = open(LEADER_LOCK_PATH, 'a')
+    try:
+        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        f.close()
+        return False
+
+    # Gardé ouvert pour toute la vie du worker
+    _leader_file = f
+    return True
+
+
+def _run(app, tasks):
+    for name, func in tasks:
+        start = time.perf_counter()
+        try:
+            with app.app_context():
+                func()
+        except Exception as e:
+            logger.error(f"Initialisation différée de {name} échouée: {e}")
+        finally:
+            elapsed = (time.perf_counter() - start) * 1000
+            warmup_timings[name] = round(elapsed, 1)
+            logger.info(f"Initialisation différée de {name} en {elapsed:.0f} ms")
+
+
+def _schedule(delay, func, *args):
+    global _timer
+
+    with _lock:
+        _timer = threading.Timer(delay, func, args=args)
+        _timer.daemon = True
+        _timer.start()
+
+
+def _elect(app):
+    if not _try_acquire_leadership():
+        _schedule(LEADER_RETRY_SECONDS, _elect, app)
+        return
+
+    logger.info(f"Worker {os.getpid()} élu pour l'initialisation des plugins")
+    _run(app, _leader_tasks)
+
+
+def _warmup(app):
+    _run(app, _ready_tasks)
+    _elect(app)
+
+
+def start(app):
+    """
+    Planifier l'initialisation différée (appelé par ace_common.load)
+    Le délai laisse les autres plugins enregistrer leurs tâches et le worker
+    commencer à servir avant tout travail lourd.
+    """
+    _schedule(WARMUP_DELAY, _warmup, app)
+
+
+def stop():
+    """Annuler l'initialisation différée en attente (benchmarks)"""
+    with _lock:
+        if _timer is not None:
+            _timer.cancel()
@@ -1,19 +1,106 @@
 import os
-import requests
+import time
+import hashlib
 import logging
+import threading
+from collections import OrderedDict
+import requests
 import jwt
+from sqlalchemy.exc import IntegrityError
 from flask import Blueprint, request, jsonify, redirect, url_for
 from CTFd.models import db, Users, Teams
 from CTFd.utils.security.auth import login_user
 from CTFd.plugins import bypass_csrf_protection
+from CTFd.utils.user import get_ip
+from CTFd.plugins.registration_sync import lookup_team_mapping, lookup_snapshot_team_mapping
+from CTFd.plugins.ace_common import metrics, profiling
+from CTFd.plugins.ace_common.ratelimit import rate_limit
+from CTFd.plugins.ace_common.warmup import timed_load
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 REGISTRATION_SITE_URL = os.getenv('REGISTRATION_SITE_URL', 'http://backend:5000/api')
 JWT_SECRET = os.getenv('JWT_SECRET', 'changez-moi-en-production')
 CTFD_PUBLIC_URL = os.getenv('CTFD_PUBLIC_URL', 'http://localhost:8000')
 
+# Limites de débit du SSO: par IP (large, une salle peut partager une IP) et par email
+SSO_IP_BURST = int(os.getenv('SSO_RATE_LIMIT_IP_BURST', '60'))
+SSO_IP_REFILL = float(os.getenv('SSO_RATE_LIMIT_IP_REFILL', '10'))
+SSO_EMAIL_BURST = int(os.getenv('SSO_RATE_LIMIT_EMAIL_BURST', '5'))
+SSO_EMAIL_REFILL = float(os.getenv('SSO_RATE_LIMIT_EMAIL_REFILL', '0.2'))
+
+# Cache des tokens vérifiés
+TOKEN_CACHE_SIZE = int(os.getenv('SSO_TOKEN_CACHE_SIZE', '2048'))
+TOKEN_CACHE_MAX_TTL = int(os.getenv('SSO_TOKEN_CACHE_MAX_TTL', '300'))
+
+
+class VerifiedTokenCache:
+    """
+    LRU borné des tokens SSO déjà vérifiés
+    Clé: SHA-256 du token (le token lui-même n'est pas conservé). Une entrée
+    vit jusqu'au `exp` du token, plafonné à `max_ttl` pour reprendre en compte
+    les changements faits côté CTFd.
+    """
+
+    def __init__(self, max_size=2048, max_ttl=300):
+        self.max_size = max_size
+        self.max_ttl = max_ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(token):
+        return hashlib.sha256(token.encode('utf-8')).hexdigest()
+
+    def get(self, token):
+        """Retourner {'email', 'claims', 'user_id'} ou None"""
+        key = self._key(token)
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry['expires_at'] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, token, claims, user_id):
+        """Mémoriser un token vérifié et l'utilisateur CTFd résolu"""
+        if not claims.get('exp'):
+            return
+
+        key = self._key(token)
+        expires_at = min(claims['exp'], time.time() + self.max_ttl)
+
+        with self._lock:
+            self._entries[key] = {
+                'email': claims.get('email'),
+                'claims': claims,
+                'user_id': user_id,
+                'expires_at': expires_at
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else 0.0
+            }
+
 
 class RegistrationAuthAPI:
     def __init__(self):
@@ -21,7 +108,8 @@ class RegistrationAuthAPI:
 
     def validate_credentials(self, email, password):
         try:
-            response = requests.post(
+            response = metrics.timed_request(
+                'POST',
                 f"{self.base_url}/auth/login",
                 json={
                     "email": email,
@@ -47,33 +135,143 @@ class RegistrationAuthAPI:
             logger.error(f"Erreur lors de la validation des credentials: {e}")
             return {'valid': False, 'error': str(e)}
 
-    def get_user_team(self, user_id, token):
-        try:
-            response = requests.get(
-                f"{self.base_url}/admin/teams",
-                headers={"Authorization": f"Bearer {token}"},
-                timeout=10
-            )
-
-            if response.status_code == 200:
-                data = response.json()
-                if data.get('success'):
-                    teams = data['data'].get('teams', [])
-                    for team in teams:
-                        members = team.get('members', [])
-                        for member in members:
-                            if member.get('id') == user_id:
-                                return team
-            return None
-
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Erreur lors de la récupération de l'équipe: {e}")
-            return None
-
 
 auth_api = RegistrationAuthAPI()
-
-
+token_cache = VerifiedTokenCache(max_size=TOKEN_CACHE_SIZE, max_ttl=TOKEN_CACHE_MAX_TTL)
+
+# Métriques (/metrics)
+sso_login_seconds = metrics.Histogram(
+    'ace_sso_login_seconds',
+    "Durée des logins SSO, par statut HTTP"
+)
+metrics.gauge(
+    'ace_sso_token_cache',
+    "Cache des tokens SSO vérifiés du worker qui répond (size, hits, misses)",
+    lambda: {
+        (('stat', stat),): token_cache.stats()[stat]
+        for stat in ('size', 'hits', 'misses')
+    }
+)
+
+
+def resolve_team_mapping(team_id):
+    """
+    Résoudre l'équipe CTFd d'une équipe du site à partir du teamId du JWT
+    Cas courant: lecture dans la correspondance alimentée par registration_sync,
+    sans appel réseau. Sinon, le snapshot local des équipes. Une équipe encore
+    inconnue (pas encore synchronisée) est rattachée par la synchronisation
+    suivante ou son webhook, le login se fait sans équipe.
+    """
+    mapping = lookup_team_mapping(team_id) or lookup_snapshot_team_mapping(team_id)
+    if mapping is None:
+        logger.info(f"Équipe {team_id} pas encore synchronisée: login sans équipe")
+    return mapping
+
+
+def load_sso_state(email, ctfd_team_id):
+    """
+    Lire l'utilisateur et son équipe CTFd en une seule requête
+    Retourne (user ou None, team ou None)
+    """
+    if ctfd_team_id:
+        row = db.session.query(Teams, Users).outerjoin(
+            Users, Users.email == email
+        ).filter(Teams.id == ctfd_team_id).first()
+        if row:
+            team, user = row
+            return user, team
+
+    return Users.query.filter_by(email=email).first(), None
+
+
+def apply_sso_state(user, team, user_type, is_team_captain):
+    """
+    Appliquer type, équipe et capitaine sur un utilisateur existant
+    Retourne True si quelque chose a changé
+    """
+    changed = False
+
+    if user.type != user_type:
+        logger.info(f"Mise à jour du type d'utilisateur {user.email}: {user.type} -> {user_type}")
+        user.type = user_type
+        changed = True
+
+    if team and user.team_id != team.id:
+        logger.info(f"Mise à jour de l'équipe {user.email}: {user.team_id} -> {team.id}")
+        user.team_id = team.id
+        changed = True
+
+    if is_team_captain and team and team.captain_id != user.id:
+        team.captain_id = user.id
+        logger.info(f"Capitaine assigné pour l'équipe {team.name}: {user.email}")
+        changed = True
+
+    return changed
+
+
+def upsert_sso_user(email, user_type, ctfd_team_id, is_team_captain):
+    """
+    Créer ou mettre à jour l'utilisateur SSO en une seule transaction
+    Une lecture (utilisateur + équipe), puis au plus un commit. Si un login
+    concurrent a créé le même email entre-temps, la contrainte d'unicité
+    fait échouer l'insertion: on relit et on applique la mise à jour.
+    """
+    user, team = load_sso_state(email, ctfd_team_id)
+
+    if user is not None:
+        if apply_sso_state(user, team, user_type, is_team_captain):
+            db.session.commit()
+        return user
+
+    # Hachage coûteux fait avant d'ouvrir l'écriture
+    from CTFd.utils.security.passwords import hash_password
+    with profiling.span('bcrypt'):
+        fake_password = hash_password(os.urandom(32).hex())
+
+    user = Users(
+        name=email.split('@')[0],
+        email=email,
+        password=fake_password,
+        type=user_type,
+        team_id=team.id if team else None,
+        verified=True,
+        hidden=False,
+        banned=False
+    )
+
+    try:
+        db.session.add(user)
+        if is_team_captain and team:
+            # flush pour obtenir l'id du capitaine dans la même transaction
+            db.session.flush()
+            team.captain_id = user.id
+        db.session.commit()
+        logger.info(f"Utilisateur créé via SSO: {email} (type={user_type}, team_id={user.team_id})")
+        return user
+
+    except IntegrityError:
+        db.session.rollback()
+        logger.info(f"Utilisateur {email} créé par un login concurrent, mise à jour")
+
+        user, team = load_sso_state(email, ctfd_team_id)
+        if user is None:
+            raise
+        if apply_sso_state(user, team, user_type, is_team_captain):
+            db.session.commit()
+        return user
+
+
+def sso_email_key():
+    """Clé de limitation par email (corps JSON ou formulaire)"""
+    if request.is_json:
+        data = request.get_json(silent=True) or {}
+    else:
+        data = request.form
+    email = (data.get('email') or '').strip().lower()
+    return email or None
+
+
+@timed_load
 def load(app):
     logger.info("Chargement du plugin auth_sync (SSO avec site d'inscription)")
 
@@ -81,6 +279,9 @@ def load(app):
 
     @blueprint.route('/sso/authenticate', methods=['POST', 'OPTIONS'])
     @bypass_csrf_protection
+    @metrics.track_view(sso_login_seconds)
+    @rate_limit('sso_ip', get_ip, SSO_IP_BURST, SSO_IP_REFILL)
+    @rate_limit('sso_email', sso_email_key, SSO_EMAIL_BURST, SSO_EMAIL_REFILL)
     def sso_authenticate():
         if request.method == 'OPTIONS':
             return '', 200
@@ -106,101 +307,71 @@ def load(app):
                     'message': 'Token et email requis'
                 }), 400
 
-            try:
-                payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
-                if payload.get('email') != email:
+            # Token déjà vérifié récemment: ni décodage ni résolution utilisateur/équipe
+            user = None
+            cached = token_cache.get(token)
+            if cached is not None and cached['email'] == email:
+                user = Users.query.filter_by(id=cached['user_id']).first()
+
+            if user is None:
+                try:
+                    with profiling.span('jwt'):
+                        payload = jwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+                    if payload.get('email') != email:
+                        if is_browser_request:
+                            return '<html><body><h1>Erreur</h1><p>Email ne correspond pas au token</p></body></html>', 401
+                        return jsonify({
+                            'success': False,
+                            'message': 'Email ne correspond pas au token'
+                        }), 401
+
+                    user_data = {
+                        'id': payload.get('id'),
+                        'email': payload.get('email'),
+                        'firstName': '',
+                        'lastName': '',
+                        'isAdmin': payload.get('isAdmin', False),
+                        'teamId': payload.get('teamId')
+                    }
+
+                except jwt.ExpiredSignatureError:
+                    logger.error("Token JWT expiré")
                     if is_browser_request:
-                        return '<html><body><h1>Erreur</h1><p>Email ne correspond pas au token</p></body></html>', 401
+                        return '<html><body><h1>Erreur</h1><p>Token expiré. Veuillez vous reconnecter.</p></body></html>', 401
                     return jsonify({
                         'success': False,
-                        'message': 'Email ne correspond pas au token'
+                        'message': 'Token expiré'
                     }), 401
+                except jwt.InvalidTokenError as e:
+                    logger.error(f"Token JWT invalide: {e}")
+                    if is_browser_request:
+                        return '<html><body><h1>Erreur</h1><p>Token invalide</p></body></html>', 401
+                    return jsonify({
+                        'success': False,
+                        'message': 'Token invalide'
+                    }), 401
+                except Exception as e:
+                    logger.error(f"Erreur lors du décodage du token: {e}")
+                    if is_browser_request:
+                        return '<html><body><h1>Erreur</h1><p>Erreur de validation du token</p></body></html>', 500
+                    return jsonify({
+                        'success': False,
+                        'message': 'Erreur de validation du token'
+                    }), 500
 
-                user_data = {
-                    'id': payload.get('id'),
-                    'email': payload.get('email'),
-                    'firstName': '',
-                    'lastName': '',
-                    'isAdmin': payload.get('isAdmin', False),
-                    'teamId': payload.get('teamId')
-                }
-
-            except jwt.ExpiredSignatureError:
-                logger.error("Token JWT expiré")
-                if is_browser_request:
-                    return '<html><body><h1>Erreur</h1><p>Token expiré. Veuillez vous reconnecter.</p></body></html>', 401
-                return jsonify({
-                    'success': False,
-                    'message': 'Token expiré'
-                }), 401
-            except jwt.InvalidTokenError as e:
-                logger.error(f"Token JWT invalide: {e}")
-                if is_browser_request:
-                    return '<html><body><h1>Erreur</h1><p>Token invalide</p></body></html>', 401
-                return jsonify({
-                    'success': False,
-                    'message': 'Token invalide'
-                }), 401
-            except Exception as e:
-                logger.error(f"Erreur lors du décodage du token: {e}")
-                if is_browser_request:
-                    return '<html><body><h1>Erreur</h1><p>Erreur de validation du token</p></body></html>', 500
-                return jsonify({
-                    'success': False,
-                    'message': 'Erreur de validation du token'
-                }), 500
-
-            user = Users.query.filter_by(email=email).first()
-            user_type = 'admin' if user_data.get('isAdmin', False) else 'user'
-            team_id = user_data.get('teamId')
-
-            ctfd_team = None
-            is_team_captain = False
-            if team_id:
-                team_info = auth_api.get_user_team(user_data.get('id'), token)
-                if team_info and team_info.get('ctfdTeamId'):
-                    ctfd_team = Teams.query.filter_by(id=team_info['ctfdTeamId']).first()
-                    if ctfd_team:
-                        logger.info(f"Équipe CTFd trouvée: {ctfd_team.name} (ID: {ctfd_team.id})")
-                        is_team_captain = team_info.get('captainId') == user_data.get('id')
-
-            if not user:
-                from CTFd.utils.security.passwords import hash_password
-                fake_password = hash_password(os.urandom(32).hex())
-                username = email.split('@')[0]
-
-                user = Users(
-                    name=username,
-                    email=email,
-                    password=fake_password,
-                    type=user_type,
-                    team_id=ctfd_team.id if ctfd_team else None,
-                    verified=True,
-                    hidden=False,
-                    banned=False
-                )
-                db.session.add(user)
-                db.session.commit()
-                logger.info(f"Utilisateur créé via SSO: {email} (type={user_type}, team_id={user.team_id})")
-            else:
-                needs_update = False
-                if user.type != user_type:
-                    logger.info(f"Mise à jour du type d'utilisateur {email}: {user.type} -> {user_type}")
-                    user.type = user_type
-                    needs_update = True
-
-                if ctfd_team and user.team_id != ctfd_team.id:
-                    logger.info(f"Mise à jour de l'équipe {email}: {user.team_id} -> {ctfd_team.id}")
-                    user.team_id = ctfd_team.id
-                    needs_update = True
+                user_type = 'admin' if user_data.get('isAdmin', False) else 'user'
+                team_id = user_data.get('teamId')
 
-                if needs_update:
-                    db.session.commit()
+                ctfd_team_id = None
+                is_team_captain = False
+                if team_id:
+                    team_mapping = resolve_team_mapping(team_id)
+                    if team_mapping:
+                        ctfd_team_id = team_mapping['ctfd_team_id']
+                        is_team_captain = team_mapping.get('captain_id') == user_data.get('id')
 
-            if is_team_captain and ctfd_team and ctfd_team.captain_id != user.id:
-                ctfd_team.captain_id = user.id
-                db.session.commit()
-                logger.info(f"Capitaine assigné pour l'équipe {ctfd_team.name}: {user.email}")
+                user = upsert_sso_user(email, user_type, ctfd_team_id, is_team_captain)
+                token_cache.put(token, payload, user.id)
 
             login_user(user)
 
@@ -227,6 +398,17 @@ def load(app):
                 'message': 'Erreur lors de l\'authentification'
             }), 500
 
+    @blueprint.route('/admin/auth-sync/token-cache', methods=['GET'])
+    def token_cache_stats():
+        """Statistiques du cache des tokens SSO (par worker)"""
+        from CTFd.utils.decorators import admins_only
+
+        @admins_only
+        def stats():
+            return {'success': True, 'data': token_cache.stats()}
+
+        return stats()
+
     app.register_blueprint(blueprint)
     logger.info("Plugin auth_sync chargé avec succès - SSO activé")
 
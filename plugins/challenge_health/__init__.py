@@ -0,0 +1,302 @@
+"""
+Plugin challenge_health - Disponibilité des services de challenge
+Les cibles sont découvertes à chaque passe: `health_url` des challenge.yml
+montés dans CHALLENGE_HEALTH_PATH (adresse interne, prioritaire), sinon le
+`connection_info` du challenge en base (URL http(s) ou `nc host port`).
+Toutes les cibles sont sondées en parallèle (asyncio, probe.py) par le worker
+élu, dans le thread de son scheduler: aucune requête n'attend une sonde.
+L'historique de chaque cible (history.py) et le dernier état sont partagés
+avec les autres workers via le cache CTFd, pour la page /admin/challenge-health
+et les métriques.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime
+
+from flask import Blueprint
+from apscheduler.schedulers.background import BackgroundScheduler
+from CTFd.cache import cache
+from CTFd.models import Challenges
+from CTFd.utils.decorators import admins_only
+from CTFd.plugins.ace_common import warmup, metrics
+from CTFd.plugins.ace_common.challenge_files import find_challenge_files
+
+from .history import ProbeHistory
+from .probe import parse_target, describe, run_probes
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+CHALLENGES_PATH = os.getenv('CHALLENGE_HEALTH_PATH', '/opt/challenges')
+PROBE_INTERVAL = int(os.getenv('CHALLENGE_HEALTH_INTERVAL', '30'))
+PROBE_TIMEOUT = float(os.getenv('CHALLENGE_HEALTH_TIMEOUT', '5'))
+PROBE_CONCURRENCY = int(os.getenv('CHALLENGE_HEALTH_CONCURRENCY', '50'))
+# Sondes gardées par cible (240 x 30 s = 2 heures)
+HISTORY_SIZE = int(os.getenv('CHALLENGE_HEALTH_HISTORY', '240'))
+STRIP_POINTS = 60
+
+STATUS_CACHE_KEY = 'challenge_health:status'
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'challenge_health.html')
+
+probe_seconds = metrics.Histogram(
+    'ace_challenge_probe_seconds',
+    "Latence des sondes réussies, par challenge"
+)
+probe_failures = metrics.Counter(
+    'ace_challenge_probe_failures_total',
+    "Sondes en échec, par challenge"
+)
+
+scheduler = None
+flask_app = None
+
+# Historiques du worker élu {nom du challenge: ProbeHistory}
+_histories = {}
+# challenge.yml déjà lus {chemin: (mtime_ns, nom, health_url)}
+_yaml_index = {}
+
+
+def read_health_urls():
+    """
+    {nom du challenge: health_url} lus dans les challenge.yml
+    Seuls les fichiers modifiés depuis la passe précédente sont relus.
+    """
+    if not os.path.isdir(CHALLENGES_PATH):
+        return {}
+
+    try:
+        import yaml
+    except ImportError:
+        logger.warning("PyYAML absent: health_url des challenge.yml ignorés")
+        return {}
+
+    index = {}
+    for path in find_challenge_files(CHALLENGES_PATH):
+        try:
+            mtime = os.stat(path).st_mtime_ns
+            entry = _yaml_index.get(path)
+            if entry is None or entry[0] != mtime:
+                with open(path, encoding='utf-8') as f:
+                    data = yaml.safe_load(f) or {}
+                entry = (mtime, data.get('name'), data.get('health_url')) if isinstance(data, dict) else (mtime, None, None)
+            index[path] = entry
+        except (OSError, yaml.YAMLError) as e:
+            logger.warning(f"{path} illisible: {e}")
+
+    _yaml_index.clear()
+    _yaml_index.update(index)
+    return {name: url for _, name, url in index.values() if isinstance(name, str) and url}
+
+
+def discover_targets():
+    """
+    Cibles à sonder {nom du challenge: description}
+    Un challenge.yml sans challenge correspondant en base est aussi sondé
+    (service déployé mais pas encore importé).
+    """
+    health_urls = read_health_urls()
+    targets = {}
+
+    rows = Challenges.query.with_entities(
+        Challenges.id, Challenges.name, Challenges.category, Challenges.state, Challenges.connection_info
+    ).all()
+
+    for challenge_id, name, category, state, connection_info in rows:
+        if name in health_urls:
+            source, value = 'challenge.yml', health_urls.pop(name)
+        else:
+            source, value = 'connection_info', connection_info
+        target = parse_target(value)
+        if target is not None:
+            targets[name] = {
+                'challenge_id': challenge_id,
+                'category': category,
+                'state': state,
+                'source': source,
+                'target': target
+            }
+
+    for name, value in health_urls.items():
+        target = parse_target(value)
+        if target is not None:
+            targets[name] = {
+                'challenge_id': None,
+                'category': None,
+                'state': None,
+                'source': 'challenge.yml',
+                'target': target
+            }
+
+    return targets
+
+
+def probe_challenges():
+    """
+    Une passe de sondes (appelée par le scheduler du worker élu)
+    Le dernier état est publié dans le cache CTFd pour tous les workers.
+    """
+    try:
+        with flask_app.app_context():
+            targets = discover_targets()
+            previous = cache.get(STATUS_CACHE_KEY) or {}
+
+        start = time.perf_counter()
+        results = run_probes(
+            {name: entry['target'] for name, entry in targets.items()},
+            PROBE_TIMEOUT,
+            PROBE_CONCURRENCY
+        )
+        elapsed = time.perf_counter() - start
+        now = time.time()
+
+        # Reprise des historiques publiés par un ancien worker élu
+        if not _histories:
+            for name, entry in previous.get('challenges', {}).items():
+                if isinstance(entry.get('history'), ProbeHistory) and entry['history'].size == HISTORY_SIZE:
+                    _histories[name] = entry['history']
+        for name in list(_histories):
+            if name not in targets:
+                del _histories[name]
+
+        challenges = {}
+        for name, entry in targets.items():
+            result = results[name]
+            history = _histories.setdefault(name, ProbeHistory(HISTORY_SIZE))
+            history.record(now, result.latency if result.ok else None)
+
+            if result.ok:
+                probe_seconds.observe(result.latency, challenge=name)
+            else:
+                probe_failures.inc(challenge=name)
+
+            before = previous.get('challenges', {}).get(name, {})
+            changed = before.get('up') != result.ok
+            if changed and before and not result.ok:
+                logger.warning(f"Challenge {name} injoignable ({describe(entry['target'])}): {result.error}")
+            elif changed and before:
+                logger.info(f"Challenge {name} de nouveau joignable")
+
+            challenges[name] = {
+                'challenge_id': entry['challenge_id'],
+                'category': entry['category'],
+                'state': entry['state'],
+                'source': entry['source'],
+                'target': describe(entry['target']),
+                'up': result.ok,
+                'latency_ms': round(result.latency * 1000, 1) if result.ok else None,
+                'error': result.error,
+                'since': now if changed else before.get('since', now),
+                'history': history
+            }
+
+        cache.set(STATUS_CACHE_KEY, {
+            'checked_at': now,
+            'duration_ms': round(elapsed * 1000, 1),
+            'challenges': challenges
+        }, timeout=0)
+
+        down = sum(1 for entry in challenges.values() if not entry['up'])
+        logger.debug(f"Sondes: {len(challenges)} challenges, {down} injoignables, {elapsed * 1000:.0f} ms")
+
+    except Exception as e:
+        logger.error(f"Erreur lors des sondes des challenges: {e}")
+
+
+def get_status():
+    """Dernier état publié, avec le résumé de l'historique de chaque challenge"""
+    status = cache.get(STATUS_CACHE_KEY) or {'checked_at': None, 'duration_ms': None, 'challenges': {}}
+    challenges = []
+
+    for name, entry in sorted(status['challenges'].items(), key=lambda item: (item[1]['up'], item[0])):
+        history = entry['history']
+        challenges.append(dict(
+            {key: value for key, value in entry.items() if key != 'history'},
+            name=name,
+            strip=history.strip(STRIP_POINTS),
+            **history.summary()
+        ))
+
+    return {
+        'checked_at': status['checked_at'],
+        'duration_ms': status['duration_ms'],
+        'interval': PROBE_INTERVAL,
+        'challenges': challenges
+    }
+
+
+def up_gauge():
+    """ace_challenge_up: 1 si la dernière sonde a réussi"""
+    status = cache.get(STATUS_CACHE_KEY) or {'challenges': {}}
+    return {
+        (('challenge', name),): 1 if entry['up'] else 0
+        for name, entry in status['challenges'].items()
+    }
+
+
+def start_probe_job():
+    """Démarrer les sondes (worker élu uniquement), la première immédiatement"""
+    global scheduler
+
+    if not scheduler or not scheduler.running:
+        scheduler = BackgroundScheduler()
+        metrics.instrument_scheduler(scheduler)
+        scheduler.start()
+
+    # Une seule passe à la fois: une passe lente est sautée, pas empilée
+    scheduler.add_job(
+        func=probe_challenges,
+        trigger='interval',
+        seconds=PROBE_INTERVAL,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True,
+        id='probe_challenges',
+        name='Probe challenge services',
+        replace_existing=True
+    )
+
+    logger.info(f"Sondes des challenges démarrées (toutes les {PROBE_INTERVAL} secondes)")
+
+
+@warmup.timed_load
+def load(app):
+    """Charger le plugin dans CTFd"""
+    global flask_app
+
+    # Stocker l'app pour utilisation dans le scheduler
+    flask_app = app
+
+    logger.info("Chargement du plugin challenge_health")
+
+    # Template compilé une seule fois au chargement
+    with open(TEMPLATE_PATH, encoding='utf-8') as f:
+        page_template = app.jinja_env.from_string(f.read())
+
+    blueprint = Blueprint('challenge_health', __name__, url_prefix='/admin/challenge-health')
+
+    @blueprint.route('', methods=['GET'])
+    @admins_only
+    def health_page():
+        """Tableau de disponibilité des challenges (rafraîchi côté client)"""
+        return page_template.render(refresh_seconds=PROBE_INTERVAL, points=STRIP_POINTS)
+
+    @blueprint.route('/api', methods=['GET'])
+    @admins_only
+    def health_status():
+        """Dernier état, disponibilité et latences p50/p95 de chaque challenge"""
+        return {'success': True, 'data': get_status()}
+
+    app.register_blueprint(blueprint)
+
+    metrics.gauge(
+        'ace_challenge_up',
+        "Dernière sonde du service de challenge réussie (1) ou non (0)",
+        up_gauge
+    )
+
+    warmup.on_leader('challenge_health', start_probe_job)
+
+    logger.info("Plugin challenge_health chargé avec succès")
@@ -0,0 +1,69 @@
+"""
+Historique compact des sondes d'un service de challenge
+Tampon circulaire de taille fixe: horodatages array('I') (secondes) et
+latences array('f') (secondes, -1 pour une sonde en échec), soit 8 octets par
+échantillon quelle que soit la durée de l'événement.
+Ce module ne dépend pas de CTFd.
+"""
+
+from array import array
+
+DOWN = -1.0
+
+
+def percentile(values, fraction):
+    """Percentile par rang le plus proche sur une liste triée"""
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
+
+
+class ProbeHistory:
+    """Les `size` dernières sondes d'une cible"""
+
+    __slots__ = ('size', 'timestamps', 'latencies', 'next', 'count')
+
+    def __init__(self, size):
+        self.size = size
+        self.timestamps = array('I', bytes(4 * size))
+        self.latencies = array('f', bytes(4 * size))
+        self.next = 0       # prochain emplacement écrit
+        self.count = 0      # emplacements remplis (<= size)
+
+    def record(self, timestamp, latency):
+        """Ajouter une sonde (latency None: service injoignable)"""
+        self.timestamps[self.next] = int(timestamp)
+        self.latencies[self.next] = DOWN if latency is None else latency
+        self.next = (self.next + 1) % self.size
+        self.count = min(self.count + 1, self.size)
+
+    def _ordered(self):
+        """Index des échantillons du plus ancien au plus récent"""
+        start = (self.next - self.count) % self.size
+        return [(start + offset) % self.size for offset in range(self.count)]
+
+    def samples(self):
+        """[(horodatage, latence ou None)] du plus ancien au plus récent"""
+        return [
+            (self.timestamps[i], None if self.latencies[i] < 0 else self.latencies[i])
+            for i in self._ordered()
+        ]
+
+    def summary(self):
+        """Disponibilité (%) et latences p50/p95 (ms) sur la fenêtre"""
+        latencies = sorted(
+            self.latencies[i] for i in self._ordered() if self.latencies[i] >= 0
+        )
+        p50 = percentile(latencies, 0.50)
+        p95 = percentile(latencies, 0.95)
+        return {
+            'samples': self.count,
+            'uptime': round(100.0 * len(latencies) / self.count, 1) if self.count else None,
+            'p50_ms': round(p50 * 1000, 1) if p50 is not None else None,
+            'p95_ms': round(p95 * 1000, 1) if p95 is not None else None
+        }
+
+    def strip(self, points):
+        """Les `points` dernières sondes en chaîne ('1' joignable, '0' injoignable)"""
+        return ''.join('0' if self.latencies[i] < 0 else '1' for i in self._ordered()[-points:])
@@ -0,0 +1,131 @@
+"""
+Sondes concurrentes des services de challenge (asyncio)
+Une cible est soit une URL http(s) (GET, statut < 400 attendu), soit une
+adresse TCP (connexion acceptée). Toutes les cibles sont sondées en même temps
+dans une seule boucle asyncio, au plus `concurrency` connexions ouvertes:
+la durée d'une passe est celle de la sonde la plus lente, pas leur somme.
+Ce module ne dépend pas de CTFd.
+"""
+
+import re
+import ssl
+import time
+import asyncio
+from collections import namedtuple
+from urllib.parse import urlsplit
+
+Target = namedtuple('Target', 'kind host port path tls')
+Result = namedtuple('Result', 'ok latency error')
+
+USER_AGENT = 'ace-challenge-health'
+
+# `nc host port`, `host:port`, `host port`
+_NC = re.compile(r'^(?:nc(?:at)?\s+(?:-\S+\s+)*)?([\w.-]+)(?:\s+|:)(\d{1,5})$')
+
+
+def parse_target(value):
+    """
+    Cible à sonder décrite par `value` (URL http(s), tcp://host:port ou
+    commande nc); None si la valeur n'est pas reconnue
+    """
+    if not isinstance(value, str):
+        return None
+    value = value.strip()
+
+    if '://' in value:
+        try:
+            parts = urlsplit(value)
+            port = parts.port
+        except ValueError:
+            return None
+        if not parts.hostname:
+            return None
+        if parts.scheme in ('http', 'https'):
+            tls = parts.scheme == 'https'
+            path = parts.path or '/'
+            if parts.query:
+                path = f"{path}?{parts.query}"
+            return Target('http', parts.hostname, port or (443 if tls else 80), path, tls)
+        if parts.scheme == 'tcp' and port:
+            return Target('tcp', parts.hostname, port, None, False)
+        return None
+
+    match = _NC.match(value)
+    if match and 0 < int(match.group(2)) < 65536:
+        return Target('tcp', match.group(1), int(match.group(2)), None, False)
+    return None
+
+
+def describe(target):
+    """Cible lisible pour la page d'administration"""
+    if target.kind == 'tcp':
+        return f"tcp://{target.host}:{target.port}"
+    return f"{'https' if target.tls else 'http'}://{target.host}:{target.port}{target.path}"
+
+
+async def _probe_http(target, ssl_context):
+    reader, writer = await asyncio.open_connection(
+        target.host, target.port,
+        ssl=ssl_context if target.tls else None
+    )
+    try:
+        host = target.host if target.port in (80, 443) else f"{target.host}:{target.port}"
+        writer.write(
+            f"GET {target.path} HTTP/1.1\r\nHost: {host}\r\n"
+            f"User-Agent: {USER_AGENT}\r\nConnection: close\r\n\r\n".encode('ascii')
+        )
+        await writer.drain()
+        # La ligne de statut suffit: le corps n'est pas lu
+        status_line = await reader.readline()
+    finally:
+        writer.close()
+
+    parts = status_line.split()
+    if len(parts) < 2 or not parts[0].startswith(b'HTTP/') or not parts[1].isdigit():
+        raise ConnectionError("réponse HTTP invalide")
+    status = int(parts[1])
+    if status >= 400:
+        raise ConnectionError(f"HTTP {status}")
+
+
+async def _probe_tcp(target):
+    _, writer = await asyncio.open_connection(target.host, target.port)
+    writer.close()
+
+
+async def probe(target, timeout, ssl_context=None):
+    """Sonder une cible: Result(ok, latence en secondes, erreur)"""
+    start = time.perf_counter()
+    try:
+        if target.kind == 'http':
+            await asyncio.wait_for(_probe_http(target, ssl_context), timeout)
+        else:
+            await asyncio.wait_for(_probe_tcp(target), timeout)
+    except asyncio.TimeoutError:
+        return Result(False, time.perf_counter() - start, f"pas de réponse en {timeout:g}s")
+    except (OSError, ssl.SSLError, ConnectionError, UnicodeError) as e:
+        return Result(False, time.perf_counter() - start, str(e) or type(e).__name__)
+    return Result(True, time.perf_counter() - start, None)
+
+
+async def probe_all(targets, timeout, concurrency):
+    """Sonder toutes les cibles {clé: Target}; retourne {clé: Result}"""
+    semaphore = asyncio.Semaphore(concurrency)
+    # Certificats des challenges souvent auto-signés: on vérifie la disponibilité, pas la chaîne
+    ssl_context = ssl.create_default_context()
+    ssl_context.check_hostname = False
+    ssl_context.verify_mode = ssl.CERT_NONE
+
+    async def bounded(key, target):
+        async with semaphore:
+            return key, await probe(target, timeout, ssl_context)
+
+    results = await asyncio.gather(*(bounded(key, target) for key, target in targets.items()))
+    return dict(results)
+
+
+def run_probes(targets, timeout, concurrency):
+    """Passe complète dans une boucle asyncio propre au thread appelant"""
+    if not targets:
+        return {}
+    return asyncio.run(probe_all(targets, timeout, concurrency))
@@ -0,0 +1,339 @@
+"""
+Plugin challenge_instances - Instances de challenge par équipe
+Les challenges dont le challenge.yml contient un bloc `instance:` (image,
+port, protocol, warm, memory) reçoivent une instance par équipe. Chaque
+challenge garde `warm` instances démarrées d'avance (pool.py): une équipe
+reçoit la sienne en quelques millisecondes, et n'attend un démarrage que si
+le pool est vide. Le worker élu remplit le pool et arrête les instances
+inactives; le démarrage passe par un backend interchangeable (backends.py):
+Docker, ou simulé en mémoire pour les tests.
+"""
+
+import os
+import time
+import logging
+from datetime import datetime
+
+from flask import Blueprint, request
+from apscheduler.schedulers.background import BackgroundScheduler
+from CTFd.models import Challenges, Solves
+from CTFd.utils.decorators import admins_only, authed_only, require_team, during_ctf_time_only
+from CTFd.utils.user import get_current_team, get_current_user, is_admin
+from CTFd.plugins.ace_common import get_redis, warmup, metrics
+from CTFd.plugins.ace_common.challenge_files import find_challenge_files
+
+from .backends import InstanceSpec, DockerBackend, FakeBackend, BackendError
+from .pool import InstancePool, InstanceStore, PoolExhausted
+
+logger = logging.getLogger(__name__)
+
+# Configuration
+BACKEND = os.getenv('CHALLENGE_INSTANCES_BACKEND', '')    # docker, fake; vide: désactivé
+CHALLENGES_PATH = os.getenv('CHALLENGE_INSTANCES_PATH', '/opt/challenges')
+IDLE_SECONDS = int(os.getenv('CHALLENGE_INSTANCES_IDLE_SECONDS', '1800'))
+MAX_INSTANCES = int(os.getenv('CHALLENGE_INSTANCES_MAX', '100'))
+MAX_PER_TEAM = int(os.getenv('CHALLENGE_INSTANCES_MAX_PER_TEAM', '3'))
+MAINTAIN_INTERVAL = int(os.getenv('CHALLENGE_INSTANCES_INTERVAL', '15'))
+SPAWN_WORKERS = int(os.getenv('CHALLENGE_INSTANCES_SPAWN_WORKERS', '4'))
+# Backend docker: réseau des conteneurs (celui de Traefik), domaine des instances;
+# instances tcp: entrée TLS de Traefik (routage par SNI) et son port public
+DOCKER_NETWORK = os.getenv('CHALLENGE_INSTANCES_NETWORK', 'ctfd-challenges')
+INSTANCE_DOMAIN = os.getenv('CHALLENGE_INSTANCES_DOMAIN', 'instances.challenges.local')
+TCP_ENTRYPOINT = os.getenv('CHALLENGE_INSTANCES_TCP_ENTRYPOINT', 'websecure')
+TCP_PUBLIC_PORT = int(os.getenv('CHALLENGE_INSTANCES_TCP_PORT', '8443'))
+# Attente maximale du port d'une instance démarrée (secondes)
+READY_TIMEOUT = float(os.getenv('CHALLENGE_INSTANCES_READY_TIMEOUT', '30'))
+# Backend fake: durée simulée d'un démarrage (secondes)
+FAKE_START_DELAY = float(os.getenv('CHALLENGE_INSTANCES_FAKE_DELAY', '0'))
+
+SPINUP_BUCKETS = (0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+acquire_total = metrics.Counter(
+    'ace_instance_acquire_total',
+    "Demandes d'instance par challenge et résultat (hit, miss, reused, exhausted, error)"
+)
+acquire_seconds = metrics.Histogram(
+    'ace_instance_acquire_seconds',
+    "Temps de réponse d'une demande d'instance, par résultat"
+)
+spinup_seconds = metrics.Histogram(
+    'ace_instance_spinup_seconds',
+    "Durée de démarrage des instances jusqu'à leur port joignable, par challenge et raison (warm, on_demand)",
+    buckets=SPINUP_BUCKETS
+)
+stopped_total = metrics.Counter(
+    'ace_instance_stopped_total',
+    "Instances arrêtées par challenge et raison (idle, released, dead)"
+)
+
+scheduler = None
+_pool = None
+_disabled = False
+
+
+def load_specs(base_path):
+    """{nom du challenge: InstanceSpec} des challenge.yml avec un bloc `instance:`"""
+    import yaml
+
+    specs = {}
+    for path in find_challenge_files(base_path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                data = yaml.safe_load(f) or {}
+        except (OSError, yaml.YAMLError) as e:
+            logger.warning(f"{path} illisible: {e}")
+            continue
+
+        instance = data.get('instance') if isinstance(data, dict) else None
+        if not isinstance(instance, dict) or not instance.get('image') or not isinstance(data.get('name'), str):
+            continue
+
+        specs[data['name']] = InstanceSpec(
+            challenge=data['name'],
+            image=instance['image'],
+            port=int(instance.get('port', 80)),
+            protocol=instance.get('protocol', 'http'),
+            warm=int(instance.get('warm', 1)),
+            memory=instance.get('memory', '256m')
+        )
+
+    return specs
+
+
+def create_backend():
+    """Backend choisi par CHALLENGE_INSTANCES_BACKEND"""
+    if BACKEND == 'docker':
+        # Sans Redis, chaque worker aurait son propre pool: le worker élu prendrait les
+        # conteneurs affectés par les autres pour des orphelins et les arrêterait
+        if get_redis() is None:
+            raise BackendError("le backend docker nécessite REDIS_URL (pool partagé entre les workers)")
+        return DockerBackend(DOCKER_NETWORK, INSTANCE_DOMAIN, TCP_ENTRYPOINT, TCP_PUBLIC_PORT, READY_TIMEOUT)
+    if BACKEND == 'fake':
+        return FakeBackend(start_delay=FAKE_START_DELAY)
+    raise BackendError(f"backend inconnu: {BACKEND}")
+
+
+def get_pool():
+    """Pool du worker, créé à la première utilisation (None si le plugin est désactivé)"""
+    global _pool, _disabled
+
+    if _pool is None and BACKEND and not _disabled:
+        try:
+            backend = create_backend()
+        except BackendError as e:
+            # Une seule tentative par worker (ex: socket Docker non monté)
+            logger.error(f"Instances par équipe désactivées: {e}")
+            _disabled = True
+            return None
+
+        _pool = InstancePool(
+            backend,
+            InstanceStore(get_redis()),
+            load_specs(CHALLENGES_PATH),
+            idle_seconds=IDLE_SECONDS,
+            max_instances=MAX_INSTANCES,
+            max_per_team=MAX_PER_TEAM,
+            spawn_workers=SPAWN_WORKERS,
+            on_spawn=lambda challenge, seconds, reason: spinup_seconds.observe(seconds, challenge=challenge, reason=reason),
+            on_stop=lambda challenge, reason: stopped_total.inc(challenge=challenge, reason=reason)
+        )
+        logger.info(f"Pool d'instances ({BACKEND}): {len(_pool.specs)} challenges, "
+                    f"{sum(spec.warm for spec in _pool.specs.values())} instances prêtes visées")
+
+    return _pool
+
+
+def maintain_pool():
+    """Entretien du pool (appelé par le scheduler du worker élu)"""
+    try:
+        stats = get_pool().maintain()
+        if any(stats.values()):
+            logger.info(
+                f"Pool d'instances: {stats['started']} démarrées, {stats['reaped']} inactives arrêtées, "
+                f"{stats['dead']} mortes, {stats['orphans']} orphelines, {stats['failed']} échecs"
+            )
+    except Exception as e:
+        logger.error(f"Erreur lors de l'entretien du pool d'instances: {e}")
+
+
+def pool_gauge():
+    """ace_instance_pool: instances prêtes et affectées par challenge"""
+    if get_pool() is None:
+        return {}
+    return {
+        (('challenge', challenge), ('state', state)): counts[state]
+        for challenge, counts in get_pool().status().items()
+        for state in ('warm', 'assigned')
+    }
+
+
+def start_pool_job():
+    """Démarrer l'entretien du pool (worker élu uniquement), le premier remplissage immédiatement"""
+    global scheduler
+
+    if get_pool() is None:
+        return
+
+    if not scheduler or not scheduler.running:
+        scheduler = BackgroundScheduler()
+        metrics.instrument_scheduler(scheduler)
+        scheduler.start()
+
+    scheduler.add_job(
+        func=maintain_pool,
+        trigger='interval',
+        seconds=MAINTAIN_INTERVAL,
+        next_run_time=datetime.now(),
+        max_instances=1,
+        coalesce=True,
+        id='maintain_instance_pool',
+        name='Maintain challenge instance pool',
+        replace_existing=True
+    )
+
+    logger.info(f"Entretien du pool d'instances démarré (toutes les {MAINTAIN_INTERVAL} secondes)")
+
+
+def prerequisites_met(challenge):
+    """
+    Prérequis du challenge résolus par le compte (équipe) de l'utilisateur,
+    comme la vérification de CTFd avant d'ouvrir un challenge; les prérequis
+    qui ne désignent plus aucun challenge sont ignorés
+    """
+    prerequisites = set((challenge.requirements or {}).get('prerequisites') or [])
+    if not prerequisites:
+        return True
+
+    existing = {
+        challenge_id for challenge_id, in
+        Challenges.query.with_entities(Challenges.id).filter(Challenges.id.in_(prerequisites)).all()
+    }
+    solved = {
+        challenge_id for challenge_id, in
+        Solves.query.with_entities(Solves.challenge_id).filter(
+            Solves.account_id == get_current_user().account_id,
+            Solves.challenge_id.in_(existing)
+        ).all()
+    }
+    return solved >= existing
+
+
+def challenge_spec(challenge_id):
+    """
+    Nom du challenge s'il a des instances et que l'utilisateur peut l'ouvrir
+    (visible, prérequis résolus; toujours pour un admin)
+    """
+    challenge = Challenges.query.filter_by(id=challenge_id).first()
+    if challenge is None or challenge.name not in get_pool().specs:
+        return None
+    if is_admin():
+        return challenge.name
+    if challenge.state == 'hidden' or not prerequisites_met(challenge):
+        return None
+    return challenge.name
+
+
+def instance_data(pool, team_id, name, instance, result=None):
+    data = {
+        'challenge': name,
+        'connection': instance.connection,
+        'started_at': instance.started_at,
+        'expires_at': pool.expires_at(team_id, name)
+    }
+    if result is not None:
+        data['pooled'] = result == 'hit'
+    return data
+
+
+@warmup.timed_load
+def load(app):
+    """Charger le plugin dans CTFd"""
+    logger.info("Chargement du plugin challenge_instances")
+
+    blueprint = Blueprint('challenge_instances', __name__, url_prefix='/api/instances')
+
+    @blueprint.route('/<int:challenge_id>', methods=['GET', 'POST', 'DELETE'])
+    @during_ctf_time_only
+    @authed_only
+    @require_team
+    def team_instance(challenge_id):
+        """
+        Instance de l'équipe pour un challenge
+        GET: instance en cours (prolonge son délai d'inactivité); POST: en obtenir
+        une; DELETE: l'arrêter
+        """
+        pool = get_pool()
+        name = challenge_spec(challenge_id) if pool is not None else None
+        if name is None:
+            return {'success': False, 'error': "Pas d'instance pour ce challenge"}, 404
+
+        team_id = get_current_team().id
+
+        if request.method == 'GET':
+            instance = pool.store.assignment(team_id, name)
+            if instance is None:
+                return {'success': False, 'error': "Aucune instance en cours"}, 404
+            pool.touch(team_id, name)
+            return {'success': True, 'data': instance_data(pool, team_id, name, instance)}
+
+        if request.method == 'DELETE':
+            if not pool.release(team_id, name):
+                return {'success': False, 'error': "Aucune instance en cours"}, 404
+            return {'success': True}
+
+        start = time.perf_counter()
+        result = 'error'
+        try:
+            instance, result = pool.acquire(team_id, name)
+            return {'success': True, 'data': instance_data(pool, team_id, name, instance, result)}
+        except PoolExhausted as e:
+            result = 'exhausted'
+            return {'success': False, 'error': f"Aucune instance disponible: {e}"}, 503
+        except BackendError as e:
+            logger.error(f"Instance de {name} pour l'équipe {team_id}: {e}")
+            return {'success': False, 'error': "Démarrage de l'instance impossible"}, 502
+        finally:
+            acquire_total.inc(challenge=name, result=result)
+            acquire_seconds.observe(time.perf_counter() - start, result=result)
+
+    admin_blueprint = Blueprint('challenge_instances_admin', __name__, url_prefix='/admin/instances')
+
+    @admin_blueprint.route('', methods=['GET'])
+    @admins_only
+    def pool_status():
+        """État du pool et instances affectées"""
+        pool = get_pool()
+        if pool is None:
+            return {'success': True, 'data': {'backend': None}}
+        return {
+            'success': True,
+            'data': {
+                'backend': pool.backend.name,
+                'challenges': pool.status(),
+                'assignments': [
+                    {
+                        'team_id': team_id,
+                        'challenge': instance.challenge,
+                        'connection': instance.connection,
+                        'idle_seconds': round(time.time() - last_seen)
+                    }
+                    for team_id, instance, last_seen in pool.store.assignments()
+                ]
+            }
+        }
+
+    app.register_blueprint(blueprint)
+    app.register_blueprint(admin_blueprint)
+
+    metrics.gauge(
+        'ace_instance_pool',
+        "Instances prêtes (warm) et affectées (assigned), par challenge",
+        pool_gauge
+    )
+
+    if BACKEND:
+        warmup.on_leader('challenge_instances', start_pool_job)
+    else:
+        logger.info("CHALLENGE_INSTANCES_BACKEND non défini: instances par équipe désactivées")
+
+    logger.info("Plugin challenge_instances chargé avec succès")
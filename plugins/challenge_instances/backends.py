@@ -0,0 +1,198 @@
+"""
+Backends d'instances de challenge pour challenge_instances
+Un backend démarre, arrête et liste des instances; il ne sait rien des équipes
+ni du pool. DockerBackend pilote le démon Docker (paquet `docker`, importé à
+la création); FakeBackend simule des instances en mémoire (tests, mesures).
+Ce module ne dépend pas de CTFd.
+"""
+
+import re
+import time
+import socket
+import uuid
+import itertools
+import threading
+from collections import namedtuple
+
+# challenge.yml, bloc `instance:` (image, port, protocol, warm, memory)
+InstanceSpec = namedtuple('InstanceSpec', 'challenge image port protocol warm memory')
+
+# connection: texte affiché à l'équipe (URL ou commande nc)
+Instance = namedtuple('Instance', 'id challenge connection started_at')
+
+# Label posé sur chaque conteneur: retrouver les instances après un redémarrage
+INSTANCE_LABEL = 'ace.instance'
+
+
+class BackendError(Exception):
+    """Démarrage ou arrêt d'une instance impossible"""
+
+
+class Backend:
+    """Interface commune des backends"""
+
+    name = 'abstract'
+
+    def start(self, spec):
+        """Démarrer une instance de `spec` et la retourner une fois joignable"""
+        raise NotImplementedError
+
+    def stop(self, instance_id):
+        """Arrêter et supprimer une instance (sans erreur si elle n'existe plus)"""
+        raise NotImplementedError
+
+    def is_running(self, instance_id):
+        raise NotImplementedError
+
+    def list_ids(self):
+        """Identifiants des instances en marche gérées par ce backend"""
+        raise NotImplementedError
+
+
+class DockerBackend(Backend):
+    """
+    Un conteneur par instance, sur le réseau des challenges, jamais publié sur
+    l'hôte: seul Traefik le joint, par le nom aléatoire de l'instance.
+    http: routé sur <nom>.INSTANCE_DOMAIN (routeur HTTP, labels du conteneur);
+    tcp: routeur TCP de Traefik sur l'entrée TLS `tcp_entrypoint`, choisi par
+    le SNI <nom>.INSTANCE_DOMAIN; Traefik termine le TLS et relaie le flux en
+    clair. Une équipe ne peut pas atteindre l'instance d'une autre sans son nom.
+    start() ne rend l'instance qu'une fois son port joignable depuis CTFd
+    (qui est sur le même réseau), au plus ready_timeout secondes.
+    """
+
+    name = 'docker'
+
+    def __init__(self, network, domain, tcp_entrypoint='websecure', tcp_port=443, ready_timeout=30.0):
+        try:
+            import docker
+        except ImportError:
+            raise BackendError("paquet `docker` absent: pip install docker")
+
+        self.client = docker.from_env()
+        self.errors = docker.errors
+        self.network = network
+        self.domain = domain
+        self.tcp_entrypoint = tcp_entrypoint
+        self.tcp_port = tcp_port
+        self.ready_timeout = ready_timeout
+
+    def _wait_ready(self, container, port):
+        """Attendre que le port du conteneur accepte les connexions sur le réseau des challenges"""
+        deadline = time.monotonic() + self.ready_timeout
+        address = None
+        while time.monotonic() < deadline:
+            if address is None:
+                container.reload()
+                if container.status not in ('created', 'running'):
+                    raise BackendError(f"conteneur arrêté au démarrage ({container.status})")
+                network = container.attrs['NetworkSettings']['Networks'].get(self.network) or {}
+                address = network.get('IPAddress') or None
+            if address is not None:
+                try:
+                    socket.create_connection((address, port), timeout=1).close()
+                    return
+                except OSError:
+                    pass
+            time.sleep(0.2)
+        raise BackendError(f"port {port} injoignable après {self.ready_timeout:g}s")
+
+    def start(self, spec):
+        # Nom de conteneur et sous-domaine: minuscules, chiffres et tirets
+        slug = re.sub(r'[^a-z0-9]+', '-', spec.challenge.lower()).strip('-')[:32] or 'challenge'
+        name = f"ace-{slug}-{uuid.uuid4().hex[:10]}"
+        host = f"{name}.{self.domain}"
+        labels = {INSTANCE_LABEL: spec.challenge, 'traefik.enable': 'true'}
+
+        if spec.protocol == 'http':
+            labels.update({
+                f'traefik.http.routers.{name}.rule': f'Host(`{host}`)',
+                f'traefik.http.services.{name}.loadbalancer.server.port': str(spec.port)
+            })
+            connection = f"http://{host}"
+        else:
+            labels.update({
+                f'traefik.tcp.routers.{name}.rule': f'HostSNI(`{host}`)',
+                f'traefik.tcp.routers.{name}.entrypoints': self.tcp_entrypoint,
+                f'traefik.tcp.routers.{name}.tls': 'true',
+                f'traefik.tcp.services.{name}.loadbalancer.server.port': str(spec.port)
+            })
+            connection = f"openssl s_client -quiet -connect {host}:{self.tcp_port} -servername {host}"
+
+        container = None
+        try:
+            container = self.client.containers.run(
+                spec.image,
+                name=name,
+                detach=True,
+                labels=labels,
+                network=self.network,
+                mem_limit=spec.memory,
+                auto_remove=True
+            )
+            self._wait_ready(container, spec.port)
+        except (self.errors.DockerException, BackendError, KeyError, TypeError) as e:
+            if container is not None:
+                self.stop(container.id)
+            raise BackendError(f"démarrage de {spec.image} impossible: {e}")
+
+        return Instance(container.id, spec.challenge, connection, time.time())
+
+    def stop(self, instance_id):
+        try:
+            self.client.containers.get(instance_id).remove(force=True)
+        except self.errors.NotFound:
+            pass
+        except self.errors.DockerException as e:
+            raise BackendError(f"arrêt de {instance_id[:12]} impossible: {e}")
+
+    def is_running(self, instance_id):
+        try:
+            return self.client.containers.get(instance_id).status == 'running'
+        except self.errors.DockerException:
+            return False
+
+    def list_ids(self):
+        # Conteneurs arrêtés supprimés d'eux-mêmes (auto_remove): seuls ceux en marche comptent
+        containers = self.client.containers.list(filters={'label': INSTANCE_LABEL})
+        return {container.id for container in containers}
+
+
+class FakeBackend(Backend):
+    """
+    Instances simulées en mémoire, propres au processus (tests, un seul worker)
+    start_delay: durée d'un démarrage (celle d'un conteneur réel, pour les mesures)
+    """
+
+    name = 'fake'
+
+    def __init__(self, start_delay=0.0):
+        self.start_delay = start_delay
+        self.running = set()
+        self.started = 0
+        self._ports = itertools.count(30000)
+        self._lock = threading.Lock()
+
+    def start(self, spec):
+        time.sleep(self.start_delay)
+        with self._lock:
+            instance_id = uuid.uuid4().hex
+            self.running.add(instance_id)
+            self.started += 1
+            port = next(self._ports)
+        return Instance(instance_id, spec.challenge, f"nc fake.local {port}", time.time())
+
+    def stop(self, instance_id):
+        with self._lock:
+            self.running.discard(instance_id)
+
+    def is_running(self, instance_id):
+        return instance_id in self.running
+
+    def list_ids(self):
+        with self._lock:
+            return set(self.running)
+
+    def crash(self, instance_id):
+        """Simuler l'arrêt inattendu d'une instance"""
+        self.stop(instance_id)
@@ -0,0 +1,349 @@
+"""
+Pool d'instances par équipe pour challenge_instances
+Chaque challenge garde `warm` instances démarrées d'avance: une équipe qui en
+demande une la reçoit en une opération (LPOP) au lieu d'attendre un démarrage
+de conteneur. Le worker élu remplit le pool, arrête les instances inactives et
+les orphelines; l'état (pool et affectations) est dans Redis pour être partagé
+par tous les workers, sinon en mémoire.
+Ce module ne dépend pas de CTFd.
+"""
+
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from .backends import Instance, BackendError
+
+logger = logging.getLogger(__name__)
+
+
+# Supprime une affectation seulement si elle désigne encore la même instance
+_UNASSIGN_SCRIPT = """
+local current = redis.call('HGET', KEYS[1], ARGV[1])
+if current and cjson.decode(current)['id'] == ARGV[2] then
+    redis.call('HDEL', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], ARGV[1])
+    return 1
+end
+return 0
+"""
+
+
+class PoolExhausted(Exception):
+    """Plus d'instance disponible (limite globale ou par équipe atteinte)"""
+
+
+def _field(team_id, challenge):
+    return f"{team_id}|{challenge}"
+
+
+def _dump(instance):
+    return json.dumps(instance._asdict())
+
+
+def _load(raw):
+    return Instance(**json.loads(raw))
+
+
+class InstanceStore:
+    """
+    Instances prêtes (une liste par challenge) et affectations
+    {(équipe, challenge): instance} avec leur dernière activité
+    """
+
+    WARM_KEY = 'ace:instances:warm:'
+    ASSIGNED_KEY = 'ace:instances:assigned'
+    SEEN_KEY = 'ace:instances:seen'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._warm = {}         # challenge -> [json]
+        self._assigned = {}     # champ -> json
+        self._seen = {}         # champ -> horodatage
+        self._lock = threading.Lock()
+        self._unassign_script = redis_client.register_script(_UNASSIGN_SCRIPT) if redis_client else None
+
+        if redis_client is None:
+            logger.warning("REDIS_URL non défini: pool d'instances propre à chaque worker")
+
+    def pop_warm(self, challenge):
+        """Prendre une instance prête (None si le pool est vide)"""
+        if self.redis is not None:
+            raw = self.redis.lpop(self.WARM_KEY + challenge)
+        else:
+            with self._lock:
+                warm = self._warm.get(challenge)
+                raw = warm.pop(0) if warm else None
+        return _load(raw) if raw else None
+
+    def push_warm(self, instance):
+        raw = _dump(instance)
+        if self.redis is not None:
+            self.redis.rpush(self.WARM_KEY + instance.challenge, raw)
+        else:
+            with self._lock:
+                self._warm.setdefault(instance.challenge, []).append(raw)
+
+    def warm(self, challenge):
+        """Instances prêtes d'un challenge, sans les retirer"""
+        if self.redis is not None:
+            raws = self.redis.lrange(self.WARM_KEY + challenge, 0, -1)
+        else:
+            with self._lock:
+                raws = list(self._warm.get(challenge, ()))
+        return [_load(raw) for raw in raws]
+
+    def remove_warm(self, instance):
+        """Retirer une instance prête; False si un worker l'a déjà prise"""
+        raw = _dump(instance)
+        if self.redis is not None:
+            return self.redis.lrem(self.WARM_KEY + instance.challenge, 1, raw) > 0
+        with self._lock:
+            warm = self._warm.get(instance.challenge, [])
+            if raw in warm:
+                warm.remove(raw)
+                return True
+            return False
+
+    def assign(self, team_id, instance, now):
+        """Affecter si l'équipe n'a pas déjà une instance de ce challenge; retourne l'instance retenue"""
+        field = _field(team_id, instance.challenge)
+        raw = _dump(instance)
+        if self.redis is not None:
+            pipe = self.redis.pipeline()
+            pipe.hsetnx(self.ASSIGNED_KEY, field, raw)
+            pipe.hget(self.ASSIGNED_KEY, field)
+            pipe.hset(self.SEEN_KEY, field, now)
+            _, current, _ = pipe.execute()
+            return _load(current)
+        with self._lock:
+            current = self._assigned.setdefault(field, raw)
+            self._seen[field] = now
+            return _load(current)
+
+    def assignment(self, team_id, challenge):
+        field = _field(team_id, challenge)
+        if self.redis is not None:
+            raw = self.redis.hget(self.ASSIGNED_KEY, field)
+        else:
+            with self._lock:
+                raw = self._assigned.get(field)
+        return _load(raw) if raw else None
+
+    def unassign(self, team_id, instance):
+        """Retirer l'affectation si elle désigne encore `instance`"""
+        field = _field(team_id, instance.challenge)
+        if self.redis is not None:
+            return bool(self._unassign_script(keys=[self.ASSIGNED_KEY, self.SEEN_KEY], args=[field, instance.id]))
+        with self._lock:
+            raw = self._assigned.get(field)
+            if raw is None or _load(raw).id != instance.id:
+                return False
+            del self._assigned[field]
+            self._seen.pop(field, None)
+            return True
+
+    def touch(self, team_id, challenge, now):
+        field = _field(team_id, challenge)
+        if self.redis is not None:
+            self.redis.hset(self.SEEN_KEY, field, now)
+        else:
+            with self._lock:
+                self._seen[field] = now
+
+    def last_seen(self, team_id, challenge):
+        field = _field(team_id, challenge)
+        if self.redis is not None:
+            value = self.redis.hget(self.SEEN_KEY, field)
+        else:
+            with self._lock:
+                value = self._seen.get(field)
+        return float(value) if value is not None else None
+
+    def assignments(self):
+        """Toutes les affectations [(équipe, instance, dernière activité)]"""
+        if self.redis is not None:
+            pipe = self.redis.pipeline(transaction=False)
+            pipe.hgetall(self.ASSIGNED_KEY)
+            pipe.hgetall(self.SEEN_KEY)
+            assigned, seen = pipe.execute()
+        else:
+            with self._lock:
+                assigned, seen = dict(self._assigned), dict(self._seen)
+
+        return [
+            (int(field.split('|', 1)[0]), _load(raw), float(seen.get(field, 0)))
+            for field, raw in assigned.items()
+        ]
+
+
+class InstancePool:
+    """
+    Attribution des instances aux équipes et entretien du pool
+    on_spawn(challenge, secondes, raison) et on_stop(challenge, raison) sont
+    appelés pour les métriques.
+    """
+
+    def __init__(self, backend, store, specs, idle_seconds=1800, max_instances=100,
+                 max_per_team=3, spawn_workers=4, on_spawn=None, on_stop=None):
+        self.backend = backend
+        self.store = store
+        self.specs = specs              # {challenge: InstanceSpec}
+        self.idle_seconds = idle_seconds
+        self.max_instances = max_instances
+        self.max_per_team = max_per_team
+        self.spawn_workers = spawn_workers
+        self.on_spawn = on_spawn or (lambda challenge, seconds, reason: None)
+        self.on_stop = on_stop or (lambda challenge, reason: None)
+        # Orphelins vus à la passe précédente: un démarrage à la demande en cours
+        # n'est pas encore dans le store, il n'est arrêté qu'à la deuxième passe
+        self._suspects = set()
+
+    def _spawn(self, spec, reason):
+        start = time.perf_counter()
+        instance = self.backend.start(spec)
+        self.on_spawn(spec.challenge, time.perf_counter() - start, reason)
+        return instance
+
+    def _stop(self, instance, reason):
+        try:
+            self.backend.stop(instance.id)
+        except BackendError as e:
+            logger.error(f"Instance {instance.id[:12]} ({instance.challenge}): {e}")
+        self.on_stop(instance.challenge, reason)
+
+    def acquire(self, team_id, challenge, now=None):
+        """
+        Instance de l'équipe pour `challenge`: (instance, résultat) avec
+        résultat 'reused' (déjà affectée), 'hit' (prise dans le pool) ou
+        'miss' (démarrée à la demande)
+        """
+        spec = self.specs[challenge]
+        now = now or time.time()
+
+        current = self.store.assignment(team_id, challenge)
+        if current is not None:
+            if self.backend.is_running(current.id):
+                self.store.touch(team_id, challenge, now)
+                return current, 'reused'
+            self.store.unassign(team_id, current)
+            self.on_stop(challenge, 'dead')
+
+        assignments = self.store.assignments()
+        if sum(1 for team, _, _ in assignments if team == team_id) >= self.max_per_team:
+            raise PoolExhausted(f"{self.max_per_team} instances au plus par équipe")
+
+        instance, result = None, 'hit'
+        while instance is None:
+            instance = self.store.pop_warm(challenge)
+            if instance is None:
+                break
+            if not self.backend.is_running(instance.id):
+                self.on_stop(challenge, 'dead')
+                instance = None
+
+        if instance is None:
+            if len(assignments) + self.warm_total() >= self.max_instances:
+                raise PoolExhausted(f"limite de {self.max_instances} instances atteinte")
+            instance, result = self._spawn(spec, 'on_demand'), 'miss'
+
+        kept = self.store.assign(team_id, instance, now)
+        if kept.id != instance.id:
+            # Deux requêtes simultanées de la même équipe: l'instance en trop retourne au pool
+            self.store.push_warm(instance)
+            return kept, 'reused'
+        return instance, result
+
+    def release(self, team_id, challenge):
+        """Arrêter l'instance de l'équipe; False si elle n'en avait pas"""
+        current = self.store.assignment(team_id, challenge)
+        if current is None or not self.store.unassign(team_id, current):
+            return False
+        self._stop(current, 'released')
+        return True
+
+    def touch(self, team_id, challenge, now=None):
+        self.store.touch(team_id, challenge, now or time.time())
+
+    def expires_at(self, team_id, challenge):
+        last_seen = self.store.last_seen(team_id, challenge)
+        return last_seen + self.idle_seconds if last_seen is not None else None
+
+    def warm_total(self):
+        return sum(len(self.store.warm(challenge)) for challenge in self.specs)
+
+    def maintain(self, now=None):
+        """
+        Une passe d'entretien (worker élu): arrêt des instances inactives,
+        retrait des instances prêtes mortes, arrêt des orphelines, puis
+        remplissage du pool (démarrages en parallèle)
+        """
+        now = now or time.time()
+        stats = {'reaped': 0, 'dead': 0, 'orphans': 0, 'started': 0, 'failed': 0}
+
+        running = self.backend.list_ids()
+        active = []
+        for team_id, instance, last_seen in self.store.assignments():
+            if instance.id not in running:
+                if self.store.unassign(team_id, instance):
+                    self.on_stop(instance.challenge, 'dead')
+                    stats['dead'] += 1
+            elif now - last_seen > self.idle_seconds or instance.challenge not in self.specs:
+                if self.store.unassign(team_id, instance):
+                    self._stop(instance, 'idle')
+                    stats['reaped'] += 1
+            else:
+                active.append(instance)
+
+        warm = {}
+        for challenge in self.specs:
+            warm[challenge] = []
+            for instance in self.store.warm(challenge):
+                if instance.id in running:
+                    warm[challenge].append(instance)
+                elif self.store.remove_warm(instance):
+                    self.on_stop(challenge, 'dead')
+                    stats['dead'] += 1
+
+        known = {instance.id for instance in active}
+        known.update(instance.id for instances in warm.values() for instance in instances)
+        orphans = running - known
+        for instance_id in orphans & self._suspects:
+            try:
+                self.backend.stop(instance_id)
+                stats['orphans'] += 1
+            except BackendError as e:
+                logger.error(f"Instance orpheline {instance_id[:12]}: {e}")
+        self._suspects = orphans - self._suspects
+
+        # Places libres sous la limite globale, réparties dans l'ordre des challenges
+        room = self.max_instances - len(active) - sum(len(instances) for instances in warm.values())
+        to_start = []
+        for challenge, spec in self.specs.items():
+            missing = min(max(spec.warm - len(warm[challenge]), 0), max(room, 0))
+            to_start.extend([spec] * missing)
+            room -= missing
+
+        if to_start:
+            with ThreadPoolExecutor(max_workers=self.spawn_workers) as executor:
+                futures = [executor.submit(self._spawn, spec, 'warm') for spec in to_start]
+                for future in futures:
+                    try:
+                        self.store.push_warm(future.result())
+                        stats['started'] += 1
+                    except BackendError as e:
+                        logger.error(f"Remplissage du pool: {e}")
+                        stats['failed'] += 1
+
+        return stats
+
+    def status(self):
+        """Par challenge: instances prêtes, affectées et cible du pool"""
+        counts = {challenge: {'warm': len(self.store.warm(challenge)), 'assigned': 0, 'target': spec.warm}
+                  for challenge, spec in self.specs.items()}
+        for _, instance, _ in self.store.assignments():
+            if instance.challenge in counts:
+                counts[instance.challenge]['assigned'] += 1
+        return counts
@@ -6,16 +6,29 @@ from CTFd.utils.security.auth import generate_user_token
 from CTFd.utils import set_config
 from werkzeug.security import generate_password_hash
 import CTFd.utils.config
+from CTFd.plugins.ace_common.warmup import timed_load, startup_lock
 
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 
+@timed_load
 def load(app):
+    # Config en cache: vérification sans requête SQL une fois CTFd configuré
     if CTFd.utils.config.is_setup():
         logger.info("✅ CTFd déjà configuré - initial_setup ignoré")
         return
 
+    # Premier démarrage: un seul worker initialise, les autres attendent puis relisent la config
+    with startup_lock():
+        if CTFd.utils.config.is_setup():
+            logger.info("✅ CTFd configuré par un autre worker - initial_setup ignoré")
+            return
+
+        setup(app)
+
+
+def setup(app):
+    """Configurer CTFd et créer l'admin"""
     logger.info("⚠️  CTFd n'est pas configuré - Initialisation automatique...")
 
     with app.app_context():
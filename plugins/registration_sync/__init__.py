@@ -1,15 +1,20 @@
 import os
+import time
 import requests
 import logging
-from flask import Blueprint, request
+from flask import Blueprint, request, g
 from apscheduler.schedulers.background import BackgroundScheduler
 from CTFd.models import db, Teams, Users
+from CTFd.cache import cache
 from CTFd.utils.security.auth import generate_user_token
 from CTFd.plugins import bypass_csrf_protection
+from CTFd.utils.user import get_ip
+from CTFd.plugins.ace_common import warmup, metrics, profiling
+from CTFd.plugins.ace_common.ratelimit import rate_limit
+from CTFd.plugins.room_display import ingest_room_assignments
 from datetime import datetime
+from .snapshot import TeamSnapshot
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -17,6 +22,42 @@ REGISTRATION_SITE_URL = os.getenv('REGISTRATION_SITE_URL', 'http://backend:5000/
 ADMIN_EMAIL = os.getenv('REGISTRATION_SITE_ADMIN_EMAIL', 'admin@ace-escapegame.com')
 ADMIN_PASSWORD = os.getenv('REGISTRATION_SITE_ADMIN_PASSWORD', '')
 
+# Limite de débit des webhooks non signés ou mal signés, par IP source
+# (les webhooks correctement signés ne sont jamais refusés)
+WEBHOOK_BURST = int(os.getenv('WEBHOOK_RATE_LIMIT_BURST', '20'))
+WEBHOOK_REFILL = float(os.getenv('WEBHOOK_RATE_LIMIT_REFILL', '1'))
+
+# Correspondance équipe du site -> équipe CTFd, partagée via le cache CTFd
+TEAM_MAPPING_PREFIX = 'registration_sync:team:'
+
+# Snapshot local des équipes (volume persistant des uploads)
+SNAPSHOT_PATH = os.getenv('REGISTRATION_SNAPSHOT_PATH', '/var/uploads/registration_sync/teams.json.gz')
+# Au-delà de cet âge, le scheduler refait une synchronisation complète (suppressions)
+FULL_SYNC_SECONDS = int(os.getenv('REGISTRATION_FULL_SYNC_SECONDS', '1800'))
+
+# Métriques (/metrics)
+sync_seconds = metrics.Histogram(
+    'ace_registration_sync_seconds',
+    "Durée de la synchronisation des équipes, par phase et mode"
+)
+teams_synced = metrics.Counter(
+    'ace_registration_teams_total',
+    "Équipes traitées par la synchronisation (created, updated, skipped, error)"
+)
+webhook_seconds = metrics.Histogram(
+    'ace_webhook_seconds',
+    "Durée de traitement des webhooks du site d'inscription"
+)
+webhook_events = metrics.Counter(
+    'ace_webhook_events_total',
+    "Webhooks reçus, par événement"
+)
+webhook_lag = metrics.Histogram(
+    'ace_webhook_lag_seconds',
+    "Délai entre l'émission d'un webhook (champ timestamp) et sa réception",
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300)
+)
+
 # Scheduler global
 scheduler = None
 
@@ -32,7 +73,8 @@ class RegistrationSiteAPI:
     def authenticate(self):
         """Se connecter à l'API et obtenir un token JWT"""
         try:
-            response = requests.post(
+            response = metrics.timed_request(
+                'POST',
                 f"{self.base_url}/auth/login",
                 json={
                     "email": ADMIN_EMAIL,
@@ -55,19 +97,26 @@ class RegistrationSiteAPI:
             logger.error(f"Erreur de connexion au site d'inscription: {e}")
             return False
 
-    def get_teams(self):
-        """Récupérer toutes les équipes depuis le site"""
+    def get_teams(self, updated_since=None, retry=True):
+        """
+        Récupérer les équipes depuis le site (seulement celles modifiées
+        depuis `updated_since` si fourni)
+        Retourne None si le site est injoignable
+        """
         if not self.token:
             if not self.authenticate():
-                return []
+                return None
+
+        params = {'updatedSince': updated_since} if updated_since else None
 
         try:
             # Récupérer toutes les équipes (pas seulement les complètes)
             # pour permettre la synchronisation même si l'équipe n'est pas encore complète
-            response = requests.get(
+            response = metrics.timed_request(
+                'GET',
                 f"{self.base_url}/admin/teams",
                 headers={"Authorization": f"Bearer {self.token}"},
-                # Ne pas filtrer par complete pour synchroniser toutes les équipes
+                params=params,
                 timeout=10
             )
             response.raise_for_status()
@@ -77,14 +126,14 @@ class RegistrationSiteAPI:
                 teams = data['data']['teams']
                 logger.info(f"Récupéré {len(teams)} équipes depuis le site")
                 return teams
-            return []
+            return None
 
         except requests.exceptions.RequestException as e:
             logger.error(f"Erreur lors de la récupération des équipes: {e}")
-            # Retry with new token
-            if self.authenticate():
-                return self.get_teams()
-            return []
+            # Une seule nouvelle tentative avec un nouveau token
+            if retry and self.authenticate():
+                return self.get_teams(updated_since, retry=False)
+            return None
 
     def update_team_ctfd_id(self, team_id, ctfd_team_id):
         """Mettre à jour le ctfdTeamId sur le site d'inscription"""
@@ -93,7 +142,8 @@ class RegistrationSiteAPI:
                 return False
 
         try:
-            response = requests.patch(
+            response = metrics.timed_request(
+                'PATCH',
                 f"{self.base_url}/admin/teams/{team_id}",
                 json={"ctfdTeamId": ctfd_team_id},
                 headers={"Authorization": f"Bearer {self.token}"},
@@ -111,14 +161,177 @@ class RegistrationSiteAPI:
 # Instance globale de l'API
 api_client = RegistrationSiteAPI()
 
+# Dernier état réconcilié des équipes
+team_snapshot = TeamSnapshot(SNAPSHOT_PATH)
+
+
+def remember_team_mappings(mappings):
+    """
+    Enregistrer la correspondance {id équipe du site: {'ctfd_team_id', 'captain_id'}}
+    Utilisée par auth_sync pour résoudre l'équipe au login sans appel réseau.
+    """
+    if mappings:
+        cache.set_many(
+            {f"{TEAM_MAPPING_PREFIX}{team_id}": mapping for team_id, mapping in mappings.items()},
+            timeout=0
+        )
+
+
+def lookup_team_mapping(registration_team_id):
+    """Retourner la correspondance d'une équipe du site, ou None si inconnue"""
+    return cache.get(f"{TEAM_MAPPING_PREFIX}{registration_team_id}")
+
+
+def forget_team_mapping(registration_team_id):
+    cache.delete(f"{TEAM_MAPPING_PREFIX}{registration_team_id}")
+
+
+def lookup_snapshot_team_mapping(registration_team_id):
+    """
+    Correspondance d'une équipe lue dans le snapshot local (relu s'il a changé),
+    pour un worker dont le cache ne la connaît pas encore; None si inconnue
+    """
+    if not team_snapshot.load():
+        return None
+    team = (team_snapshot.teams or {}).get(registration_team_id)
+    if not team or not team.get('ctfdTeamId'):
+        return None
+
+    mapping = {'ctfd_team_id': team['ctfdTeamId'], 'captain_id': team.get('captainId')}
+    remember_team_mappings({registration_team_id: mapping})
+    return mapping
+
 # Variable globale pour stocker l'application Flask
 flask_app = None
 
 
-def sync_teams_from_registration_site():
+def webhook_signature_status():
+    """
+    Vérifier la signature HMAC du webhook en cours: 'valid', 'missing' ou 'invalid'
+    Le résultat est gardé dans g, la vérification servant au limiteur puis à la route.
+    """
+    if 'webhook_signature' in g:
+        return g.webhook_signature
+
+    import hmac
+    import hashlib
+
+    WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', 'changeme_webhook_secret')
+
+    signature = request.headers.get('X-Webhook-Signature')
+    if not signature:
+        status = 'missing'
+    else:
+        expected_signature = hmac.new(
+            WEBHOOK_SECRET.encode(),
+            request.get_data(),
+            hashlib.sha256
+        ).hexdigest()
+        status = 'valid' if hmac.compare_digest(signature, expected_signature) else 'invalid'
+
+    g.webhook_signature = status
+    return status
+
+
+def webhook_rate_limit_key():
+    """
+    Clé du limiteur de webhooks: aucune (pas de limite) pour un webhook bien
+    signé, dont le site d'inscription ne renvoie pas les événements refusés;
+    l'IP source sinon
+    """
+    if webhook_signature_status() == 'valid':
+        return None
+    return get_ip()
+
+
+def record_webhook(data):
+    """Compter un webhook et mesurer son délai d'acheminement si le site fournit un timestamp"""
+    webhook_events.inc(event=data.get('event') or 'unknown')
+
+    sent_at = data.get('timestamp')
+    try:
+        if isinstance(sent_at, (int, float)):
+            # Secondes ou millisecondes (Date.now())
+            sent_at = sent_at / 1000 if sent_at > 1e11 else sent_at
+        elif isinstance(sent_at, str):
+            sent_at = datetime.fromisoformat(sent_at.replace('Z', '+00:00')).timestamp()
+        else:
+            return
+    except ValueError:
+        return
+
+    webhook_lag.observe(max(0.0, time.time() - sent_at))
+
+
+def fetch_teams_to_reconcile(full):
+    """
+    Retourner (équipes à réconcilier, toutes les équipes connues, mode)
+    - 'full': toutes les équipes du site
+    - 'delta': équipes modifiées depuis le snapshot (le reste vient du snapshot)
+    - 'snapshot': site injoignable, toutes les équipes du snapshot
+    Retourne (None, None, None) si ni le site ni le snapshot ne sont disponibles.
+    """
+    has_snapshot = team_snapshot.load()
+    stale = (
+        not has_snapshot
+        or team_snapshot.full_sync_at is None
+        or time.time() - team_snapshot.full_sync_at > FULL_SYNC_SECONDS
+    )
+    since = None if full or stale else team_snapshot.cursor
+
+    fetched = api_client.get_teams(updated_since=since)
+
+    if fetched is None:
+        if not has_snapshot:
+            return None, None, None
+        logger.warning("Site d'inscription injoignable, réconciliation depuis le snapshot local")
+        teams = team_snapshot.merge([])
+        return teams, teams, 'snapshot'
+
+    if since:
+        return fetched, team_snapshot.merge(fetched), 'delta'
+
+    return fetched, fetched, 'full'
+
+
+def publish_team_index(teams):
+    """Publier les salles (room_display) et la correspondance des équipes (auth_sync)"""
+    # Affectations de salle {ctfd_team_id: roomNumber} pour room_display
+    room_assignments = {}
+    team_mappings = {}
+
+    for team in teams:
+        ctfd_team_id = team.get('ctfdTeamId')
+        if not ctfd_team_id:
+            continue
+        room_assignments[ctfd_team_id] = team.get('roomNumber')
+        team_mappings[team['id']] = {
+            'ctfd_team_id': ctfd_team_id,
+            'captain_id': team.get('captainId')
+        }
+
+    ingest_room_assignments(room_assignments)
+    remember_team_mappings(team_mappings)
+
+
+def restore_from_snapshot():
+    """
+    Publier l'index des équipes depuis le snapshot local au démarrage, avant
+    toute réponse du site d'inscription
+    """
+    if not team_snapshot.load():
+        logger.info("Pas de snapshot des équipes, attente de la première synchronisation")
+        return
+
+    publish_team_index(team_snapshot.merge([]))
+
+
+def sync_teams_from_registration_site(full=True):
     """
     Fonction principale de synchronisation
-    Appelée toutes les 2 minutes par le scheduler
+    Appelée toutes les 5 minutes par le scheduler (full=False: seulement les
+    équipes modifiées, avec une synchronisation complète toutes les
+    FULL_SYNC_SECONDS) et par les webhooks (full=True)
     """
     global flask_app
     
@@ -132,15 +345,22 @@ def sync_teams_from_registration_site():
     with flask_app.app_context():
         try:
             # Récupérer les équipes du site d'inscription
-            teams_data = api_client.get_teams()
+            started = time.perf_counter()
+            teams_data, all_teams, mode = fetch_teams_to_reconcile(full)
+            sync_seconds.observe(time.perf_counter() - started, phase='fetch', mode=mode or 'none')
 
-            if not teams_data:
+            if teams_data is None or (not teams_data and mode == 'full'):
                 logger.warning("Aucune équipe récupérée")
                 return
 
+            if not teams_data:
+                logger.info("=== Aucune équipe modifiée depuis la dernière synchronisation ===")
+                return
+
             created_count = 0
             updated_count = 0
             error_count = 0
+            phase_started = time.perf_counter()
 
             for team_data in teams_data:
                 try:
@@ -185,7 +405,8 @@ def sync_teams_from_registration_site():
                                 from CTFd.utils.security.passwords import hash_password
                                 import os
 
-                                fake_password = hash_password(os.urandom(32).hex())
+                                with profiling.span('bcrypt'):
+                                    fake_password = hash_password(os.urandom(32).hex())
                                 username = member_email.split('@')[0]
 
                                 new_user = Users(
@@ -221,6 +442,7 @@ def sync_teams_from_registration_site():
                                 logger.info(f"Capitaine mis à jour pour {existing_team.name}: {captain_email}")
 
                         db.session.commit()
+                        team_data['ctfdTeamId'] = existing_team.id
                         updated_count += 1
                         continue
 
@@ -251,7 +473,8 @@ def sync_teams_from_registration_site():
                             from CTFd.utils.security.passwords import hash_password
                             import os
 
-                            fake_password = hash_password(os.urandom(32).hex())
+                            with profiling.span('bcrypt'):
+                                fake_password = hash_password(os.urandom(32).hex())
                             username = member_email.split('@')[0]
 
                             new_user = Users(
@@ -285,6 +508,7 @@ def sync_teams_from_registration_site():
                             logger.info(f"Capitaine assigné pour {new_team.name}: {captain_email}")
 
                     db.session.commit()
+                    team_data['ctfdTeamId'] = new_team.id
 
                     # Informer le site d'inscription du ctfdTeamId
                     api_client.update_team_ctfd_id(team_data['id'], new_team.id)
@@ -294,10 +518,32 @@ def sync_teams_from_registration_site():
                 except Exception as e:
                     logger.error(f"Erreur lors du traitement de l'équipe {team_data.get('name')}: {e}")
                     db.session.rollback()
+                    # Pas de correspondance pour une équipe non réconciliée
+                    team_data.pop('ctfdTeamId', None)
                     error_count += 1
                     continue
 
-            logger.info(f"=== Synchronisation terminée: {created_count} créées, {updated_count} existantes, {error_count} erreurs ===")
+            sync_seconds.observe(time.perf_counter() - phase_started, phase='reconcile', mode=mode)
+
+            phase_started = time.perf_counter()
+            publish_team_index(all_teams)
+            sync_seconds.observe(time.perf_counter() - phase_started, phase='publish', mode=mode)
+
+            phase_started = time.perf_counter()
+            try:
+                # Une équipe en échec garde le curseur: le prochain delta la réessaie
+                team_snapshot.save(all_teams, full=(mode == 'full'), advance_cursor=(error_count == 0))
+            except OSError as e:
+                logger.error(f"Impossible d'écrire le snapshot des équipes: {e}")
+            sync_seconds.observe(time.perf_counter() - phase_started, phase='snapshot', mode=mode)
+            sync_seconds.observe(time.perf_counter() - started, phase='total', mode=mode)
+
+            teams_synced.inc(created_count, result='created')
+            teams_synced.inc(updated_count, result='updated')
+            teams_synced.inc(error_count, result='error')
+            teams_synced.inc(len(all_teams) - len(teams_data), result='skipped')
+
+            logger.info(f"=== Synchronisation {mode} terminée: {created_count} créées, {updated_count} existantes, {error_count} erreurs ===")
 
         except Exception as e:
             logger.error(f"Erreur critique lors de la synchronisation: {e}")
@@ -312,9 +558,45 @@ def generate_random_password(length=12):
     return ''.join(secrets.choice(alphabet) for _ in range(length))
 
 
+def start_sync_scheduler():
+    """
+    Démarrer la synchronisation périodique des équipes
+    Exécuté par un seul worker (ace_common.warmup): l'index des équipes est
+    d'abord restauré depuis le snapshot local, puis la première
+    synchronisation part immédiatement (seulement le delta si le snapshot est
+    récent), puis toutes les 5 minutes.
+    """
+    global scheduler
+
+    if scheduler and scheduler.running:
+        return
+
+    restore_from_snapshot()
+
+    scheduler = BackgroundScheduler()
+    metrics.instrument_scheduler(scheduler)
+
+    # Synchronisation toutes les 5 minutes (fallback si webhooks échouent)
+    # Les webhooks assurent la synchronisation temps réel
+    scheduler.add_job(
+        func=sync_teams_from_registration_site,
+        trigger='interval',
+        minutes=5,
+        kwargs={'full': False},
+        next_run_time=datetime.now(),
+        id='sync_teams',
+        name='Sync teams from registration site',
+        replace_existing=True
+    )
+
+    scheduler.start()
+    logger.info("Scheduler de synchronisation démarré (toutes les 5 minutes)")
+
+
+@warmup.timed_load
 def load(app):
     """Charger le plugin dans CTFd"""
-    global scheduler, flask_app
+    global flask_app
     
     # Stocker l'application Flask pour l'utiliser dans le scheduler
     flask_app = app
@@ -349,19 +631,22 @@ def load(app):
         @admins_only
         def status():
             try:
+                team_snapshot.load()
                 if api_client.authenticate():
-                    teams_count = len(api_client.get_teams())
+                    teams_count = len(api_client.get_teams() or [])
                     return {
                         'success': True,
                         'connected': True,
                         'teams_available': teams_count,
-                        'site_url': REGISTRATION_SITE_URL
+                        'site_url': REGISTRATION_SITE_URL,
+                        'snapshot': team_snapshot.stats()
                     }
                 else:
                     return {
                         'success': False,
                         'connected': False,
-                        'error': 'Impossible de se connecter au site'
+                        'error': 'Impossible de se connecter au site',
+                        'snapshot': team_snapshot.stats()
                     }
             except Exception as e:
                 return {
@@ -374,30 +659,21 @@ def load(app):
 
     @blueprint.route('/webhook', methods=['POST'])
     @bypass_csrf_protection
+    @metrics.track_view(webhook_seconds)
+    @rate_limit('webhook', webhook_rate_limit_key, WEBHOOK_BURST, WEBHOOK_REFILL)
     def webhook_sync():
         """Endpoint webhook pour synchronisation instantanée depuis le backend"""
-        import hmac
-        import hashlib
-
-        WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', 'changeme_webhook_secret')
-
-        signature = request.headers.get('X-Webhook-Signature')
-        if not signature:
+        signature = webhook_signature_status()
+        if signature == 'missing':
             return {'success': False, 'error': 'Missing signature'}, 401
 
-        body = request.get_data()
-        expected_signature = hmac.new(
-            WEBHOOK_SECRET.encode(),
-            body,
-            hashlib.sha256
-        ).hexdigest()
-
-        if not hmac.compare_digest(signature, expected_signature):
+        if signature != 'valid':
             logger.warning("Webhook signature invalide")
             return {'success': False, 'error': 'Invalid signature'}, 401
 
         data = request.get_json()
         event_type = data.get('event')
+        record_webhook(data)
 
         logger.info(f"Webhook reçu: {event_type}")
 
@@ -416,31 +692,22 @@ def load(app):
 
     @webhook_blueprint.route('/webhook', methods=['POST'])
     @bypass_csrf_protection
+    @metrics.track_view(webhook_seconds)
+    @rate_limit('webhook', webhook_rate_limit_key, WEBHOOK_BURST, WEBHOOK_REFILL)
     def webhook_public():
         """Endpoint webhook public pour synchronisation instantanée depuis le backend"""
-        import hmac
-        import hashlib
-
-        WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', 'changeme_webhook_secret')
-
-        signature = request.headers.get('X-Webhook-Signature')
-        if not signature:
+        signature = webhook_signature_status()
+        if signature == 'missing':
             logger.warning("Webhook reçu sans signature")
             return {'success': False, 'error': 'Missing signature'}, 401
 
-        body = request.get_data()
-        expected_signature = hmac.new(
-            WEBHOOK_SECRET.encode(),
-            body,
-            hashlib.sha256
-        ).hexdigest()
-
-        if not hmac.compare_digest(signature, expected_signature):
+        if signature != 'valid':
             logger.warning("Webhook signature invalide")
             return {'success': False, 'error': 'Invalid signature'}, 401
 
         data = request.get_json()
         event_type = data.get('event')
+        record_webhook(data)
         event_data = data.get('data', {})
 
         logger.info(f"Webhook reçu: {event_type} - Data: {event_data}")
@@ -489,6 +756,11 @@ def load(app):
                         logger.info(f"Équipe supprimée via webhook: {team.name} (ID: {team.id})")
 
                     db.session.commit()
+
+                    if team_id_to_delete:
+                        forget_team_mapping(team_id_to_delete)
+                        team_snapshot.remove(team_id_to_delete)
+
                     return {'success': True, 'message': 'Équipe supprimée'}
                 except Exception as e:
                     logger.error(f"Erreur lors de la suppression de l'équipe: {e}")
@@ -509,7 +781,8 @@ def load(app):
                         api_client.authenticate()
                     
                     # Récupérer les infos utilisateur du site d'inscription pour trouver l'email
-                    response = requests.get(
+                    response = metrics.timed_request(
+                        'GET',
                         f"{REGISTRATION_SITE_URL}/admin/users/{user_id}",
                         headers={"Authorization": f"Bearer {api_client.token}"},
                         timeout=10
@@ -557,31 +830,7 @@ def load(app):
     app.register_blueprint(blueprint)
     app.register_blueprint(webhook_blueprint)
 
-    # Configurer le scheduler pour la synchronisation automatique
-    if not scheduler or not scheduler.running:
-        scheduler = BackgroundScheduler()
-
-        # Synchronisation toutes les 5 minutes (fallback si webhooks échouent)
-        # Les webhooks assurent la synchronisation temps réel
-        scheduler.add_job(
-            func=sync_teams_from_registration_site,
-            trigger='interval',
-            minutes=5,
-            id='sync_teams',
-            name='Sync teams from registration site',
-            replace_existing=True
-        )
-
-        # Synchronisation immédiate au démarrage (après 10 secondes)
-        scheduler.add_job(
-            func=sync_teams_from_registration_site,
-            trigger='date',
-            run_date=datetime.now(),
-            id='sync_teams_startup',
-            name='Initial team sync'
-        )
-
-        scheduler.start()
-        logger.info("Scheduler de synchronisation démarré (toutes les minutes)")
+    # Scheduler et première synchronisation dans le seul worker élu, après le démarrage
+    warmup.on_leader('registration_sync', start_sync_scheduler)
 
     logger.info("Plugin registration_sync chargé avec succès")
@@ -0,0 +1,182 @@
+"""
+Snapshot local des équipes du site d'inscription
+Dernier état réconcilié (équipes, membres, ctfdTeamId, salle), en JSON gzip
+versionné sur le volume des uploads. Il permet au redémarrage de restaurer la
+correspondance des équipes sans le site, de réconcilier depuis le snapshot
+pendant une panne, et de ne demander ensuite que les équipes modifiées.
+Les écritures de tous les workers passent par un verrou fcntl et relisent le
+fichier s'il a changé; une équipe supprimée par webhook reste notée (`removed`)
+jusqu'à la prochaine synchronisation complète pour qu'une synchronisation
+incrémentale partie d'un état plus ancien ne la réintroduise pas.
+"""
+
+import os
+import gzip
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+
+# Champs conservés (ceux utilisés par la synchronisation)
+TEAM_FIELDS = ('id', 'name', 'inviteCode', 'captainId', 'roomNumber', 'ctfdTeamId', 'updatedAt')
+MEMBER_FIELDS = ('id', 'email')
+
+
+def compact_team(team):
+    """Ne garder que les champs utiles d'une équipe"""
+    compact = {field: team.get(field) for field in TEAM_FIELDS if team.get(field) is not None}
+    compact['members'] = [
+        {field: member.get(field) for field in MEMBER_FIELDS}
+        for member in team.get('members', [])
+    ]
+    return compact
+
+
+class TeamSnapshot:
+    """Snapshot des équipes gardé en mémoire, relu si un autre worker l'a réécrit"""
+
+    def __init__(self, path):
+        self.path = path
+        self.teams = None       # {id équipe du site: équipe}
+        self.cursor = None      # plus grand updatedAt connu (ISO 8601)
+        self.saved_at = None
+        self.full_sync_at = None  # dernière synchronisation complète
+        self.removed = {}       # {id équipe du site: horodatage} supprimées depuis la dernière complète
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _file_lock(self):
+        """Verrou exclusif entre les workers pour relire puis réécrire le snapshot"""
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(f"{self.path}.lock", 'a') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+    def load(self):
+        """Charger le snapshot depuis le disque; False s'il est absent ou illisible"""
+        with self._lock:
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except FileNotFoundError:
+                return self.teams is not None
+
+            if self.teams is not None and mtime == self._mtime:
+                return True
+
+            try:
+                with gzip.open(self.path, 'rt', encoding='utf-8') as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Snapshot des équipes illisible ({self.path}): {e}")
+                return False
+
+            if data.get('version') != SNAPSHOT_VERSION:
+                logger.warning(f"Snapshot des équipes ignoré: version {data.get('version')}")
+                return False
+
+            self.teams = {team['id']: team for team in data['teams']}
+            self.cursor = data.get('cursor')
+            self.saved_at = data.get('saved_at')
+            self.full_sync_at = data.get('full_sync_at')
+            self.removed = data.get('removed') or {}
+            self._mtime = mtime
+            logger.info(f"Snapshot des équipes chargé: {len(self.teams)} équipes")
+            return True
+
+    def merge(self, changed):
+        """Retourner les équipes du snapshot mises à jour par `changed` (delta du site)"""
+        with self._lock:
+            teams = dict(self.teams or {})
+        for team in changed:
+            teams[team['id']] = team
+        return list(teams.values())
+
+    def save(self, teams, full=False, advance_cursor=True):
+        """
+        Remplacer le snapshot (écriture atomique); `full` si `teams` vient d'une
+        synchronisation complète (qui fait foi et efface les suppressions notées).
+        Sans `advance_cursor` (équipes en échec), le curseur delta reste celui de
+        la lecture (aucun après une synchronisation complète) pour que la
+        prochaine synchronisation renvoie ces équipes.
+        """
+        with self._file_lock():
+            # Curseur avec lequel les équipes ont été demandées au site
+            previous_cursor = None if full else self.cursor
+            # Un autre worker a pu noter une suppression depuis notre lecture
+            self.load()
+            removed = {} if full else dict(self.removed)
+            cursor = None if advance_cursor else previous_cursor
+            self._write([team for team in teams if team['id'] not in removed], removed, full,
+                        advance_cursor, cursor)
+
+    def remove(self, team_id):
+        """Retirer une équipe supprimée sur le site (depuis n'importe quel worker)"""
+        try:
+            with self._file_lock():
+                self.load()
+                with self._lock:
+                    removed = dict(self.removed, **{team_id: time.time()})
+                    teams = [team for tid, team in (self.teams or {}).items() if tid != team_id]
+                self._write(teams, removed, False, False, self.cursor)
+        except OSError as e:
+            logger.error(f"Impossible d'écrire le snapshot des équipes: {e}")
+
+    def _write(self, teams, removed, full, advance_cursor=True, cursor=None):
+        """Écriture atomique (fichier temporaire puis rename), sous _file_lock"""
+        compact = [compact_team(team) for team in teams]
+        if advance_cursor:
+            cursor = max((team['updatedAt'] for team in compact if team.get('updatedAt')), default=None)
+        saved_at = time.time()
+        full_sync_at = saved_at if full else self.full_sync_at
+
+        tmp_path = f"{self.path}.{os.getpid()}.tmp"
+        with gzip.open(tmp_path, 'wt', encoding='utf-8', compresslevel=6) as f:
+            json.dump(
+                {
+                    'version': SNAPSHOT_VERSION,
+                    'saved_at': saved_at,
+                    'full_sync_at': full_sync_at,
+                    'cursor': cursor,
+                    'removed': removed,
+                    'teams': compact
+                },
+                f,
+                separators=(',', ':'),
+                ensure_ascii=False
+            )
+        os.replace(tmp_path, self.path)
+
+        with self._lock:
+            self.teams = {team['id']: team for team in compact}
+            self.cursor = cursor
+            self.saved_at = saved_at
+            self.full_sync_at = full_sync_at
+            self.removed = removed
+            self._mtime = os.stat(self.path).st_mtime_ns
+
+    def stats(self):
+        with self._lock:
+            return {
+                'path': self.path,
+                'teams': len(self.teams) if self.teams is not None else None,
+                'cursor': self.cursor,
+                'saved_at': self.saved_at,
+                'full_sync_at': self.full_sync_at,
+                'removed': len(self.removed)
+            }
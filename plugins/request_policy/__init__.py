@@ -0,0 +1,71 @@
+"""
+Plugin request_policy - Politique d'accès aux routes CTFd
+Remplace disable_setup, disable_team_creation et disable_team_editing:
+- /setup introuvable (setup fait par initial_setup)
+- création et join d'équipes bloqués (site d'inscription uniquement)
+- édition des équipes réservée aux admins
+
+Les règles (rules.py) sont compilées en un seul matcher évalué une fois par
+requête; la session (is_admin) n'est lue que si une règle exemptant les admins
+correspond, et le rôle est alors résolu une seule fois par requête
+(ace_common.user).
+"""
+
+import os
+import logging
+from flask import request, abort, redirect, url_for, flash
+from CTFd.plugins.ace_common.user import is_admin_cached
+from CTFd.plugins.ace_common.warmup import timed_load
+
+from .rules import DEFAULT_RULES, PolicyMatcher, NOT_FOUND, FORBIDDEN, TEAMS_DISABLED_PAGE, REDIRECT
+
+logger = logging.getLogger(__name__)
+
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'teams_disabled.html')
+
+matcher = PolicyMatcher(DEFAULT_RULES)
+
+
+@timed_load
+def load(app):
+    """Charger le plugin dans CTFd"""
+
+    with open(TEMPLATE_PATH, encoding='utf-8') as f:
+        teams_disabled_template = app.jinja_env.from_string(f.read())
+
+    @app.before_request
+    def apply_request_policy():
+        """Appliquer la première règle correspondant à la requête"""
+        rule = matcher.match(request.method, request.path)
+        if rule is None:
+            return
+
+        if rule.admin_exempt and is_admin_cached():
+            return
+
+        if rule.action == NOT_FOUND:
+            abort(404)
+
+        if rule.action == TEAMS_DISABLED_PAGE:
+            return teams_disabled_template.render(), 403
+
+        if rule.action == REDIRECT:
+            flash(rule.message, "warning")
+            return redirect(url_for('teams.listing'))
+
+        if rule.action == FORBIDDEN:
+            if rule.message:
+                abort(403, description=rule.message)
+            abort(403)
+
+    @app.context_processor
+    def inject_team_edit_message():
+        """Message sur l'édition des équipes pour les templates"""
+        registration_url = app.config.get('REGISTRATION_SITE_URL', 'http://localhost:3000')
+        return {
+            'team_edit_disabled': True,
+            'team_edit_message': 'Team information is managed through the registration site.',
+            'registration_site_url': registration_url
+        }
+
+    logger.info(f"Plugin request_policy chargé - {len(matcher.rules)} règles compilées")
@@ -0,0 +1,97 @@
+"""
+Règles de blocage/redirection des requêtes et leur matcher compilé
+Indépendant de CTFd (utilisable par scripts/bench_request_policy.py).
+
+Toutes les règles sont compilées en une seule expression régulière appliquée
+à "MÉTHODE chemin"; la première règle qui correspond décide. Un filtre par
+préfixe, précalculé par méthode, écarte avant toute regex les requêtes
+qu'aucune règle ne peut concerner (fichiers statiques, lectures d'API...).
+"""
+
+import re
+from collections import namedtuple
+
+# Actions
+NOT_FOUND = 'not_found'
+FORBIDDEN = 'forbidden'
+TEAMS_DISABLED_PAGE = 'teams_disabled_page'
+REDIRECT = 'redirect'
+
+ANY_METHOD = '*'
+WRITE_METHODS = ('POST', 'PUT', 'PATCH')
+
+TEAM_EDIT_MESSAGE = "Team editing is disabled. Please use the registration site to manage your team."
+TEAM_MANAGEMENT_MESSAGE = "Team management is disabled. Teams are created through the registration site."
+
+# methods: tuple de méthodes ou ANY_METHOD
+# prefix: préfixe littéral de tous les chemins acceptés par `pattern`
+# pattern: regex du chemin complet
+# admin_exempt: la règle ne s'applique pas aux admins
+Rule = namedtuple('Rule', ['name', 'methods', 'prefix', 'pattern', 'action', 'message', 'admin_exempt'])
+
+
+# Règles de la plateforme, dans l'ordre d'évaluation. Les règles dont les admins
+# sont exemptés viennent en dernier: quand l'une d'elles correspond pour un
+# admin, aucune règle suivante ne pourrait le bloquer.
+DEFAULT_RULES = [
+    # Setup fait par initial_setup, la page ne doit jamais être accessible
+    Rule('setup', ANY_METHOD, '/setup', r'/setup(?:/.*)?', NOT_FOUND, None, False),
+
+    # Les équipes sont créées et rejointes uniquement via le site d'inscription
+    Rule('team_create_api', WRITE_METHODS, '/api/v1/teams', r'/api/v1/teams', FORBIDDEN, None, False),
+    Rule('team_create', WRITE_METHODS, '/teams', r'/teams', FORBIDDEN, None, False),
+    Rule('team_join_api', WRITE_METHODS, '/api/v1/teams/', r'/api/v1/teams/.*/join', FORBIDDEN, None, False),
+    Rule('team_pages', ANY_METHOD, '/teams/', r'/teams/(?:new|join)', TEAMS_DISABLED_PAGE, None, False),
+
+    # Édition des équipes réservée aux admins
+    Rule('team_settings', ANY_METHOD, '/teams/', r'/teams/(?:.*/)?settings.*', REDIRECT,
+         TEAM_EDIT_MESSAGE, True),
+    Rule('team_edit_api', ('PATCH', 'PUT', 'DELETE'), '/api/v1/teams/', r'/api/v1/teams/.*', FORBIDDEN,
+         TEAM_EDIT_MESSAGE, True),
+    Rule('team_manage', ('POST',), '/teams/', r'/teams/(?:join|new).*', FORBIDDEN,
+         TEAM_MANAGEMENT_MESSAGE, True),
+]
+
+
+class PolicyMatcher:
+    """Matcher compilé d'une liste de règles"""
+
+    def __init__(self, rules):
+        self.rules = list(rules)
+
+        methods = set()
+        for rule in self.rules:
+            if rule.methods != ANY_METHOD:
+                methods.update(rule.methods)
+
+        # Préfixes à tester par méthode (les autres méthodes n'ont que les règles ANY_METHOD)
+        any_prefixes = tuple(dict.fromkeys(rule.prefix for rule in self.rules if rule.methods == ANY_METHOD))
+        self._prefixes = {
+            method: tuple(dict.fromkeys(any_prefixes + tuple(
+                rule.prefix for rule in self.rules
+                if rule.methods != ANY_METHOD and method in rule.methods
+            )))
+            for method in methods
+        }
+        self._any_prefixes = any_prefixes
+
+        alternatives = []
+        for index, rule in enumerate(self.rules):
+            if rule.methods == ANY_METHOD:
+                method_pattern = r'[A-Z]+'
+            else:
+                method_pattern = '(?:' + '|'.join(re.escape(m) for m in rule.methods) + ')'
+            alternatives.append(f"(?P<r{index}>{method_pattern} (?:{rule.pattern}))")
+
+        self._regex = re.compile('|'.join(alternatives), re.DOTALL)
+
+    def match(self, method, path):
+        """Retourner la première règle qui s'applique à (method, path), ou None"""
+        if not path.startswith(self._prefixes.get(method, self._any_prefixes)):
+            return None
+
+        result = self._regex.fullmatch(f"{method} {path}")
+        if result is None:
+            return None
+
+        return self.rules[int(result.lastgroup[1:])]
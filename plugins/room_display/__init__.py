@@ -1,16 +1,140 @@
 """
-Plugin room_display - Placeholder pour affichage des salles
-Ce plugin peut être étendu plus tard pour afficher les informations de salle
+Plugin room_display - Classements par salle pour les projecteurs
+Les affectations de salle (roomNumber du site d'inscription) sont reçues pendant
+la synchronisation des équipes; les classements de toutes les salles sont
+calculés en une seule passe sur get_standings et partagés via le cache CTFd.
 """
 
+import os
+import time
 import logging
+from flask import Blueprint
+from CTFd.cache import cache
+from CTFd.utils.scores import get_standings
+from CTFd.utils.decorators.visibility import check_score_visibility
+from CTFd.plugins.ace_common.warmup import timed_load
 
 logger = logging.getLogger(__name__)
 
+# Configuration
+LEADERBOARD_CACHE_SECONDS = int(os.getenv('ROOM_LEADERBOARD_CACHE_SECONDS', '3'))
+ROOMS_CACHE_KEY = 'room_display:rooms'
+LEADERBOARDS_CACHE_KEY = 'room_display:leaderboards'
 
+TEMPLATE_PATH = os.path.join(os.path.dirname(__file__), 'templates', 'room_scoreboard.html')
+
+# Copie locale de l'index des salles {ctfd_team_id: salle}
+_rooms = None
+_rooms_loaded_at = 0.0
+
+
+def ingest_room_assignments(assignments):
+    """
+    Remplacer l'index des salles {ctfd_team_id: roomNumber}
+    Appelé par registration_sync à la fin de chaque synchronisation complète.
+    """
+    global _rooms, _rooms_loaded_at
+
+    rooms = {
+        int(team_id): str(room)
+        for team_id, room in assignments.items()
+        if room not in (None, '')
+    }
+
+    cache.set(ROOMS_CACHE_KEY, rooms, timeout=0)
+    cache.delete(LEADERBOARDS_CACHE_KEY)
+
+    _rooms = rooms
+    _rooms_loaded_at = time.monotonic()
+
+    logger.info(f"Affectations de salle mises à jour: {len(rooms)} équipes, {len(set(rooms.values()))} salles")
+
+
+def get_room_index():
+    """Retourner l'index {ctfd_team_id: salle}, relu depuis le cache partagé au plus toutes les quelques secondes"""
+    global _rooms, _rooms_loaded_at
+
+    if _rooms is None or time.monotonic() - _rooms_loaded_at > LEADERBOARD_CACHE_SECONDS:
+        _rooms = cache.get(ROOMS_CACHE_KEY) or {}
+        _rooms_loaded_at = time.monotonic()
+
+    return _rooms
+
+
+def compute_room_leaderboards():
+    """
+    Partitionner le classement global par salle en une seule passe
+    Le rang global et le rang dans la salle sont tous les deux fournis.
+    """
+    rooms = get_room_index()
+    leaderboards = {}
+
+    for position, team in enumerate(get_standings(), start=1):
+        room = rooms.get(team.account_id)
+        if room is None:
+            continue
+
+        board = leaderboards.setdefault(room, [])
+        board.append({
+            'ctfd_team_id': team.account_id,
+            'team_name': team.name,
+            'score': int(team.score) if team.score else 0,
+            'rank': len(board) + 1,
+            'global_rank': position
+        })
+
+    return leaderboards
+
+
+def get_room_leaderboards():
+    """Classements par salle, recalculés au plus une fois par intervalle pour tous les workers"""
+    leaderboards = cache.get(LEADERBOARDS_CACHE_KEY)
+
+    if leaderboards is None:
+        leaderboards = compute_room_leaderboards()
+        cache.set(LEADERBOARDS_CACHE_KEY, leaderboards, timeout=LEADERBOARD_CACHE_SECONDS)
+
+    return leaderboards
+
+
+@timed_load
 def load(app):
     """Charger le plugin dans CTFd"""
-    logger.info("Plugin room_display chargé (placeholder)")
-    # Plugin vide pour l'instant, peut être étendu plus tard
-    pass
+    logger.info("Chargement du plugin room_display")
+
+    # Template compilé une seule fois au chargement
+    with open(TEMPLATE_PATH, encoding='utf-8') as f:
+        page_template = app.jinja_env.from_string(f.read())
+
+    blueprint = Blueprint('room_display', __name__, url_prefix='/rooms')
+
+    @blueprint.route('/api', methods=['GET'])
+    @check_score_visibility
+    def list_rooms():
+        """Liste des salles et nombre d'équipes par salle"""
+        leaderboards = get_room_leaderboards()
+        return {
+            'success': True,
+            'data': {room: len(board) for room, board in sorted(leaderboards.items())}
+        }
+
+    @blueprint.route('/api/<room>', methods=['GET'])
+    @check_score_visibility
+    def room_leaderboard(room):
+        """Classement d'une salle"""
+        board = get_room_leaderboards().get(room)
+        if board is None:
+            # Salle connue mais aucune équipe n'a encore marqué
+            if room not in set(get_room_index().values()):
+                return {'success': False, 'error': 'Salle inconnue'}, 404
+            board = []
+        return {'success': True, 'data': board}
+
+    @blueprint.route('/<room>', methods=['GET'])
+    @check_score_visibility
+    def room_page(room):
+        """Page projecteur d'une salle (rafraîchie côté client)"""
+        return page_template.render(room=room, refresh_seconds=LEADERBOARD_CACHE_SECONDS + 2)
 
+    app.register_blueprint(blueprint)
+    logger.info("Plugin room_display chargé avec succès")
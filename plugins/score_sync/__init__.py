@@ -4,16 +4,22 @@ Envoie automatiquement les scores CTFd au site toutes les 30 secondes
 """
 
 import os
+import time
 import requests
 import logging
-from flask import Blueprint
+from flask import Blueprint, Response, request
 from apscheduler.schedulers.background import BackgroundScheduler
 from CTFd.models import Teams
+from CTFd.cache import cache
 from CTFd.utils.scores import get_standings
+from CTFd.utils.decorators.visibility import check_score_visibility
 from datetime import datetime
+from CTFd.plugins.ace_common import get_redis, warmup, metrics
+from .outbox import CircuitBreaker, ScoreOutbox, OutboxWorker
+from .payload import encode_scores, FORMAT_ROWS
+from .stream import StandingsHub
+from .history import ScoreHistory
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 # Configuration
@@ -21,6 +27,42 @@ REGISTRATION_SITE_URL = os.getenv('REGISTRATION_SITE_URL', 'http://backend:5000/
 ADMIN_EMAIL = os.getenv('REGISTRATION_SITE_ADMIN_EMAIL', 'admin@ace-escapegame.com')
 ADMIN_PASSWORD = os.getenv('REGISTRATION_SITE_ADMIN_PASSWORD', '')
 
+# Outbox: backoff exponentiel et disjoncteur
+OUTBOX_BASE_DELAY = int(os.getenv('SCORE_SYNC_BACKOFF_BASE', '5'))
+OUTBOX_MAX_DELAY = int(os.getenv('SCORE_SYNC_BACKOFF_MAX', '300'))
+BREAKER_FAILURE_THRESHOLD = int(os.getenv('SCORE_SYNC_BREAKER_THRESHOLD', '5'))
+BREAKER_RESET_SECONDS = int(os.getenv('SCORE_SYNC_BREAKER_RESET', '60'))
+TEAM_IDS_CACHE_SECONDS = 60
+
+# Transport des scores: 'rows' (historique) ou 'columnar', gzip optionnel
+PAYLOAD_FORMAT = os.getenv('SCORE_SYNC_PAYLOAD_FORMAT', FORMAT_ROWS)
+PAYLOAD_GZIP = os.getenv('SCORE_SYNC_GZIP', 'false').lower() == 'true'
+# Après un refus (415), nouvel essai du format configuré au bout de ce délai
+PAYLOAD_RETRY_SECONDS = int(os.getenv('SCORE_SYNC_PAYLOAD_RETRY', '3600'))
+
+# Flux SSE du classement
+STREAM_INTERVAL = int(os.getenv('SCORE_STREAM_INTERVAL', '5'))
+STREAM_HEARTBEAT = int(os.getenv('SCORE_STREAM_HEARTBEAT', '15'))
+STREAM_QUEUE_SIZE = int(os.getenv('SCORE_STREAM_QUEUE_SIZE', '32'))
+
+# Historique du classement (volume persistant des uploads)
+HISTORY_PATH = os.getenv('SCORE_HISTORY_PATH', '/var/uploads/score_sync/history.bin')
+HISTORY_MAX_POINTS = 1000
+# Séries calculées partagées entre workers; la clé change à chaque ajout au fichier
+HISTORY_CACHE_PREFIX = 'score_sync:history:'
+HISTORY_CACHE_SECONDS = 300
+
+# Métriques (/metrics)
+score_push_seconds = metrics.Histogram(
+    'ace_score_push_seconds',
+    "Durée d'un envoi des scores au site d'inscription, par résultat"
+)
+score_push_bytes = metrics.Histogram(
+    'ace_score_push_bytes',
+    "Taille du corps envoyé au site d'inscription, par format",
+    buckets=(256, 1024, 4096, 16384, 65536, 262144, 1048576)
+)
+
 # Scheduler global
 scheduler = None
 flask_app = None
@@ -32,11 +74,17 @@ class ScoreSyncAPI:
     def __init__(self):
         self.base_url = REGISTRATION_SITE_URL
         self.token = None
+        self._website_team_ids = None
+        self._website_team_ids_at = 0.0
+        self.payload_format = PAYLOAD_FORMAT
+        self.use_gzip = PAYLOAD_GZIP
+        self._downgraded_at = None
 
     def authenticate(self):
         """Se connecter à l'API"""
         try:
-            response = requests.post(
+            response = metrics.timed_request(
+                'POST',
                 f"{self.base_url}/auth/login",
                 json={
                     "email": ADMIN_EMAIL,
@@ -56,38 +104,138 @@ class ScoreSyncAPI:
             logger.error(f"Erreur d'authentification pour score_sync: {e}")
             return False
 
+    def _request(self, method, path, headers=None, **kwargs):
+        """
+        Requête authentifiée vers le site d'inscription
+        Ré-authentifie une seule fois si le token a expiré (401), sans boucle.
+        Lève requests.exceptions.RequestException en cas d'échec.
+        """
+        if not self.token and not self.authenticate():
+            raise requests.exceptions.ConnectionError("Authentification impossible")
+
+        for attempt in range(2):
+            response = metrics.timed_request(
+                method,
+                f"{self.base_url}{path}",
+                headers={"Authorization": f"Bearer {self.token}", **(headers or {})},
+                timeout=10,
+                **kwargs
+            )
+            if response.status_code == 401 and attempt == 0 and self.authenticate():
+                continue
+            response.raise_for_status()
+            return response
+
+    def get_website_team_ids(self):
+        """
+        Retourner la correspondance nom d'équipe -> ID du site d'inscription
+        Une seule requête /admin/teams par intervalle de cache, au lieu d'une par équipe.
+        Retourne None si le site est injoignable et qu'aucune valeur n'est en cache.
+        """
+        now = time.monotonic()
+        if self._website_team_ids is not None and now - self._website_team_ids_at < TEAM_IDS_CACHE_SECONDS:
+            return self._website_team_ids
+
+        try:
+            response = self._request('GET', '/admin/teams')
+            teams = response.json().get('data', {}).get('teams', [])
+            self._website_team_ids = {team['name']: team['id'] for team in teams}
+            self._website_team_ids_at = now
+
+        except requests.exceptions.RequestException as e:
+            logger.error(f"Erreur lors de la récupération des équipes du site: {e}")
+            return None
+
+        return self._website_team_ids
+
     def send_scores(self, scores_data):
-        """Envoyer les scores au site d'inscription"""
-        if not self.token:
-            if not self.authenticate():
-                return False
+        """
+        Envoyer les scores au site d'inscription
+        Le format compact et gzip sont négociés: si le backend les refuse
+        (415), on repasse au JSON historique, et on réessaie le format
+        configuré après PAYLOAD_RETRY_SECONDS. Une autre erreur (400...)
+        n'est qu'un échec d'envoi, réessayé par l'outbox.
+        """
+        if self._downgraded_at is not None and time.time() - self._downgraded_at > PAYLOAD_RETRY_SECONDS:
+            self.payload_format = PAYLOAD_FORMAT
+            self.use_gzip = PAYLOAD_GZIP
+            self._downgraded_at = None
+
+        body, headers = encode_scores(
+            scores_data,
+            payload_format=self.payload_format,
+            use_gzip=self.use_gzip
+        )
+
+        score_push_bytes.observe(len(body), format=self.payload_format, gzip=str(self.use_gzip).lower())
+        started = time.perf_counter()
 
         try:
-            response = requests.post(
-                f"{self.base_url}/admin/ctfd/sync-scores",
-                json={"scores": scores_data},
-                headers={
-                    "Authorization": f"Bearer {self.token}",
-                    "Content-Type": "application/json"
-                },
-                timeout=10
-            )
-            response.raise_for_status()
+            self._request('POST', '/admin/ctfd/sync-scores', data=body, headers=headers)
 
-            logger.info(f"Scores synchronisés: {len(scores_data)} équipes")
+            score_push_seconds.observe(time.perf_counter() - started, result='success')
+            logger.info(f"Scores synchronisés: {len(scores_data)} équipes ({len(body)} octets)")
             return True
 
+        except requests.exceptions.HTTPError as e:
+            score_push_seconds.observe(time.perf_counter() - started, result='http_error')
+            negotiated = self.payload_format != FORMAT_ROWS or self.use_gzip
+            if negotiated and e.response is not None and e.response.status_code == 415:
+                logger.warning(
+                    f"Le site refuse le format {self.payload_format} "
+                    f"(gzip={self.use_gzip}), retour au JSON standard pour {PAYLOAD_RETRY_SECONDS} s"
+                )
+                self.payload_format = FORMAT_ROWS
+                self.use_gzip = False
+                self._downgraded_at = time.time()
+                return self.send_scores(scores_data)
+
+            logger.error(f"Erreur lors de l'envoi des scores: {e}")
+            return False
+
         except requests.exceptions.RequestException as e:
+            score_push_seconds.observe(time.perf_counter() - started, result='error')
             logger.error(f"Erreur lors de l'envoi des scores: {e}")
-            # Retry with new token
-            if self.authenticate():
-                return self.send_scores(scores_data)
             return False
 
 
 # Instance globale
 score_api = ScoreSyncAPI()
 
+# Outbox durable + worker de livraison
+score_outbox = None
+outbox_worker = None
+breaker = CircuitBreaker(
+    failure_threshold=BREAKER_FAILURE_THRESHOLD,
+    reset_timeout=BREAKER_RESET_SECONDS
+)
+
+# Hub du flux SSE (un abonné Redis par worker)
+standings_hub = None
+
+# Historique du classement
+score_history = ScoreHistory(HISTORY_PATH)
+
+
+def get_history_series(top, points, ranks):
+    """
+    score_history.series() en cache CTFd, par paramètres et état du fichier
+    (taille, date de modification): le calcul des rangs n'est refait qu'après
+    un nouvel enregistrement, une fois pour tous les workers
+    """
+    try:
+        stat = os.stat(HISTORY_PATH)
+        version = f"{stat.st_size}-{stat.st_mtime_ns}"
+    except OSError:
+        version = 'vide'
+
+    key = f"{HISTORY_CACHE_PREFIX}{version}:{top}:{points}:{int(ranks)}"
+    data = cache.get(key)
+    if data is None:
+        data = score_history.series(top=top, points=points, ranks=ranks)
+        cache.set(key, data, timeout=HISTORY_CACHE_SECONDS)
+    return data
+
 
 def get_ctfd_scoreboard(app=None):
     """
@@ -121,42 +269,94 @@ def get_ctfd_scoreboard(app=None):
         return []
 
 
-def find_website_team_id(team_name):
+def deliver_scores(entries):
     """
-    Récupérer l'ID du site d'inscription depuis la base CTFd
-    On peut stocker cet ID dans un champ custom ou utiliser le nom
+    Livrer des entrées de l'outbox au site d'inscription
+    Appelée par le worker; retourne True si le lot peut être retiré de l'outbox.
     """
-    # Pour l'instant, on va chercher l'équipe par nom sur le site
-    # Dans une version avancée, on stockerait website_id dans la table Teams
-    try:
-        if not score_api.token:
-            score_api.authenticate()
+    website_team_ids = score_api.get_website_team_ids()
+    if website_team_ids is None:
+        return False
+
+    scores_to_send = []
+
+    for entry in entries:
+        # Trouver l'ID de l'équipe sur le site d'inscription
+        website_team_id = website_team_ids.get(entry['team_name'])
+
+        if website_team_id:
+            scores_to_send.append({
+                'teamId': website_team_id,
+                'ctfdTeamId': entry['ctfdTeamId'],
+                'score': entry['score'],
+                'rank': entry['rank']
+            })
+        else:
+            logger.debug(f"Équipe {entry['team_name']} non trouvée sur le site")
+
+    if not scores_to_send:
+        logger.debug("Aucune équipe à synchroniser")
+        return True
+
+    return score_api.send_scores(scores_to_send)
 
-        response = requests.get(
-            f"{score_api.base_url}/admin/teams",
-            headers={"Authorization": f"Bearer {score_api.token}"},
-            timeout=10
+
+def get_outbox_worker():
+    """Créer l'outbox et son worker à la première utilisation"""
+    global score_outbox, outbox_worker
+
+    if outbox_worker is None:
+        score_outbox = ScoreOutbox(get_redis())
+        outbox_worker = OutboxWorker(
+            score_outbox,
+            deliver_scores,
+            breaker,
+            base_delay=OUTBOX_BASE_DELAY,
+            max_delay=OUTBOX_MAX_DELAY
         )
 
-        if response.status_code == 200:
-            data = response.json()
-            teams = data.get('data', {}).get('teams', [])
+    return outbox_worker
 
-            for team in teams:
-                if team['name'] == team_name:
-                    return team['id']
 
-        return None
+def drain_score_outbox():
+    """Vider l'outbox (appelé par le scheduler)"""
+    try:
+        get_outbox_worker().drain()
+    except Exception as e:
+        logger.error(f"Erreur lors du vidage de l'outbox des scores: {e}")
+
 
+def get_standings_hub():
+    """Créer le hub SSE à la première utilisation"""
+    global standings_hub
+
+    if standings_hub is None:
+        standings_hub = StandingsHub(get_redis(), max_queue=STREAM_QUEUE_SIZE)
+
+    return standings_hub
+
+
+def publish_standings():
+    """
+    Publier les changements du classement sur le flux SSE et les ajouter à
+    l'historique
+    Appelé par le scheduler; get_standings est mis en cache par CTFd et
+    invalidé à chaque solve, donc un tick sans changement coûte peu.
+    """
+    try:
+        standings = get_standings_hub().publish(lambda: get_ctfd_scoreboard(flask_app), STREAM_INTERVAL)
+        if standings:
+            score_history.record(standings)
     except Exception as e:
-        logger.error(f"Erreur lors de la recherche de l'équipe {team_name}: {e}")
-        return None
+        logger.error(f"Erreur lors de la publication du classement: {e}")
 
 
 def sync_scores_to_registration_site():
     """
     Fonction principale de synchronisation des scores
     Appelée toutes les 30 secondes par le scheduler
+    Les scores sont écrits dans l'outbox puis livrés par le worker: si le site
+    est en panne, ils restent en attente au lieu d'être perdus.
     """
     global flask_app
 
@@ -168,41 +368,89 @@ def sync_scores_to_registration_site():
             logger.debug("Pas de scores à synchroniser")
             return
 
-        # Préparer les données pour l'API du site
-        scores_to_send = []
+        worker = get_outbox_worker()
+        worker.outbox.put([
+            {
+                'ctfdTeamId': entry['ctfd_team_id'],
+                'team_name': entry['team_name'],
+                'score': entry['score'],
+                'rank': entry['rank']
+            }
+            for entry in scoreboard
+        ])
 
-        for entry in scoreboard:
-            # Trouver l'ID de l'équipe sur le site d'inscription
-            website_team_id = find_website_team_id(entry['team_name'])
+        if worker.drain():
+            logger.debug(f"Synchronisation réussie: {len(scoreboard)} équipes")
+        elif not breaker.allow_request():
+            logger.debug("Disjoncteur ouvert, scores conservés dans l'outbox")
 
-            if website_team_id:
-                scores_to_send.append({
-                    'teamId': website_team_id,
-                    'ctfdTeamId': entry['ctfd_team_id'],
-                    'score': entry['score'],
-                    'rank': entry['rank']
-                })
-            else:
-                logger.debug(f"Équipe {entry['team_name']} non trouvée sur le site")
+    except Exception as e:
+        logger.error(f"Erreur critique lors de la synchronisation des scores: {e}")
 
-        if scores_to_send:
-            # Envoyer au site d'inscription
-            success = score_api.send_scores(scores_to_send)
 
-            if success:
-                logger.debug(f"Synchronisation réussie: {len(scores_to_send)} équipes")
-            else:
-                logger.warning("Échec de la synchronisation des scores")
-        else:
-            logger.debug("Aucune équipe à synchroniser")
+def get_scheduler():
+    """Retourner le scheduler du worker, démarré à la première utilisation"""
+    global scheduler
 
-    except Exception as e:
-        logger.error(f"Erreur critique lors de la synchronisation des scores: {e}")
+    if not scheduler or not scheduler.running:
+        scheduler = BackgroundScheduler()
+        metrics.instrument_scheduler(scheduler)
+        scheduler.start()
+
+    return scheduler
+
+
+def start_stream_job():
+    """Publication périodique des deltas du classement pour le flux SSE"""
+    get_scheduler().add_job(
+        func=publish_standings,
+        trigger='interval',
+        seconds=STREAM_INTERVAL,
+        id='publish_standings',
+        name='Publish standings deltas',
+        replace_existing=True
+    )
+
+
+def start_sync_jobs():
+    """
+    Démarrer la synchronisation des scores
+    Exécuté par un seul worker (ace_common.warmup); avec Redis, ce worker est
+    aussi l'unique producteur du flux SSE.
+    """
+    current = get_scheduler()
+
+    # Synchronisation toutes les 30 secondes, la première immédiatement
+    current.add_job(
+        func=sync_scores_to_registration_site,
+        trigger='interval',
+        seconds=30,
+        next_run_time=datetime.now(),
+        id='sync_scores',
+        name='Sync scores to registration site',
+        replace_existing=True
+    )
+
+    # Vidage de l'outbox (le backoff et le disjoncteur décident s'il y a un envoi)
+    current.add_job(
+        func=drain_score_outbox,
+        trigger='interval',
+        seconds=OUTBOX_BASE_DELAY,
+        id='drain_score_outbox',
+        name='Drain score outbox',
+        replace_existing=True
+    )
 
+    if get_redis() is not None:
+        start_stream_job()
 
+    logger.info("Scheduler de synchronisation des scores démarré (toutes les 30 secondes)")
+
+
+@warmup.timed_load
 def load(app):
     """Charger le plugin dans CTFd"""
-    global scheduler, flask_app
+    global flask_app
 
     # Stocker l'app pour utilisation dans le scheduler
     flask_app = app
@@ -244,33 +492,82 @@ def load(app):
 
         return test()
 
-    # Enregistrer le blueprint
-    app.register_blueprint(blueprint)
+    @blueprint.route('/outbox', methods=['GET'])
+    def outbox_status():
+        """État de l'outbox et du disjoncteur"""
+        from CTFd.utils.decorators import admins_only
 
-    # Configurer le scheduler
-    if not scheduler or not scheduler.running:
-        scheduler = BackgroundScheduler()
+        @admins_only
+        def status():
+            worker = get_outbox_worker()
+            return {
+                'success': True,
+                'pending': len(worker.outbox),
+                'durable': worker.outbox.redis is not None,
+                'breaker': breaker.state,
+                'failed_attempts': worker.attempts
+            }
 
-        # Synchronisation toutes les 30 secondes
-        scheduler.add_job(
-            func=sync_scores_to_registration_site,
-            trigger='interval',
-            seconds=30,
-            id='sync_scores',
-            name='Sync scores to registration site',
-            replace_existing=True
-        )
+        return status()
+
+    # Blueprint public pour le flux du classement (pas sous /admin)
+    stream_blueprint = Blueprint(
+        'score_sync_stream',
+        __name__,
+        url_prefix='/api/score-sync'
+    )
 
-        # Première synchronisation après 20 secondes (laisser le temps aux équipes de se créer)
-        scheduler.add_job(
-            func=sync_scores_to_registration_site,
-            trigger='date',
-            run_date=datetime.now(),
-            id='sync_scores_startup',
-            name='Initial score sync'
+    @stream_blueprint.route('/stream', methods=['GET'])
+    @check_score_visibility
+    def standings_stream():
+        """
+        Flux SSE du classement: un événement 'snapshot' à la connexion puis
+        des événements 'delta' à chaque changement
+        """
+        return Response(
+            get_standings_hub().stream(heartbeat=STREAM_HEARTBEAT),
+            mimetype='text/event-stream',
+            headers={
+                'Cache-Control': 'no-cache',
+                'X-Accel-Buffering': 'no'
+            }
         )
 
-        scheduler.start()
-        logger.info("Scheduler de synchronisation des scores démarré (toutes les 30 secondes)")
+    @stream_blueprint.route('/history', methods=['GET'])
+    @check_score_visibility
+    def standings_history():
+        """
+        Historique du classement pour les graphiques
+        Paramètres: top (équipes), points (échantillons), ranks=1 pour les rangs
+        """
+        top = min(max(request.args.get('top', 10, type=int), 1), 100)
+        points = min(max(request.args.get('points', 200, type=int), 2), HISTORY_MAX_POINTS)
+        ranks = request.args.get('ranks', '0') == '1'
+
+        return {
+            'success': True,
+            'data': get_history_series(top, points, ranks)
+        }
+
+    # Enregistrer les blueprints
+    app.register_blueprint(blueprint)
+    app.register_blueprint(stream_blueprint)
+
+    metrics.gauge(
+        'ace_score_outbox_pending',
+        "Équipes dont le dernier score attend d'être livré au site",
+        lambda: len(get_outbox_worker().outbox)
+    )
+    metrics.gauge(
+        'ace_score_stream_subscribers',
+        "Connexions SSE ouvertes sur le worker qui répond",
+        lambda: len(get_standings_hub().subscribers)
+    )
+
+    # Schedulers démarrés après le démarrage: synchronisation dans le seul worker élu,
+    # publication du classement dans chaque worker si Redis ne la partage pas
+    warmup.on_leader('score_sync', start_sync_jobs)
+    if get_redis() is None:
+        warmup.on_ready('score_sync_stream', start_stream_job)
 
     logger.info("Plugin score_sync chargé avec succès")
@@ -0,0 +1,271 @@
+"""
+Historique compact du classement pour score_sync
+Fichier binaire en ajout seul: une entrée par équipe découverte, puis un
+snapshot (horodatage + scores int32 dans l'ordre des index d'équipe) à chaque
+changement. En mémoire, une colonne array('i') par équipe.
+Ce module ne dépend pas de CTFd (utilisé par scripts/bench_score_history.py).
+"""
+
+import os
+import time
+import struct
+import logging
+import threading
+from array import array
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b'ACEH\x01'
+
+# Enregistrements: type (1 octet) + contenu
+_TEAM = b'T'       # index uint32, ctfd_team_id uint32, longueur du nom uint16, nom utf-8
+_SNAPSHOT = b'S'   # horodatage float64, nombre d'équipes uint32, scores int32 * n
+_TEAM_HEADER = struct.Struct('<IIH')
+_SNAPSHOT_HEADER = struct.Struct('<dI')
+
+
+class ScoreHistory:
+    """
+    Série temporelle (index d'équipe x horodatage -> score)
+    Chaque worker relit la fin du fichier à la demande, l'écriture est
+    protégée par un verrou fcntl.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.timestamps = array('d')
+        self.columns = []       # index d'équipe -> array('i') des scores
+        self.first_seen = []    # index d'équipe -> index du premier snapshot
+        self.team_ids = []      # index d'équipe -> ctfd_team_id
+        self.names = []
+        self.index_of = {}      # ctfd_team_id -> index d'équipe
+        self._offset = 0
+        self._corrupt_at = None  # octet du premier enregistrement illisible
+        self._reported_at = None
+        self._lock = threading.Lock()
+
+    def memory_bytes(self):
+        """Taille approximative des tableaux en mémoire"""
+        total = self.timestamps.buffer_info()[1] * self.timestamps.itemsize
+        for column in self.columns:
+            total += column.buffer_info()[1] * column.itemsize
+        return total
+
+    def refresh(self):
+        """
+        Lire les enregistrements ajoutés depuis la dernière lecture
+        Un en-tête répété (deux workers créant le fichier en même temps) est
+        ignoré; sur un enregistrement illisible, la lecture s'arrête à cet
+        octet et le prochain record() y tronque le fichier.
+        """
+        with self._lock:
+            try:
+                with open(self.path, 'rb') as f:
+                    f.seek(self._offset)
+                    data = f.read()
+            except FileNotFoundError:
+                return
+
+            position = 0
+            self._corrupt_at = None
+            if self._offset == 0:
+                if not data.startswith(MAGIC):
+                    if data:
+                        self._mark_corrupt(0, "en-tête invalide")
+                    return
+                position = len(MAGIC)
+
+            while position < len(data):
+                if MAGIC.startswith(data[position:position + len(MAGIC)]) and position + len(MAGIC) > len(data):
+                    # En-tête répété en cours d'écriture
+                    break
+                if data.startswith(MAGIC, position):
+                    logger.warning(f"En-tête répété ignoré dans {self.path} à l'octet {self._offset + position}")
+                    position += len(MAGIC)
+                    continue
+                try:
+                    consumed = self._parse_record(data, position)
+                except (ValueError, IndexError) as e:
+                    self._mark_corrupt(self._offset + position, e)
+                    break
+                if not consumed:
+                    # Enregistrement incomplet (écriture en cours)
+                    break
+                position += consumed
+
+            self._offset += position
+
+    def _mark_corrupt(self, offset, reason):
+        if self._reported_at != offset:
+            self._reported_at = offset
+            logger.error(f"Historique {self.path} illisible à l'octet {offset} ({reason}): "
+                         f"lecture arrêtée, fichier tronqué à la prochaine écriture")
+        self._corrupt_at = offset
+
+    def _parse_record(self, data, position):
+        kind = data[position:position + 1]
+        start = position + 1
+
+        if kind == _TEAM:
+            if start + _TEAM_HEADER.size > len(data):
+                return 0
+            index, team_id, name_length = _TEAM_HEADER.unpack_from(data, start)
+            end = start + _TEAM_HEADER.size + name_length
+            if end > len(data):
+                return 0
+            self._add_team(index, team_id, data[start + _TEAM_HEADER.size:end].decode('utf-8'))
+            return end - position
+
+        if kind == _SNAPSHOT:
+            if start + _SNAPSHOT_HEADER.size > len(data):
+                return 0
+            timestamp, count = _SNAPSHOT_HEADER.unpack_from(data, start)
+            end = start + _SNAPSHOT_HEADER.size + count * 4
+            if end > len(data):
+                return 0
+            scores = array('i')
+            scores.frombytes(data[start + _SNAPSHOT_HEADER.size:end])
+            self._add_snapshot(timestamp, scores)
+            return end - position
+
+        raise ValueError(f"Enregistrement inconnu dans {self.path} à l'octet {self._offset + position}")
+
+    def _add_team(self, index, team_id, name):
+        if index != len(self.columns):
+            raise ValueError(f"Index d'équipe inattendu {index} dans {self.path}")
+        self.columns.append(array('i'))
+        self.first_seen.append(len(self.timestamps))
+        self.team_ids.append(team_id)
+        self.names.append(name)
+        self.index_of[team_id] = index
+
+    def _add_snapshot(self, timestamp, scores):
+        if len(scores) > len(self.columns):
+            raise ValueError(f"Snapshot de {len(scores)} équipes pour {len(self.columns)} connues")
+        self.timestamps.append(timestamp)
+        for index, score in enumerate(scores):
+            self.columns[index].append(score)
+
+    def latest_scores(self):
+        """Scores du dernier snapshot, dans l'ordre des index d'équipe"""
+        return [column[-1] if column else 0 for column in self.columns]
+
+    def record(self, scoreboard, timestamp=None):
+        """
+        Ajouter un snapshot si le classement a changé
+        `scoreboard` est la liste retournée par get_ctfd_scoreboard.
+        Retourne True si un snapshot a été écrit.
+        """
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+
+        with open(self.path, 'ab') as f:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                # Un autre worker a pu écrire depuis notre dernière lecture
+                self.refresh()
+
+                if self._corrupt_at is not None:
+                    logger.error(f"Historique {self.path} tronqué à l'octet {self._corrupt_at}")
+                    f.truncate(self._corrupt_at)
+                    self._corrupt_at = None
+
+                # Taille lue sous le verrou: en mode ajout, tell() est celle de l'ouverture
+                buffer = bytearray()
+                if os.fstat(f.fileno()).st_size == 0:
+                    buffer += MAGIC
+
+                team_count = len(self.columns)
+                scores = dict.fromkeys(range(team_count), 0)
+                new_teams = []
+                for entry in scoreboard:
+                    index = self.index_of.get(entry['ctfd_team_id'])
+                    if index is None:
+                        index = team_count + len(new_teams)
+                        new_teams.append(entry)
+                    scores[index] = entry['score']
+
+                row = array('i', (scores[index] for index in range(team_count + len(new_teams))))
+                if not new_teams and row.tolist() == self.latest_scores() and self.timestamps:
+                    return False
+
+                for offset, entry in enumerate(new_teams):
+                    name = entry['team_name'].encode('utf-8')[:65535]
+                    buffer += _TEAM + _TEAM_HEADER.pack(team_count + offset, entry['ctfd_team_id'], len(name)) + name
+
+                buffer += _SNAPSHOT + _SNAPSHOT_HEADER.pack(timestamp or time.time(), len(row))
+                buffer += row.tobytes()
+
+                # Un seul write pour que les lecteurs ne voient jamais de snapshot partiel
+                f.write(buffer)
+                f.flush()
+
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+
+        self.refresh()
+        return True
+
+    def _value(self, index, snapshot):
+        offset = snapshot - self.first_seen[index]
+        column = self.columns[index]
+        if offset < 0 or offset >= len(column):
+            return None
+        return column[offset]
+
+    def series(self, top=10, points=200, ranks=False):
+        """
+        Séries sous-échantillonnées pour les `top` meilleures équipes
+        On garde le dernier snapshot de chaque tranche: le score étant une
+        fonction en escalier croissante, la courbe reste fidèle.
+        """
+        self.refresh()
+
+        with self._lock:
+            total = len(self.timestamps)
+            if not total:
+                return {'timestamps': [], 'series': []}
+
+            if total <= points:
+                samples = list(range(total))
+            else:
+                samples = [((bucket + 1) * total) // points - 1 for bucket in range(points)]
+
+            latest = [(self._value(index, total - 1) or 0, -index) for index in range(len(self.columns))]
+            leaders = [-index for _, index in sorted(latest, reverse=True)[:top]]
+
+            rank_at = None
+            if ranks:
+                # Rang approximatif: score décroissant, puis ancienneté de l'équipe
+                rank_at = {}
+                for snapshot in samples:
+                    values = [
+                        (value, -index)
+                        for index in range(len(self.columns))
+                        for value in (self._value(index, snapshot),)
+                        if value is not None
+                    ]
+                    values.sort(reverse=True)
+                    rank_at[snapshot] = {-index: rank for rank, (_, index) in enumerate(values, start=1)}
+
+            series = []
+            for index in leaders:
+                item = {
+                    'ctfd_team_id': self.team_ids[index],
+                    'team_name': self.names[index],
+                    'scores': [self._value(index, snapshot) for snapshot in samples]
+                }
+                if rank_at is not None:
+                    item['ranks'] = [rank_at[snapshot].get(index) for snapshot in samples]
+                series.append(item)
+
+            return {
+                'timestamps': [self.timestamps[snapshot] for snapshot in samples],
+                'series': series
+            }
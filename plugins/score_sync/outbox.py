@@ -0,0 +1,211 @@
+"""
+Outbox durable des scores pour score_sync
+Les scores sont écrits dans Redis (un champ par équipe, donc coalescés) puis
+vidés par un worker avec backoff exponentiel et disjoncteur.
+"""
+
+import json
+import time
+import random
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+# Supprime un champ seulement s'il n'a pas été réécrit entre-temps
+_ACK_SCRIPT = """
+local removed = 0
+for i = 1, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        removed = removed + redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+return removed
+"""
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur simple: après `failure_threshold` échecs consécutifs, on cesse
+    d'appeler le backend pendant `reset_timeout` secondes, puis on laisse passer
+    une seule tentative (half-open) pour tester la reprise.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=60):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return self.CLOSED
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return self.HALF_OPEN
+        return self.OPEN
+
+    def allow_request(self):
+        """Indiquer si un appel au backend est autorisé"""
+        return self.state != self.OPEN
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info("Disjoncteur score_sync refermé, backend de nouveau joignable")
+            self.failures = 0
+            self.opened_at = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                # Ouverture (ou réouverture après un essai half-open raté)
+                if self.opened_at is None:
+                    logger.warning(
+                        f"Disjoncteur score_sync ouvert après {self.failures} échecs, "
+                        f"pause de {self.reset_timeout}s"
+                    )
+                self.opened_at = time.monotonic()
+
+
+class ScoreOutbox:
+    """
+    Outbox des scores, indexée par ctfdTeamId
+    Une nouvelle écriture pour une équipe remplace la précédente: seul le
+    dernier état est livré après une panne.
+    """
+
+    KEY = 'ace:score_sync:outbox'
+
+    def __init__(self, redis_client=None):
+        self.redis = redis_client
+        self._memory = {}
+        self._lock = threading.Lock()
+        self._ack_script = redis_client.register_script(_ACK_SCRIPT) if redis_client else None
+
+        if redis_client is None:
+            logger.warning("REDIS_URL non défini: l'outbox des scores est gardée en mémoire (non durable)")
+
+    def put(self, entries):
+        """Ajouter (ou remplacer) les scores de plusieurs équipes"""
+        fields = {
+            str(entry['ctfdTeamId']): json.dumps(entry, sort_keys=True)
+            for entry in entries
+        }
+        if not fields:
+            return
+
+        if self.redis is not None:
+            self.redis.hset(self.KEY, mapping=fields)
+        else:
+            with self._lock:
+                self._memory.update(fields)
+
+    def pending(self):
+        """Retourner les entrées en attente sous forme {ctfdTeamId: json brut}"""
+        if self.redis is not None:
+            return self.redis.hgetall(self.KEY)
+        with self._lock:
+            return dict(self._memory)
+
+    def ack(self, delivered):
+        """
+        Retirer les entrées livrées
+        Une entrée réécrite pendant l'envoi est conservée pour le prochain cycle.
+        """
+        if not delivered:
+            return
+
+        if self.redis is not None:
+            args = []
+            for field, raw in delivered.items():
+                args.extend([field, raw])
+            self._ack_script(keys=[self.KEY], args=args)
+        else:
+            with self._lock:
+                for field, raw in delivered.items():
+                    if self._memory.get(field) == raw:
+                        del self._memory[field]
+
+    def __len__(self):
+        if self.redis is not None:
+            return self.redis.hlen(self.KEY)
+        with self._lock:
+            return len(self._memory)
+
+
+class OutboxWorker:
+    """
+    Vide l'outbox vers le backend
+    `deliver` reçoit la liste des entrées décodées et retourne True si le
+    backend les a acceptées.
+    """
+
+    def __init__(self, outbox, deliver, breaker, base_delay=5, max_delay=300):
+        self.outbox = outbox
+        self.deliver = deliver
+        self.breaker = breaker
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.attempts = 0
+        self.next_attempt = 0.0
+        self._lock = threading.Lock()
+
+    def backoff_delay(self):
+        """Délai avant la prochaine tentative (exponentiel, avec jitter)"""
+        delay = min(self.max_delay, self.base_delay * (2 ** (self.attempts - 1)))
+        return delay * random.uniform(0.8, 1.2)
+
+    def drain(self):
+        """
+        Tenter une livraison si le backoff et le disjoncteur le permettent
+        Retourne le nombre d'entrées livrées.
+        """
+        # Le scheduler et la sync peuvent appeler drain en même temps
+        if not self._lock.acquire(blocking=False):
+            return 0
+
+        try:
+            if time.monotonic() < self.next_attempt:
+                return 0
+            if not self.breaker.allow_request():
+                return 0
+
+            pending = self.outbox.pending()
+            if not pending:
+                return 0
+
+            entries = [json.loads(raw) for raw in pending.values()]
+
+            try:
+                delivered = self.deliver(entries)
+            except Exception as e:
+                logger.error(f"Erreur lors de la livraison de l'outbox: {e}")
+                delivered = False
+
+            if delivered:
+                self.outbox.ack(pending)
+                self.breaker.record_success()
+                self.attempts = 0
+                self.next_attempt = 0.0
+                return len(entries)
+
+            self.breaker.record_failure()
+            self.attempts += 1
+            delay = self.backoff_delay()
+            self.next_attempt = time.monotonic() + delay
+            logger.warning(
+                f"Échec de livraison de {len(entries)} scores "
+                f"(tentative {self.attempts}), nouvel essai dans {delay:.0f}s"
+            )
+            return 0
+
+        finally:
+            self._lock.release()
@@ -0,0 +1,237 @@
+"""
+Flux temps réel du scoreboard (Server-Sent Events) pour score_sync
+Un seul producteur calcule le classement et publie les deltas sur un canal
+Redis pub/sub; chaque worker a un seul abonné Redis qui redistribue les
+messages aux connexions SSE locales.
+"""
+
+import os
+import json
+import queue
+import time
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = 'ace:scoreboard:deltas'
+SNAPSHOT_KEY = 'ace:scoreboard:snapshot'
+PRODUCER_LOCK_KEY = 'ace:scoreboard:producer'
+
+
+def compute_delta(previous, current):
+    """
+    Comparer deux classements {ctfd_team_id: entrée}
+    Retourne (entrées modifiées, ids supprimés)
+    """
+    changed = [
+        entry for team_id, entry in current.items()
+        if previous.get(team_id) != entry
+    ]
+    removed = [team_id for team_id in previous if team_id not in current]
+    return changed, removed
+
+
+def format_event(event, data, event_id=None):
+    """Formater un message SSE"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {data}")
+    return '\n'.join(lines) + '\n\n'
+
+
+class Subscriber:
+    """
+    Connexion SSE locale avec une file bornée
+    version: dernière version envoyée au client (snapshot ou delta)
+    """
+
+    def __init__(self, max_queue):
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.resync = False
+        self.version = None
+
+    def offer(self, message):
+        """
+        Déposer un message sans jamais bloquer le producteur
+        Si le client est trop lent, on vide sa file et on lui renverra un
+        snapshot complet à la place des deltas manqués.
+        """
+        try:
+            self.queue.put_nowait(message)
+        except queue.Full:
+            self.resync = True
+            try:
+                while True:
+                    self.queue.get_nowait()
+            except queue.Empty:
+                pass
+            self.queue.put_nowait(None)
+
+
+class StandingsHub:
+    """
+    Fan-out du classement vers les connexions SSE de ce worker
+    Sans Redis, le producteur publie directement dans le hub local.
+    """
+
+    def __init__(self, redis_client=None, max_queue=32):
+        self.redis = redis_client
+        self.max_queue = max_queue
+        self.subscribers = set()
+        self.version = 0
+        self._snapshot = {}
+        self._lock = threading.Lock()
+        self._listener = None
+
+    def subscribe(self):
+        """Enregistrer une nouvelle connexion"""
+        subscriber = Subscriber(self.max_queue)
+        with self._lock:
+            self.subscribers.add(subscriber)
+        self._ensure_listener()
+        return subscriber
+
+    def unsubscribe(self, subscriber):
+        with self._lock:
+            self.subscribers.discard(subscriber)
+
+    def dispatch(self, message):
+        """Distribuer un message JSON brut à toutes les connexions locales"""
+        # Décodé une seule fois par worker, pas une fois par connexion
+        message = (json.loads(message)['version'], message)
+        with self._lock:
+            subscribers = list(self.subscribers)
+        for subscriber in subscribers:
+            subscriber.offer(message)
+
+    def snapshot(self):
+        """Retourner le dernier snapshot publié (JSON brut)"""
+        if self.redis is not None:
+            raw = self.redis.get(SNAPSHOT_KEY)
+            if raw:
+                return raw
+        with self._lock:
+            return json.dumps({'version': self.version, 'standings': list(self._snapshot.values())})
+
+    def publish(self, scoreboard, interval):
+        """
+        Publier les changements du classement
+        Avec Redis, appelé par le scheduler du seul worker élu
+        (warmup.on_leader), qui publie pour tous; le verrou Redis évite encore
+        deux producteurs pendant une relève du worker élu. Sans Redis, le job
+        tourne dans chaque worker (warmup.on_ready) pour ses propres abonnés.
+        Retourne le classement publié, ou None si rien n'a changé (ou si un
+        autre worker détient le verrou pour cet intervalle).
+        """
+        if self.redis is not None:
+            lock_ttl = max(int(interval * 1000 * 0.9), 100)
+            if not self.redis.set(PRODUCER_LOCK_KEY, os.getpid(), nx=True, px=lock_ttl):
+                return None
+
+            raw = self.redis.get(SNAPSHOT_KEY)
+            previous_snapshot = json.loads(raw) if raw else {'version': 0, 'standings': []}
+            version = previous_snapshot['version']
+            previous = {str(entry['ctfd_team_id']): entry for entry in previous_snapshot['standings']}
+        else:
+            version = self.version
+            previous = self._snapshot
+
+        standings = scoreboard()
+        current = {str(entry['ctfd_team_id']): entry for entry in standings}
+        changed, removed = compute_delta(previous, current)
+        if not changed and not removed:
+            return None
+
+        version += 1
+        delta = json.dumps({'version': version, 'changed': changed, 'removed': removed})
+        snapshot = json.dumps({'version': version, 'standings': list(current.values())})
+
+        if self.redis is not None:
+            pipe = self.redis.pipeline()
+            pipe.set(SNAPSHOT_KEY, snapshot)
+            pipe.publish(CHANNEL, delta)
+            pipe.execute()
+        else:
+            with self._lock:
+                self.version = version
+                self._snapshot = current
+            self.dispatch(delta)
+
+        logger.debug(f"Delta du classement publié (version {version}, {len(changed)} équipes)")
+        return standings
+
+    def _ensure_listener(self):
+        """Démarrer l'unique abonné Redis de ce worker"""
+        if self.redis is None:
+            return
+        with self._lock:
+            if self._listener is not None and self._listener.is_alive():
+                return
+            self._listener = threading.Thread(target=self._listen, name='scoreboard-pubsub', daemon=True)
+            self._listener.start()
+
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    if message['type'] == 'message':
+                        self.dispatch(message['data'])
+            except Exception as e:
+                logger.error(f"Abonnement au canal du classement perdu: {e}")
+                time.sleep(1)
+
+    def _snapshot_event(self, subscriber, force=False):
+        """
+        Événement snapshot pour `subscriber`, ou None s'il a déjà cette version
+        (marqueur de resync arrivé après un snapshot déjà envoyé)
+        """
+        snapshot = self.snapshot()
+        version = json.loads(snapshot)['version']
+        if not force and version == subscriber.version:
+            return None
+        subscriber.version = version
+        return format_event('snapshot', snapshot, version)
+
+    def stream(self, heartbeat=15):
+        """
+        Générateur SSE pour une connexion
+        Les deltas déjà inclus dans le dernier snapshot envoyé (version
+        inférieure ou égale) ne sont pas retransmis.
+        """
+        subscriber = self.subscribe()
+        try:
+            yield self._snapshot_event(subscriber, force=True)
+
+            while True:
+                try:
+                    message = subscriber.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    # Commentaire SSE: garde la connexion ouverte à travers les proxys
+                    yield ': heartbeat\n\n'
+                    continue
+
+                if message is None or subscriber.resync:
+                    subscriber.resync = False
+                    event = self._snapshot_event(subscriber)
+                    if event is not None:
+                        yield event
+                    continue
+
+                version, data = message
+                if version <= subscriber.version:
+                    # Déjà dans le snapshot envoyé; sauf si la numérotation est
+                    # repartie de zéro (snapshot Redis perdu): snapshot complet
+                    if json.loads(self.snapshot())['version'] < subscriber.version:
+                        yield self._snapshot_event(subscriber, force=True)
+                    continue
+
+                subscriber.version = version
+                yield format_event('delta', data, version)
+
+        finally:
+            self.unsubscribe(subscriber)
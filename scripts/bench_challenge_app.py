@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+"""
+Test de charge de l'application du challenge de test
+Compare l'ancienne version (render_template_string à chaque requête, serveur
+de développement Flask) au socle challenges/common (page rendue au démarrage,
+ETag/Cache-Control, gunicorn):
+1. coût par requête dans le processus (client de test Flask, sans réseau)
+2. charge HTTP: clients concurrents en keep-alive pendant --duration secondes,
+   puis les mêmes clients en revalidation (If-None-Match, réponses 304)
+
+Usage: python scripts/bench_challenge_app.py [--concurrency 50] [--duration 10]
+Nécessite flask (et gunicorn pour la partie HTTP du socle).
+"""
+
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+import importlib.util
+from pathlib import Path
+
+from bench_common import percentile
+
+CHALLENGES_DIR = Path(__file__).parent.parent / 'challenges'
+COMMON_DIR = CHALLENGES_DIR / 'common'
+DEPLOY_DIR = CHALLENGES_DIR / 'test' / 'deploy'
+LEGACY_PORT = 5101
+SCAFFOLD_PORT = 5102
+
+
+def load_challenge_app():
+    """Module app.py du challenge de test (socle importable depuis challenges/common)"""
+    sys.path.insert(0, str(COMMON_DIR))
+    spec = importlib.util.spec_from_file_location('challenge_test_app', DEPLOY_DIR / 'app.py')
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_legacy_app(module):
+    """Ancienne version: template recompilé et rendu à chaque requête"""
+    from flask import Flask, render_template_string
+
+    app = Flask('legacy')
+
+    @app.route('/')
+    def index():
+        return render_template_string(module.HTML_TEMPLATE, flag=module.FLAG)
+
+    return app
+
+
+def bench_in_process(app, requests_count, headers=None):
+    """Temps moyen par requête via le client de test Flask (µs)"""
+    client = app.test_client()
+    client.get('/', headers=headers)
+    start = time.perf_counter()
+    for _ in range(requests_count):
+        client.get('/', headers=headers)
+    return (time.perf_counter() - start) / requests_count * 1e6
+
+
+def wait_for_port(port, timeout=15):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return True
+        except OSError:
+            time.sleep(0.1)
+    return False
+
+
+def load_test(port, concurrency, duration, conditional=False):
+    """Clients keep-alive concurrents; retourne (requêtes, erreurs, latences triées en ms)"""
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+    deadline = time.monotonic() + duration
+
+    def client():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        headers = {'Accept-Encoding': 'gzip'}
+        local = []
+        while time.monotonic() < deadline:
+            start = time.perf_counter()
+            try:
+                conn.request('GET', '/', headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status not in (200, 304):
+                    raise http.client.HTTPException(response.status)
+                if conditional and response.getheader('ETag'):
+                    headers['If-None-Match'] = response.getheader('ETag')
+            except (OSError, http.client.HTTPException):
+                with lock:
+                    errors[0] += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                continue
+            local.append((time.perf_counter() - start) * 1000)
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    return len(latencies), errors[0], sorted(latencies)
+
+
+def report(label, result, duration):
+    count, errors, latencies = result
+    print(f"  {label:<34} {count / duration:8.0f} req/s   "
+          f"p50 {percentile(latencies, 0.50):6.1f} ms   p99 {percentile(latencies, 0.99):6.1f} ms   "
+          f"erreurs {errors}")
+
+
+def start_server(command, port, env=None):
+    process = subprocess.Popen(
+        command,
+        env=dict(os.environ, **(env or {})),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    if not wait_for_port(port):
+        process.terminate()
+        raise RuntimeError(f"Serveur non démarré sur le port {port}: {' '.join(command)}")
+    return process
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test de charge du challenge de test")
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--duration', type=float, default=10)
+    parser.add_argument('--requests', type=int, default=2000, help="requêtes de la mesure dans le processus")
+    parser.add_argument('--workers', type=int, default=None, help="workers gunicorn (défaut: gunicorn.conf.py)")
+    parser.add_argument('--serve-legacy', type=int, default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    """Fonction principale"""
+    args = parse_args()
+    module = load_challenge_app()
+    legacy = create_legacy_app(module)
+
+    # Sous-processus: ancienne version sur le serveur de développement (comme `python app.py`)
+    if args.serve_legacy:
+        legacy.run(host='127.0.0.1', port=args.serve_legacy, debug=False)
+        return
+
+    print(f"\n{'='*60}")
+    print("Coût par requête dans le processus (client de test Flask)")
+    print(f"{'='*60}")
+    legacy_us = bench_in_process(legacy, args.requests)
+    scaffold_us = bench_in_process(module.app, args.requests)
+    etag = module.app.test_client().get('/').headers['ETag']
+    revalidate_us = bench_in_process(module.app, args.requests, headers={'If-None-Match': etag})
+    print(f"  render_template_string:            {legacy_us:8.0f} µs/requête")
+    print(f"  page rendue au démarrage:          {scaffold_us:8.0f} µs/requête ({legacy_us / scaffold_us:.1f}x)")
+    print(f"  revalidation (304):                {revalidate_us:8.0f} µs/requête")
+
+    print(f"\n{'='*60}")
+    print(f"Charge HTTP: {args.concurrency} clients keep-alive, {args.duration:.0f}s par mesure")
+    print(f"{'='*60}")
+
+    server = start_server([sys.executable, __file__, '--serve-legacy', str(LEGACY_PORT)], LEGACY_PORT)
+    try:
+        report("ancien (serveur dev Flask)", load_test(LEGACY_PORT, args.concurrency, args.duration), args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+    if importlib.util.find_spec('gunicorn') is None:
+        print("  socle (gunicorn): gunicorn non installé, mesure ignorée")
+        return
+
+    env = {'PORT': str(SCAFFOLD_PORT), 'PYTHONPATH': str(COMMON_DIR)}
+    if args.workers:
+        env['WEB_CONCURRENCY'] = str(args.workers)
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '-c', str(COMMON_DIR / 'gunicorn.conf.py'),
+        '--chdir', str(DEPLOY_DIR),
+        'app:app'
+    ]
+    server = start_server(command, SCAFFOLD_PORT, env)
+    try:
+        report("socle (gunicorn)", load_test(SCAFFOLD_PORT, args.concurrency, args.duration), args.duration)
+        report("socle (gunicorn), revalidation 304",
+               load_test(SCAFFOLD_PORT, args.concurrency, args.duration, conditional=True), args.duration)
+    finally:
+        server.terminate()
+        server.wait()
+
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,11 @@
+"""
+Utilitaires partagés par les scripts de mesure (bench_*.py)
+"""
+
+
+def percentile(values, fraction):
+    """Percentile par rang le plus proche sur une liste triée (0 si vide)"""
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, max(0, int(round(fraction * len(values))) - 1))
+    return values[index]
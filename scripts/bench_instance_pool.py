@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Mesure du pool d'instances par équipe (plugin challenge_instances)
+Des équipes arrivent sur --ramp secondes et demandent chacune une instance
+d'un challenge au hasard; le démarrage d'une instance dure --start-delay
+secondes (backend simulé). Compare un pool vide (démarrage à chaque demande)
+à un pool gardant --warm instances prêtes par challenge, rempli par une passe
+d'entretien toutes les --interval secondes comme dans le worker élu.
+
+Usage: python scripts/bench_instance_pool.py [--teams 100] [--challenges 5] [--warm 4] [--start-delay 2]
+"""
+
+import sys
+import time
+import types
+import random
+import logging
+import argparse
+import threading
+import importlib
+from pathlib import Path
+
+from bench_common import percentile
+
+# Paquet chargé sans son __init__ (qui importe CTFd): seuls backends.py et pool.py servent ici
+PLUGIN_DIR = Path(__file__).parent.parent / 'plugins' / 'challenge_instances'
+package = types.ModuleType('challenge_instances')
+package.__path__ = [str(PLUGIN_DIR)]
+sys.modules['challenge_instances'] = package
+backends = importlib.import_module('challenge_instances.backends')
+pool_module = importlib.import_module('challenge_instances.pool')
+logging.getLogger('challenge_instances').setLevel(logging.ERROR)
+
+
+def run(args, warm):
+    """Une mesure; retourne (latences triées en ms, résultats, instances démarrées)"""
+    backend = backends.FakeBackend(start_delay=args.start_delay)
+    specs = {
+        f"challenge-{index}": backends.InstanceSpec(f"challenge-{index}", 'image', 1337, 'tcp', warm, '128m')
+        for index in range(args.challenges)
+    }
+    pool = pool_module.InstancePool(
+        backend,
+        pool_module.InstanceStore(),
+        specs,
+        max_instances=args.teams + warm * args.challenges,
+        spawn_workers=args.spawn_workers
+    )
+
+    # Pool rempli avant l'ouverture, comme après le démarrage du worker élu
+    pool.maintain()
+
+    stop = threading.Event()
+
+    def maintainer():
+        while not stop.wait(args.interval):
+            pool.maintain()
+
+    maintenance = threading.Thread(target=maintainer, daemon=True)
+    maintenance.start()
+
+    latencies = []
+    results = {}
+    lock = threading.Lock()
+    rng = random.Random(args.seed)
+    arrivals = sorted(rng.uniform(0, args.ramp) for _ in range(args.teams))
+    challenges = [rng.choice(list(specs)) for _ in range(args.teams)]
+    origin = time.monotonic()
+
+    def team(team_id):
+        time.sleep(max(0.0, origin + arrivals[team_id] - time.monotonic()))
+        start = time.perf_counter()
+        _, result = pool.acquire(team_id, challenges[team_id])
+        elapsed = (time.perf_counter() - start) * 1000
+        with lock:
+            latencies.append(elapsed)
+            results[result] = results.get(result, 0) + 1
+
+    threads = [threading.Thread(target=team, args=(team_id,)) for team_id in range(args.teams)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stop.set()
+    maintenance.join()
+    return sorted(latencies), results, backend.started
+
+
+def report(label, result):
+    latencies, results, started = result
+    hits = results.get('hit', 0)
+    total = sum(results.values())
+    print(f"  {label:<26} p50 {percentile(latencies, 0.50):8.1f} ms   p95 {percentile(latencies, 0.95):8.1f} ms   "
+          f"max {latencies[-1]:8.1f} ms   pool {hits}/{total} ({100 * hits / total:.0f} %)   "
+          f"instances démarrées {started}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Mesure du pool d'instances par équipe")
+    parser.add_argument('--teams', type=int, default=100)
+    parser.add_argument('--challenges', type=int, default=5)
+    parser.add_argument('--warm', type=int, default=4, help="instances prêtes par challenge")
+    parser.add_argument('--start-delay', type=float, default=2.0, help="durée d'un démarrage (s)")
+    parser.add_argument('--ramp', type=float, default=30.0, help="arrivée des équipes sur (s)")
+    parser.add_argument('--interval', type=float, default=1.0, help="intervalle d'entretien (s)")
+    parser.add_argument('--spawn-workers', type=int, default=4)
+    parser.add_argument('--seed', type=int, default=2025)
+    return parser.parse_args()
+
+
+def main():
+    """Fonction principale"""
+    args = parse_args()
+
+    print(f"\n{'='*60}")
+    print(f"{args.teams} équipes sur {args.ramp:.0f}s, {args.challenges} challenges, "
+          f"démarrage {args.start_delay:g}s")
+    print(f"{'='*60}")
+
+    report("sans pool", run(args, 0))
+    report(f"pool de {args.warm} par challenge", run(args, args.warm))
+    print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+Coût par requête de la politique d'accès (plugin request_policy)
+Compare le matcher compilé aux trois anciens hooks before_request
+(disable_setup, disable_team_creation, disable_team_editing), vérifie qu'ils
+prennent les mêmes décisions puis mesure le temps moyen par requête.
+
+Usage: python scripts/bench_request_policy.py [iterations]
+"""
+
+import sys
+import time
+import random
+import importlib.util
+from pathlib import Path
+
+# Charger rules.py directement (le paquet request_policy importe CTFd)
+RULES_PATH = Path(__file__).parent.parent / 'plugins' / 'request_policy' / 'rules.py'
+spec = importlib.util.spec_from_file_location('request_policy_rules', RULES_PATH)
+rules = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(rules)
+
+# Répartition approximative du trafic d'un événement: surtout statique et lectures d'API
+TRAFFIC = [
+    ('GET', '/themes/core/static/assets/main.css', 30),
+    ('GET', '/themes/core/static/img/logo.png', 15),
+    ('GET', '/api/v1/challenges', 10),
+    ('GET', '/api/v1/scoreboard/top/10', 8),
+    ('GET', '/api/v1/teams/12', 5),
+    ('GET', '/challenges', 8),
+    ('GET', '/scoreboard', 5),
+    ('POST', '/api/v1/challenges/attempt', 10),
+    ('GET', '/api/score-sync/stream', 2),
+    ('GET', '/teams', 2),
+    ('GET', '/teams/12', 2),
+    ('GET', '/teams/new', 1),
+    ('POST', '/teams/join', 1),
+    ('GET', '/teams/12/settings', 1),
+    ('PATCH', '/api/v1/teams/me', 1),
+    ('DELETE', '/api/v1/teams/12/members', 1),
+    ('POST', '/api/v1/teams/12/join', 1),
+    ('POST', '/api/v1/teams', 1),
+    ('GET', '/setup', 1),
+    ('POST', '/sso/authenticate', 2),
+]
+
+
+class FakeSession:
+    """Compte les lectures de session (is_admin)"""
+
+    def __init__(self, admin):
+        self.admin = admin
+        self.reads = 0
+
+    def is_admin(self):
+        self.reads += 1
+        return self.admin
+
+
+def legacy_policy(method, path, session):
+    """Les trois anciens hooks, dans l'ordre de chargement des plugins"""
+    # disable_setup
+    if path == '/setup' or path.startswith('/setup/'):
+        return rules.NOT_FOUND
+
+    # disable_team_creation
+    if method in ['POST', 'PUT', 'PATCH']:
+        if path in ['/api/v1/teams', '/teams']:
+            return rules.FORBIDDEN
+        if '/api/v1/teams/' in path and path.endswith('/join'):
+            return rules.FORBIDDEN
+    if path in ['/teams/new', '/teams/join']:
+        return rules.TEAMS_DISABLED_PAGE
+
+    # disable_team_editing
+    if session.is_admin():
+        return None
+    if path.startswith('/teams/') and '/settings' in path:
+        return rules.REDIRECT
+    if method in ['PATCH', 'PUT', 'DELETE']:
+        if '/api/v1/teams/' in path:
+            return rules.FORBIDDEN
+    if method == 'POST':
+        for blocked in ['/teams/join', '/teams/new']:
+            if path.startswith(blocked):
+                return rules.FORBIDDEN
+    return None
+
+
+def compiled_policy(matcher, method, path, session):
+    """Même logique que le hook de request_policy"""
+    rule = matcher.match(method, path)
+    if rule is None:
+        return None
+    if rule.admin_exempt and session.is_admin():
+        return None
+    return rule.action
+
+
+def check_equivalence(matcher):
+    """Vérifier que les deux implémentations décident pareil"""
+    extra = [
+        ('GET', '/setup/'), ('POST', '/setup/x'), ('GET', '/setupx'),
+        ('PUT', '/teams'), ('GET', '/teams/settings'), ('POST', '/teams/newer'),
+        ('PUT', '/api/v1/teams/1/join'), ('GET', '/api/v1/teams/1/join'),
+        ('OPTIONS', '/teams/join'), ('PATCH', '/api/v1/teams/'),
+    ]
+    requests = [(method, path) for method, path, _ in TRAFFIC] + extra
+    mismatches = 0
+
+    for admin in (False, True):
+        for method, path in requests:
+            expected = legacy_policy(method, path, FakeSession(admin))
+            actual = compiled_policy(matcher, method, path, FakeSession(admin))
+            if expected != actual:
+                mismatches += 1
+                print(f"✗ {method} {path} (admin={admin}): ancien={expected} compilé={actual}")
+
+    return mismatches
+
+
+def measure(policy, requests, session):
+    """Temps moyen par requête en nanosecondes"""
+    start = time.perf_counter()
+    for method, path in requests:
+        policy(method, path, session)
+    return (time.perf_counter() - start) / len(requests) * 1e9
+
+
+def main():
+    """Fonction principale"""
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    matcher = rules.PolicyMatcher(rules.DEFAULT_RULES)
+
+    mismatches = check_equivalence(matcher)
+    if mismatches:
+        print(f"✗ {mismatches} décisions différentes")
+        return 1
+    print("✓ Décisions identiques à l'ancienne implémentation")
+
+    population = [(method, path) for method, path, _ in TRAFFIC]
+    weights = [weight for _, _, weight in TRAFFIC]
+    requests = random.choices(population, weights=weights, k=iterations)
+
+    def compiled(method, path, session):
+        return compiled_policy(matcher, method, path, session)
+
+    print("\n" + "=" * 70)
+    print(f"POLITIQUE D'ACCÈS - {iterations} requêtes")
+    print("=" * 70)
+    print(f"  {'implémentation':<28}{'ns/requête':>12}{'lectures session':>20}")
+
+    for label, policy in (('3 hooks before_request', legacy_policy), ('matcher compilé', compiled)):
+        session = FakeSession(admin=False)
+        elapsed = measure(policy, requests, session)
+        print(f"  {label:<28}{elapsed:>12.0f}{session.reads:>20}")
+
+    print("=" * 70 + "\n")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
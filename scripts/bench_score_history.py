@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+"""
+Mesure de l'historique du classement (plugin score_sync) sur une journée
+Simule un événement de 24 h avec un snapshot toutes les 30 secondes et
+rapporte la taille du fichier, la mémoire utilisée et le temps de requête.
+Vérifie d'abord l'écriture concurrente (deux workers sur un fichier vide,
+comme au démarrage sans Redis) et la reprise après un enregistrement illisible.
+
+Usage: python scripts/bench_score_history.py [nombre_equipes ...]
+"""
+
+import os
+import sys
+import time
+import random
+import tempfile
+import threading
+import tracemalloc
+import importlib.util
+from pathlib import Path
+
+# Charger history.py directement (le paquet score_sync importe CTFd)
+HISTORY_PATH = Path(__file__).parent.parent / 'plugins' / 'score_sync' / 'history.py'
+spec = importlib.util.spec_from_file_location('score_sync_history', HISTORY_PATH)
+history = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(history)
+
+EVENT_SECONDS = 24 * 3600
+INTERVAL = 30
+
+
+def simulate(team_count, path):
+    """Écrire une journée de snapshots pour `team_count` équipes"""
+    store = history.ScoreHistory(path)
+    scores = [0] * team_count
+    start = time.time() - EVENT_SECONDS
+
+    for tick in range(EVENT_SECONDS // INTERVAL):
+        # Quelques équipes résolvent un challenge à chaque intervalle
+        for team in random.sample(range(team_count), max(1, team_count // 20)):
+            scores[team] += random.choice([50, 100, 200, 500])
+
+        store.record(scoreboard_of(scores), timestamp=start + tick * INTERVAL)
+
+
+def scoreboard_of(scores):
+    return [
+        {'ctfd_team_id': team + 1, 'team_name': f'Équipe {team + 1}', 'score': score}
+        for team, score in enumerate(scores)
+    ]
+
+
+def check_concurrent_writers(rounds=50):
+    """Deux écrivains démarrant ensemble sur un fichier vide: un seul en-tête, fichier relisible"""
+    with tempfile.TemporaryDirectory() as directory:
+        for round_index in range(rounds):
+            path = os.path.join(directory, f'history-{round_index}.bin')
+            barrier = threading.Barrier(2)
+            written = []
+
+            def writer(offset):
+                store = history.ScoreHistory(path)
+                barrier.wait()
+                for tick in range(5):
+                    if store.record(scoreboard_of([tick * 100 + offset, tick * 10])):
+                        written.append(tick)
+
+            threads = [threading.Thread(target=writer, args=(offset,)) for offset in (1, 2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            with open(path, 'rb') as f:
+                data = f.read()
+            reader = history.ScoreHistory(path)
+            reader.refresh()
+            if data.count(history.MAGIC) != 1 or reader._corrupt_at is not None:
+                print(f"✗ Écriture concurrente: fichier invalide au tour {round_index}")
+                return False
+            if len(reader.timestamps) != len(written) or len(reader.columns) != 2:
+                print(f"✗ Écriture concurrente: {len(reader.timestamps)} snapshots lus pour {len(written)} écrits")
+                return False
+
+        # Enregistrement illisible: la lecture s'arrête, l'écriture suivante tronque et reprend
+        path = os.path.join(directory, 'corrupt.bin')
+        store = history.ScoreHistory(path)
+        store.record(scoreboard_of([100, 50]))
+        with open(path, 'ab') as f:
+            f.write(b'\xffgarbage')
+        store = history.ScoreHistory(path)
+        store.refresh()
+        store.record(scoreboard_of([200, 50]))
+        reader = history.ScoreHistory(path)
+        reader.refresh()
+        if len(reader.timestamps) != 2 or reader.latest_scores() != [200, 50]:
+            print("✗ Reprise après un enregistrement illisible")
+            return False
+
+    print(f"✓ Écriture concurrente ({rounds} fichiers, 2 écrivains) et reprise après corruption")
+    return True
+
+
+def main():
+    """Fonction principale"""
+    if not check_concurrent_writers():
+        sys.exit(1)
+
+    team_counts = [int(arg) for arg in sys.argv[1:]] or [100, 500, 1000]
+
+    print("=" * 70)
+    print("HISTORIQUE DU CLASSEMENT - 24 h, un snapshot toutes les 30 s")
+    print("=" * 70)
+    print(f"  {'équipes':>8}{'snapshots':>11}{'fichier (Ko)':>14}{'mémoire (Ko)':>14}{'top 10 (ms)':>13}")
+
+    for team_count in team_counts:
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.bin')
+            simulate(team_count, path)
+
+            # Chargement à froid, comme un worker qui redémarre
+            tracemalloc.start()
+            store = history.ScoreHistory(path)
+            store.refresh()
+            _, peak = tracemalloc.get_traced_memory()
+            current = tracemalloc.get_traced_memory()[0]
+            tracemalloc.stop()
+
+            start = time.perf_counter()
+            store.series(top=10, points=200, ranks=True)
+            query_ms = (time.perf_counter() - start) * 1000
+
+            print(
+                f"  {team_count:>8}{len(store.timestamps):>11}"
+                f"{os.path.getsize(path) / 1024:>14.0f}{current / 1024:>14.0f}{query_ms:>13.1f}"
+            )
+
+            if peak > current * 2:
+                print(f"           (pic de chargement: {peak / 1024:.0f} Ko)")
+
+    print("=" * 70 + "\n")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark du transport des scores (plugin score_sync)
+Compare la taille sur le réseau et le temps de sérialisation des formats
+rows / columnar, avec et sans gzip, pour 100, 1 000 et 10 000 équipes.
+
+Usage: python scripts/bench_score_payload.py
+"""
+
+import sys
+import time
+import uuid
+import random
+import importlib.util
+from pathlib import Path
+
+# Charger payload.py directement (le paquet score_sync importe CTFd)
+PAYLOAD_PATH = Path(__file__).parent.parent / 'plugins' / 'score_sync' / 'payload.py'
+spec = importlib.util.spec_from_file_location('score_sync_payload', PAYLOAD_PATH)
+payload = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(payload)
+
+TEAM_COUNTS = [100, 1000, 10000]
+REPEAT = 20
+
+
+def generate_scores(count):
+    """Générer un scoreboard factice"""
+    scores = []
+    for rank in range(1, count + 1):
+        scores.append({
+            'teamId': str(uuid.uuid4()),
+            'ctfdTeamId': rank,
+            'score': random.randint(0, 5000),
+            'rank': rank
+        })
+    return scores
+
+
+def measure(scores, payload_format, use_gzip):
+    """Retourner (taille en octets, temps moyen en ms)"""
+    start = time.perf_counter()
+    for _ in range(REPEAT):
+        body, _ = payload.encode_scores(scores, payload_format=payload_format, use_gzip=use_gzip)
+    elapsed = (time.perf_counter() - start) / REPEAT
+    return len(body), elapsed * 1000
+
+
+def main():
+    """Fonction principale"""
+    encoder = 'orjson' if payload.orjson is not None else 'json (stdlib)'
+
+    print("=" * 70)
+    print(f"BENCHMARK PAYLOAD SCORES - encodeur: {encoder}")
+    print("=" * 70)
+
+    variants = [
+        ('rows', payload.FORMAT_ROWS, False),
+        ('rows+gzip', payload.FORMAT_ROWS, True),
+        ('columnar', payload.FORMAT_COLUMNAR, False),
+        ('columnar+gzip', payload.FORMAT_COLUMNAR, True),
+    ]
+
+    for count in TEAM_COUNTS:
+        scores = generate_scores(count)
+        baseline = None
+
+        print(f"\n{count} équipes")
+        print(f"  {'format':<16}{'octets':>12}{'ratio':>10}{'temps (ms)':>14}")
+
+        for label, payload_format, use_gzip in variants:
+            size, ms = measure(scores, payload_format, use_gzip)
+            baseline = baseline or size
+            print(f"  {label:<16}{size:>12}{size / baseline:>10.2f}{ms:>14.3f}")
+
+    print("\n" + "=" * 70 + "\n")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmark du login SSO (plugin auth_sync)
+Compte les requêtes SQL et les commits par login pour les principaux cas
+(nouvel utilisateur, capitaine, login répété, changement d'équipe) sur une
+application CTFd de test en SQLite, pour l'ancien chemin de login (rejoué sur
+une route de test) et pour /sso/authenticate.
+
+À lancer dans le conteneur CTFd (CTFd et les plugins doivent être importables):
+    docker compose cp scripts/bench_sso_login.py ctfd:/tmp/
+    docker compose exec ctfd python /tmp/bench_sso_login.py
+"""
+
+import os
+import sys
+import time
+import uuid
+import tempfile
+import threading
+
+# Configuration des plugins avant leur import par CTFd
+os.environ.setdefault('JWT_SECRET', 'bench-jwt-secret')
+os.environ.setdefault('CTFD_ADMIN_PASSWORD', 'bench-admin-password')
+os.environ.setdefault('REGISTRATION_SITE_URL', 'http://127.0.0.1:9/api')
+# Tous les logins viennent de 127.0.0.1 (et --repeat réutilise l'email): ne pas mesurer les limites de débit
+os.environ.setdefault('SSO_RATE_LIMIT_IP_BURST', '1000000')
+os.environ.setdefault('SSO_RATE_LIMIT_EMAIL_BURST', '1000000')
+# Comme TestingConfig: pas de Redis, tout reste dans le processus
+os.environ['REDIS_URL'] = ''
+# Fichiers des plugins (snapshot des équipes, historique du classement) hors du volume des uploads
+BENCH_DIR = tempfile.mkdtemp(prefix='ace-bench-')
+os.environ.setdefault('REGISTRATION_SNAPSHOT_PATH', os.path.join(BENCH_DIR, 'teams.json.gz'))
+os.environ.setdefault('SCORE_HISTORY_PATH', os.path.join(BENCH_DIR, 'history.bin'))
+
+import jwt
+from sqlalchemy import event
+
+JWT_SECRET = os.environ['JWT_SECRET']
+
+
+def create_test_app(database_url='sqlite://'):
+    """Créer une application CTFd de test avec les plugins chargés"""
+    from CTFd import create_app
+    from CTFd.config import TestingConfig
+
+    class BenchConfig(TestingConfig):
+        SQLALCHEMY_DATABASE_URI = database_url
+        # TestingConfig désactive les plugins
+        SAFE_MODE = False
+        # Accepter les requêtes HTTP sur 127.0.0.1:<port> (bench_sso_storm)
+        SERVER_NAME = None
+
+    app = create_app(BenchConfig)
+    stop_plugin_schedulers()
+
+    with app.app_context():
+        from CTFd.utils import set_config
+        set_config('setup', True)
+        set_config('user_mode', 'teams')
+
+    return app
+
+
+def stop_plugin_schedulers():
+    """Arrêter les synchronisations périodiques des plugins pour ne mesurer que le benchmark"""
+    from CTFd.plugins.ace_common import warmup
+    warmup.stop()
+
+    for name in ('registration_sync', 'score_sync'):
+        module = sys.modules.get(f"CTFd.plugins.{name}")
+        scheduler = getattr(module, 'scheduler', None)
+        if scheduler is not None and scheduler.running:
+            scheduler.shutdown(wait=False)
+
+
+class QueryCounter:
+    """Compter les requêtes SQL et les commits sur le moteur de l'application"""
+
+    def __init__(self, engine):
+        self.queries = 0
+        self.commits = 0
+        self._lock = threading.Lock()
+        event.listen(engine, 'before_cursor_execute', self._on_query)
+        event.listen(engine, 'commit', self._on_commit)
+
+    def _on_query(self, *args):
+        with self._lock:
+            self.queries += 1
+
+    def _on_commit(self, *args):
+        with self._lock:
+            self.commits += 1
+
+    def reset(self):
+        self.queries = 0
+        self.commits = 0
+
+
+def mint_token(email, user_id=None, team_id=None, is_admin=False, expires_in=3600):
+    """Générer un JWT HS256 comme le site d'inscription"""
+    return jwt.encode(
+        {
+            'id': user_id or str(uuid.uuid4()),
+            'email': email,
+            'isAdmin': is_admin,
+            'teamId': team_id,
+            'exp': int(time.time()) + expires_in
+        },
+        JWT_SECRET,
+        algorithm='HS256'
+    )
+
+
+def create_team(app, name, registration_team_id, captain_id=None):
+    """Créer une équipe CTFd et sa correspondance dans le cache (comme registration_sync)"""
+    from CTFd.models import db, Teams
+    from CTFd.plugins.registration_sync import remember_team_mappings
+
+    with app.app_context():
+        team = Teams(name=name, email=f"{uuid.uuid4().hex}@bench.local", password='bench')
+        db.session.add(team)
+        db.session.commit()
+        remember_team_mappings({
+            registration_team_id: {'ctfd_team_id': team.id, 'captain_id': captain_id}
+        })
+        return team.id
+
+
+def legacy_sso_login(app):
+    """
+    Route /bench/sso-legacy: chemin de login d'avant l'upsert (user-032), rejoué
+    pour la comparaison. JWT toujours vérifié, utilisateur et équipe lus par deux
+    requêtes séparées, un commit pour l'utilisateur puis un pour le capitaine.
+    """
+    import jwt as pyjwt
+    from flask import request, jsonify
+    from CTFd.models import db, Users, Teams
+    from CTFd.plugins import bypass_csrf_protection
+    from CTFd.utils.security.auth import login_user
+    from CTFd.utils.security.passwords import hash_password
+    from CTFd.plugins.auth_sync import resolve_team_mapping
+
+    @bypass_csrf_protection
+    def sso_legacy():
+        data = request.get_json()
+        token, email = data['token'], data['email']
+        payload = pyjwt.decode(token, JWT_SECRET, algorithms=['HS256'])
+
+        user = Users.query.filter_by(email=email).first()
+        user_type = 'admin' if payload.get('isAdmin', False) else 'user'
+
+        ctfd_team = None
+        is_team_captain = False
+        if payload.get('teamId'):
+            team_mapping = resolve_team_mapping(payload['teamId'])
+            if team_mapping:
+                ctfd_team = Teams.query.filter_by(id=team_mapping['ctfd_team_id']).first()
+                if ctfd_team:
+                    is_team_captain = team_mapping.get('captain_id') == payload.get('id')
+
+        if not user:
+            user = Users(
+                name=email.split('@')[0],
+                email=email,
+                password=hash_password(os.urandom(32).hex()),
+                type=user_type,
+                team_id=ctfd_team.id if ctfd_team else None,
+                verified=True,
+                hidden=False,
+                banned=False
+            )
+            db.session.add(user)
+            db.session.commit()
+        else:
+            needs_update = False
+            if user.type != user_type:
+                user.type = user_type
+                needs_update = True
+            if ctfd_team and user.team_id != ctfd_team.id:
+                user.team_id = ctfd_team.id
+                needs_update = True
+            if needs_update:
+                db.session.commit()
+
+        if is_team_captain and ctfd_team and ctfd_team.captain_id != user.id:
+            ctfd_team.captain_id = user.id
+            db.session.commit()
+
+        login_user(user)
+        return jsonify({'success': True, 'data': {'id': user.id}})
+
+    app.add_url_rule('/bench/sso-legacy', 'bench_sso_legacy', sso_legacy, methods=['POST'])
+
+
+def run_scenarios(app, counter, mode, route):
+    """Mesurer les quatre cas sur `route`; équipes et emails propres au mode"""
+    team_a = str(uuid.uuid4())
+    team_b = str(uuid.uuid4())
+    captain_id = str(uuid.uuid4())
+    create_team(app, f'Bench A {mode}', team_a, captain_id=captain_id)
+    create_team(app, f'Bench B {mode}', team_b)
+
+    scenarios = [
+        ('nouvel utilisateur sans équipe', f'solo-{mode}@bench.local', None, None),
+        ('nouvel utilisateur capitaine', f'captain-{mode}@bench.local', captain_id, team_a),
+        ('login répété sans changement', f'captain-{mode}@bench.local', captain_id, team_a),
+        ("changement d'équipe", f'captain-{mode}@bench.local', captain_id, team_b),
+    ]
+
+    results = []
+    for index, (label, email, user_id, team_id) in enumerate(scenarios):
+        # exp distinct par scénario: le login répété présente un nouveau token (comme après
+        # une reconnexion sur le site) et mesure l'upsert, pas le cache des tokens vérifiés
+        token = mint_token(email, user_id=user_id, team_id=team_id, expires_in=3600 + index)
+        # Nouveau client: pas de session existante
+        client = app.test_client()
+
+        counter.reset()
+        start = time.perf_counter()
+        response = client.post(route, json={'token': token, 'email': email})
+        elapsed = (time.perf_counter() - start) * 1000
+        results.append((label, response.status_code, counter.queries, counter.commits, elapsed))
+
+    return results
+
+
+def main():
+    """Fonction principale"""
+    app = create_test_app(os.getenv('BENCH_DATABASE_URL', 'sqlite://'))
+    legacy_sso_login(app)
+
+    with app.app_context():
+        from CTFd.models import db
+        counter = QueryCounter(db.engine)
+
+    before = run_scenarios(app, counter, 'avant', '/bench/sso-legacy')
+    after = run_scenarios(app, counter, 'apres', '/sso/authenticate')
+
+    print("=" * 78)
+    print("LOGIN SSO - requêtes SQL et commits par login, avant / après l'upsert")
+    print("=" * 78)
+    print(f"  {'scénario':<32}{'statut':>9}{'requêtes':>11}{'commits':>10}{'ms':>14}")
+
+    for (label, status_a, queries_a, commits_a, ms_a), (_, status_b, queries_b, commits_b, ms_b) in zip(before, after):
+        print(f"  {label:<32}{f'{status_a}/{status_b}':>9}{f'{queries_a} -> {queries_b}':>11}"
+              f"{f'{commits_a} -> {commits_b}':>10}{f'{ms_a:.1f} -> {ms_b:.1f}':>14}")
+
+    print("=" * 78 + "\n")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Test de charge du login SSO (/sso/authenticate)
+Démarre un faux site d'inscription, une application CTFd de test (SQLite),
+synchronise les équipes puis lance des logins SSO concurrents via HTTP.
+Rapporte le débit, les latences p50/p95/p99 et les requêtes SQL par login.
+
+À lancer dans le conteneur CTFd:
+    docker compose cp scripts/. ctfd:/tmp/bench/
+    docker compose exec ctfd python /tmp/bench/bench_sso_storm.py --concurrency 50
+
+Options:
+    --teams N          équipes générées (défaut 100)
+    --members N        membres par équipe (défaut 4)
+    --concurrency N    logins simultanés (défaut 20)
+    --repeat N         nombre de logins par utilisateur (défaut 1, >1 = token réutilisé)
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+from bench_common import percentile
+from mock_registration import MockRegistrationBackend
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Test de charge du login SSO")
+    parser.add_argument('--teams', type=int, default=100)
+    parser.add_argument('--members', type=int, default=4)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--repeat', type=int, default=1)
+    parser.add_argument('--latency', type=float, default=0.0, help="latence ajoutée par le faux backend (s)")
+    return parser.parse_args()
+
+
+def main():
+    """Fonction principale"""
+    args = parse_args()
+
+    backend = MockRegistrationBackend(args.teams, args.members, latency=args.latency).start()
+
+    # Les plugins lisent leur configuration à l'import
+    os.environ['REGISTRATION_SITE_URL'] = backend.url
+    os.environ['JWT_SECRET'] = backend.jwt_secret
+
+    from bench_sso_login import create_test_app, QueryCounter
+    from werkzeug.serving import make_server
+
+    database = tempfile.NamedTemporaryFile(suffix='.db', delete=False)
+    app = create_test_app(f"sqlite:///{database.name}")
+
+    with app.app_context():
+        from CTFd.models import db
+        from CTFd.plugins.registration_sync import sync_teams_from_registration_site
+
+        # Équipes créées et correspondance remplie, comme au début de l'événement
+        start = time.perf_counter()
+        sync_teams_from_registration_site()
+        print(f"✓ Synchronisation initiale: {time.perf_counter() - start:.1f}s")
+
+        counter = QueryCounter(db.engine)
+
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/sso/authenticate"
+
+    logins = []
+    for team, member in backend.members():
+        token = backend.mint_token(member, team)
+        logins.extend([(token, member['email'])] * args.repeat)
+
+    def login(item):
+        token, email = item
+        started = time.perf_counter()
+        response = requests.post(url, json={'token': token, 'email': email}, timeout=60)
+        return time.perf_counter() - started, response.status_code
+
+    backend.calls.clear()
+    counter.reset()
+
+    print(f"→ {len(logins)} logins, concurrence {args.concurrency}...")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(login, logins))
+    wall = time.perf_counter() - start
+
+    server.shutdown()
+    backend.stop()
+    os.unlink(database.name)
+
+    latencies = sorted(latency * 1000 for latency, _ in results)
+    failures = sum(1 for _, status in results if status != 200)
+
+    print("\n" + "=" * 70)
+    print("RÉSULTATS LOGIN SSO")
+    print("=" * 70)
+    print(f"  Logins:             {len(results)} ({failures} échecs)")
+    print(f"  Débit:              {len(results) / wall:.1f} logins/s")
+    print(f"  Latence p50:        {percentile(latencies, 0.50):.1f} ms")
+    print(f"  Latence p95:        {percentile(latencies, 0.95):.1f} ms")
+    print(f"  Latence p99:        {percentile(latencies, 0.99):.1f} ms")
+    print(f"  Requêtes SQL/login: {counter.queries / len(results):.1f}")
+    print(f"  Commits/login:      {counter.commits / len(results):.2f}")
+    print(f"  Appels au backend:  {sum(backend.calls.values())} {dict(backend.calls)}")
+    print("=" * 70 + "\n")
+
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+Construction hors ligne d'une archive d'import CTFd depuis challenges/
+Tous les challenge.yml sont validés (rapport d'erreurs complet, aucune archive
+écrite en cas d'erreur), puis les tables challenges, dynamic_challenge, flags,
+hints, tags et files sont écrites en une passe avec les pièces jointes.
+L'archive se charge ensuite d'un coup via Admin > Config > Backup > Import.
+
+L'import CTFd remplace toute la base: l'archive part donc d'un export de
+l'instance cible (--base, Admin > Config > Backup > Export) dont elle garde les
+utilisateurs, équipes, pages et la configuration. Les tables qui référencent
+les anciens challenges (soumissions, solves, unlocks...) sont vidées.
+Sans export, --alembic-version donne la révision de la base cible
+(`flask db current` dans le conteneur CTFd) et l'archive ne contient que les
+challenges: son import efface le compte admin, tous les utilisateurs et
+équipes, les pages et la configuration (CTFd repart sur l'écran de setup).
+Ce mode exige donc --wipe-instance, réservé à une instance vierge.
+
+Usage: python scripts/build_ctfd_archive.py --base export.zip [-o ace-challenges.zip] [--path challenges/]
+       python scripts/build_ctfd_archive.py --alembic-version <révision> --wipe-instance [-o ace-challenges.zip]
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import shutil
+import zipfile
+import hashlib
+import argparse
+from pathlib import Path
+
+from challenge_loader import load_challenges, validate_challenges, print_errors
+
+# Tables remplacées par le contenu de challenges/
+CHALLENGE_TABLES = ('challenges', 'dynamic_challenge', 'flags', 'hints', 'tags', 'files')
+
+# Tables de l'export de base qui référencent les anciens challenges
+CLEARED_TABLES = ('submissions', 'solves', 'unlocks', 'challenge_topics', 'solutions', 'ratings')
+
+# Colonnes ajoutées par les versions récentes de CTFd: écrites seulement si
+# l'export de base montre qu'elles existent (sinon la valeur par défaut de la base)
+OPTIONAL_COLUMNS = {
+    'challenges': {'attribution': None, 'logic': 'any'},
+    'hints': {'title': None},
+    'dynamic_challenge': {'function': 'logarithmic'}
+}
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def table_json(rows):
+    """Contenu d'un fichier db/<table>.json au format des exports CTFd"""
+    return json.dumps({'count': len(rows), 'results': rows, 'meta': {}}, ensure_ascii=False)
+
+
+def file_digests(path):
+    """SHA-256 (emplacement dans l'archive) et SHA-1 (colonne sha1sum de CTFd)"""
+    sha256 = hashlib.sha256()
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            sha1.update(chunk)
+    return sha256.hexdigest(), sha1.hexdigest()
+
+
+def safe_filename(name):
+    """Nom de fichier tel que CTFd le stocke (caractères sûrs uniquement)"""
+    return re.sub(r'[^A-Za-z0-9._-]', '_', name).strip('._') or 'fichier'
+
+
+class ArchiveBuilder:
+    """Lignes des tables de challenges et pièces jointes à copier dans l'archive"""
+
+    def __init__(self, columns, first_file_id=1):
+        self.columns = columns          # {table: colonnes existantes dans la base cible}
+        self.tables = {table: [] for table in CHALLENGE_TABLES}
+        self.uploads = {}               # emplacement -> fichier local
+        self._next_file_id = first_file_id
+
+    def _optional(self, table):
+        return {
+            column: default
+            for column, default in OPTIONAL_COLUMNS.get(table, {}).items()
+            if column in self.columns.get(table, ())
+        }
+
+    def _add(self, table, row):
+        row['id'] = len(self.tables[table]) + 1 if table != 'files' else self._next_file_id
+        if table == 'files':
+            self._next_file_id += 1
+        self.tables[table].append(dict(self._optional(table), **row))
+        return row['id']
+
+    def add_challenge(self, challenge_data, base_dir):
+        challenge_type = challenge_data.get('type', 'standard')
+        challenge_id = self._add('challenges', {
+            'name': challenge_data['name'],
+            'description': challenge_data['description'],
+            'connection_info': challenge_data.get('connection_info') or None,
+            'next_id': None,
+            'max_attempts': challenge_data.get('max_attempts', 0),
+            'value': challenge_data['value'],
+            'category': challenge_data['category'],
+            'type': challenge_type,
+            'state': challenge_data.get('state', 'visible'),
+            'requirements': None
+        })
+
+        if challenge_type == 'dynamic':
+            extra = challenge_data['extra']
+            self.tables['dynamic_challenge'].append(dict(
+                self._optional('dynamic_challenge'),
+                id=challenge_id,
+                initial=extra['initial'],
+                minimum=extra['minimum'],
+                decay=extra['decay']
+            ))
+
+        for flag in challenge_data['flags']:
+            if not isinstance(flag, dict):
+                flag = {'content': flag}
+            self._add('flags', {
+                'challenge_id': challenge_id,
+                'type': flag.get('type', 'static'),
+                'content': flag['content'],
+                'data': flag.get('data')
+            })
+
+        for hint in challenge_data.get('hints') or []:
+            self._add('hints', {
+                'type': 'standard',
+                'challenge_id': challenge_id,
+                'content': hint['content'],
+                'cost': hint.get('cost', 0),
+                'requirements': None
+            })
+
+        for tag in challenge_data.get('tags') or []:
+            self._add('tags', {'challenge_id': challenge_id, 'value': tag})
+
+        for relative_path in challenge_data.get('files') or []:
+            path = os.path.join(base_dir, relative_path)
+            sha256, sha1 = file_digests(path)
+            # Emplacement dérivé du contenu: un même fichier n'est stocké qu'une fois
+            location = f"{sha256[:32]}/{safe_filename(os.path.basename(path))}"
+            self.uploads.setdefault(location, path)
+            self._add('files', {
+                'type': 'challenge',
+                'location': location,
+                'challenge_id': challenge_id,
+                'page_id': None,
+                'sha1sum': sha1
+            })
+
+        return challenge_id
+
+    def resolve_requirements(self, challenges):
+        """Prérequis: noms des challenges remplacés par leurs ID"""
+        ids = {row['name']: row['id'] for row in self.tables['challenges']}
+        for row, (_, challenge_data) in zip(self.tables['challenges'], challenges):
+            names = challenge_data.get('requirements') or []
+            if names:
+                row['requirements'] = {'prerequisites': [ids[name] for name in names]}
+
+
+def read_base(base_path):
+    """Tables de l'export de base {table: lignes}, membres de l'archive"""
+    tables = {}
+    with zipfile.ZipFile(base_path) as archive:
+        members = archive.namelist()
+        for member in members:
+            if member.startswith('db/') and member.endswith('.json'):
+                data = archive.read(member)
+                tables[member[3:-5]] = json.loads(data)['results'] if data else []
+    return tables, members
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Archive d'import CTFd construite depuis challenges/")
+    parser.add_argument('--path', type=Path, default=Path(__file__).parent.parent / 'challenges',
+                        help="dossier des challenges")
+    parser.add_argument('-o', '--output', type=Path, default=Path('ace-challenges.zip'),
+                        help="archive à écrire")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--base', type=Path, help="export CTFd de l'instance cible")
+    source.add_argument('--alembic-version',
+                        help="révision alembic de la base cible (sans export, exige --wipe-instance)")
+    parser.add_argument('--wipe-instance', action='store_true',
+                        help="avec --alembic-version: accepter que l'import efface admin, utilisateurs, "
+                             "équipes, pages et configuration de l'instance")
+    args = parser.parse_args()
+    if args.alembic_version and not args.wipe_instance:
+        parser.error("--alembic-version produit une archive sans utilisateurs ni configuration: "
+                     "son import efface toute l'instance (admin compris). Utilisez --base export.zip, "
+                     "ou ajoutez --wipe-instance pour une instance vierge")
+    return args
+
+
+def main():
+    """Fonction principale"""
+    args = parse_args()
+    start = time.perf_counter()
+
+    if not args.path.exists():
+        print(f"Erreur: Le dossier {args.path} n'existe pas")
+        sys.exit(1)
+
+    # Validation complète avant d'écrire quoi que ce soit
+    challenges, errors = load_challenges(args.path)
+    errors.update(validate_challenges(challenges))
+    if errors:
+        print(f"✗ {len(errors)} challenge(s) invalide(s), archive non écrite:\n")
+        print_errors(errors)
+        sys.exit(1)
+
+    if not challenges:
+        print("Aucun challenge trouvé")
+        sys.exit(0)
+
+    base_tables, base_members = read_base(args.base) if args.base else ({}, [])
+    if args.base and 'alembic_version' not in base_tables:
+        print(f"Erreur: {args.base} n'est pas un export CTFd (db/alembic_version.json manquant)")
+        sys.exit(1)
+
+    # Fichiers de pages gardés: les pièces jointes des challenges sont numérotées après
+    kept_files = [row for row in base_tables.get('files', []) if row.get('type') != 'challenge']
+    columns = {table: set().union(*rows) if rows else set() for table, rows in base_tables.items()}
+    builder = ArchiveBuilder(columns, first_file_id=max((row['id'] for row in kept_files), default=0) + 1)
+
+    for challenge_file, challenge_data in challenges:
+        builder.add_challenge(challenge_data, os.path.dirname(challenge_file))
+    builder.resolve_requirements(challenges)
+
+    tables = dict(base_tables)
+    tables.update(builder.tables)
+    tables['files'] = kept_files + builder.tables['files']
+    cleared = [table for table in CLEARED_TABLES if tables.get(table)]
+    for table in cleared:
+        tables[table] = []
+    # Commentaires admin: seuls ceux des anciens challenges sont retirés
+    if any(row.get('type') == 'challenge' for row in tables.get('comments', [])):
+        tables['comments'] = [row for row in tables['comments'] if row.get('type') != 'challenge']
+        cleared.append('comments (challenges)')
+    if not args.base:
+        tables['alembic_version'] = [{'version_num': args.alembic_version}]
+
+    kept_uploads = {f"uploads/{row['location']}" for row in kept_files}
+    tmp_path = args.output.with_name(args.output.name + '.tmp')
+
+    with zipfile.ZipFile(tmp_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+        for table, rows in sorted(tables.items()):
+            archive.writestr(f"db/{table}.json", table_json(rows))
+
+        # Uploads de l'export (pages) recopiés tels quels, par morceaux
+        if args.base:
+            with zipfile.ZipFile(args.base) as base:
+                for member in base_members:
+                    if member in kept_uploads:
+                        with base.open(member) as src, archive.open(member, 'w') as dst:
+                            shutil.copyfileobj(src, dst, CHUNK_SIZE)
+
+        # Pièces jointes lues depuis le disque par morceaux, sans recompression
+        for location, path in sorted(builder.uploads.items()):
+            archive.write(path, f"uploads/{location}", compress_type=zipfile.ZIP_STORED)
+
+    os.replace(tmp_path, args.output)
+
+    elapsed = time.perf_counter() - start
+    counts = {table: len(rows) for table, rows in builder.tables.items()}
+
+    print(f"\n{'='*60}")
+    print(f"✓ Archive écrite: {args.output} ({args.output.stat().st_size / 1e6:.1f} Mo)")
+    print(f"  {counts['challenges']} challenges, {counts['flags']} flags, {counts['hints']} hints, "
+          f"{counts['tags']} tags, {counts['files']} pièces jointes ({len(builder.uploads)} fichiers distincts)")
+    if cleared:
+        print(f"  Tables vidées (anciens challenges): {', '.join(cleared)}")
+    print(f"Durée: {elapsed:.1f}s")
+    print(f"{'='*60}\n")
+    print("Import: CTFd > Admin > Config > Backup > Import (remplace la base de l'instance)")
+    if not args.base:
+        print("⚠ Archive sans export de base: l'import efface admin, utilisateurs, équipes et "
+              "configuration (retour à l'écran de setup)")
+
+
+if __name__ == '__main__':
+    main()
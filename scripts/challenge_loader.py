@@ -0,0 +1,359 @@
+#!/usr/bin/env python3
+"""
+Découverte, lecture et validation des challenges (challenges/**/challenge.yml)
+Partagé par import_challenges.py et build_ctfd_archive.py: toutes les erreurs
+de schéma sont rassemblées avant le moindre appel à CTFd.
+
+Les YAML sont lus avec le loader C de PyYAML s'il est disponible, en parallèle
+(processus) quand il y en a beaucoup, et gardés en cache JSON (clé: chemin,
+mtime, taille): seuls les fichiers modifiés sont relus.
+
+Lancé directement, vérifie tout l'arbre (CI, avant un import):
+Usage: python scripts/challenge_loader.py [--path challenges/] [--workers N] [--no-cache]
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+
+import yaml
+
+try:
+    from yaml import CSafeLoader as SafeLoader
+except ImportError:
+    from yaml import SafeLoader
+
+CACHE_FILENAME = '.challenge_cache.json'
+CACHE_VERSION = 2
+
+# En dessous, lecture en série: le démarrage du pool coûte plus que le parsing
+PARALLEL_THRESHOLD = 16
+
+CHALLENGE_TYPES = ('standard', 'dynamic')
+CHALLENGE_STATES = ('visible', 'hidden')
+FLAG_TYPES = ('static', 'regex')
+DYNAMIC_FIELDS = ('initial', 'decay', 'minimum')
+HEALTH_SCHEMES = ('http://', 'https://', 'tcp://')
+INSTANCE_PROTOCOLS = ('http', 'tcp')
+
+
+def find_challenge_files(base_path):
+    """
+    Trouver tous les fichiers challenge.yml
+    Les dossiers cachés et le contenu d'un dossier de challenge (sources,
+    déploiement, pièces jointes) ne sont pas parcourus.
+    """
+    challenge_files = []
+    pending = [str(base_path)]
+
+    while pending:
+        directory = pending.pop()
+        try:
+            entries = list(os.scandir(directory))
+        except OSError:
+            continue
+
+        subdirs = []
+        for entry in entries:
+            if entry.name == 'challenge.yml' and entry.is_file():
+                challenge_files.append(entry.path)
+                subdirs = None
+                break
+            if entry.is_dir(follow_symlinks=False) and not entry.name.startswith('.'):
+                subdirs.append(entry.path)
+
+        if subdirs:
+            pending.extend(subdirs)
+
+    return sorted(challenge_files)
+
+
+def load_challenge_yaml(yaml_path):
+    """Charger un fichier challenge.yml"""
+    with open(yaml_path, 'r', encoding='utf-8') as f:
+        return yaml.load(f, Loader=SafeLoader)
+
+
+def _parse(yaml_path):
+    """Lire un fichier (dans un worker): (données, erreur)"""
+    try:
+        return load_challenge_yaml(yaml_path), None
+    except (OSError, yaml.YAMLError) as e:
+        return None, str(e)
+
+
+def _parse_all(paths, workers=None):
+    if len(paths) < PARALLEL_THRESHOLD or workers == 1:
+        return [_parse(path) for path in paths]
+
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(_parse, paths, chunksize=max(1, len(paths) // (workers * 4))))
+
+
+def _read_cache(cache_path):
+    """Cache JSON: données seules, rien n'y est exécuté (un fichier déposé dans l'arbre est sans risque)"""
+    try:
+        with open(cache_path, encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    if not isinstance(cache, dict) or cache.get('version') != CACHE_VERSION:
+        return {}
+    files = cache.get('files')
+    if not isinstance(files, dict):
+        return {}
+    return {
+        path: (tuple(entry[0]), entry[1]) for path, entry in files.items()
+        if isinstance(entry, list) and len(entry) == 2 and isinstance(entry[0], list)
+    }
+
+
+def _cacheable(data):
+    """Données YAML que JSON restitue à l'identique (pas de dates, clés texte seulement)"""
+    try:
+        return json.loads(json.dumps(data)) == data
+    except (TypeError, ValueError):
+        return False
+
+
+def _write_cache(cache_path, files):
+    tmp_path = f"{cache_path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'version': CACHE_VERSION, 'files': files}, f, ensure_ascii=False, separators=(',', ':'))
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        # Arbre en lecture seule (CI): le cache est une optimisation, pas une obligation
+        pass
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def validate_challenge(challenge_data, base_dir):
+    """Vérifier le schéma d'un challenge; retourne la liste des erreurs"""
+    if not isinstance(challenge_data, dict):
+        return ["le fichier doit contenir un dictionnaire"]
+
+    errors = []
+
+    for field in ('name', 'category', 'description'):
+        if not isinstance(challenge_data.get(field), str) or not challenge_data[field].strip():
+            errors.append(f"`{field}` manquant ou vide")
+
+    value = challenge_data.get('value')
+    if not _is_int(value) or value < 0:
+        errors.append("`value` doit être un entier positif")
+
+    challenge_type = challenge_data.get('type', 'standard')
+    if challenge_type not in CHALLENGE_TYPES:
+        errors.append(f"`type` inconnu: {challenge_type} (attendu: {', '.join(CHALLENGE_TYPES)})")
+    elif challenge_type == 'dynamic':
+        extra = challenge_data.get('extra') or {}
+        for field in DYNAMIC_FIELDS:
+            if not _is_int(extra.get(field)):
+                errors.append(f"`extra.{field}` requis (entier) pour un challenge dynamic")
+
+    state = challenge_data.get('state', 'visible')
+    if state not in CHALLENGE_STATES:
+        errors.append(f"`state` inconnu: {state} (attendu: {', '.join(CHALLENGE_STATES)})")
+
+    flags = challenge_data.get('flags')
+    if not isinstance(flags, list) or not flags:
+        errors.append("`flags` doit être une liste non vide")
+    else:
+        for index, flag in enumerate(flags):
+            if isinstance(flag, dict):
+                if not isinstance(flag.get('content'), str) or not flag['content']:
+                    errors.append(f"flags[{index}]: `content` manquant")
+                if flag.get('type', 'static') not in FLAG_TYPES:
+                    errors.append(f"flags[{index}]: `type` inconnu: {flag.get('type')}")
+            elif not isinstance(flag, str) or not flag:
+                errors.append(f"flags[{index}] doit être une chaîne non vide")
+
+    for index, hint in enumerate(challenge_data.get('hints') or []):
+        if not isinstance(hint, dict) or not isinstance(hint.get('content'), str):
+            errors.append(f"hints[{index}]: `content` manquant")
+        elif not _is_int(hint.get('cost', 0)) or hint.get('cost', 0) < 0:
+            errors.append(f"hints[{index}]: `cost` doit être un entier positif")
+
+    for index, tag in enumerate(challenge_data.get('tags') or []):
+        if not isinstance(tag, str) or not tag:
+            errors.append(f"tags[{index}] doit être une chaîne non vide")
+
+    for index, relative_path in enumerate(challenge_data.get('files') or []):
+        if not isinstance(relative_path, str):
+            errors.append(f"files[{index}] doit être un chemin")
+        elif not os.path.isfile(os.path.join(base_dir, relative_path)):
+            errors.append(f"files[{index}]: fichier introuvable: {relative_path}")
+
+    requirements = challenge_data.get('requirements') or []
+    if not isinstance(requirements, list) or not all(isinstance(name, str) for name in requirements):
+        errors.append("`requirements` doit être une liste de noms de challenges")
+
+    # Adresse interne sondée par le plugin challenge_health
+    health_url = challenge_data.get('health_url')
+    if health_url is not None and (not isinstance(health_url, str) or not health_url.startswith(HEALTH_SCHEMES)):
+        errors.append(f"`health_url` doit commencer par {', '.join(HEALTH_SCHEMES)}")
+
+    # Instances par équipe (plugin challenge_instances)
+    instance = challenge_data.get('instance')
+    if instance is not None:
+        if not isinstance(instance, dict) or not isinstance(instance.get('image'), str) or not instance['image']:
+            errors.append("`instance.image` requis")
+        else:
+            if not _is_int(instance.get('port', 80)) or not 0 < instance.get('port', 80) < 65536:
+                errors.append("`instance.port` doit être un port TCP")
+            if instance.get('protocol', 'http') not in INSTANCE_PROTOCOLS:
+                errors.append(f"`instance.protocol` inconnu (attendu: {', '.join(INSTANCE_PROTOCOLS)})")
+            if not _is_int(instance.get('warm', 1)) or instance.get('warm', 1) < 0:
+                errors.append("`instance.warm` doit être un entier positif")
+
+    return errors
+
+
+def validate_challenges(challenges):
+    """
+    Valider tous les challenges [(fichier, données)] et leurs relations
+    (noms et `id` uniques, prérequis existants); retourne {fichier: [erreurs]}
+    """
+    report = {}
+    names = {}
+    keys = {}
+
+    for challenge_file, challenge_data in challenges:
+        errors = validate_challenge(challenge_data, os.path.dirname(challenge_file))
+        if not isinstance(challenge_data, dict):
+            report[challenge_file] = errors
+            continue
+
+        name = challenge_data.get('name')
+        if isinstance(name, str):
+            if name in names:
+                errors.append(f"nom déjà utilisé par {names[name]}")
+            else:
+                names[name] = challenge_file
+
+        key = challenge_data.get('id')
+        if isinstance(key, (str, int)):
+            if key in keys:
+                errors.append(f"`id` {key} déjà utilisé par {keys[key]}")
+            else:
+                keys[key] = challenge_file
+
+        if errors:
+            report[challenge_file] = errors
+
+    for challenge_file, challenge_data in challenges:
+        if challenge_file in report:
+            continue
+        # Noms connus: y compris ceux des challenges invalides, pour ne pas doubler les erreurs
+        missing = [name for name in challenge_data.get('requirements') or [] if name not in names]
+        if missing:
+            report[challenge_file] = [f"prérequis inconnus: {', '.join(missing)}"]
+
+    return report
+
+
+def load_challenges(base_path, cache=True, workers=None, stats=None):
+    """
+    Trouver et lire tous les challenges
+    cache: relire seulement les fichiers modifiés depuis le dernier appel
+    (cache dans <base_path>/.challenge_cache.json); stats: dict complété avec
+    le nombre de fichiers lus et repris du cache
+    Retourne ([(fichier, données)] lisibles, {fichier: [erreurs]} de lecture)
+    """
+    cache_path = os.path.join(base_path, CACHE_FILENAME) if cache else None
+    cached = _read_cache(cache_path) if cache_path else {}
+
+    results = {}
+    misses = []
+    challenge_files = find_challenge_files(base_path)
+
+    for challenge_file in challenge_files:
+        try:
+            stat = os.stat(challenge_file)
+        except OSError as e:
+            results[challenge_file] = (None, str(e))
+            continue
+
+        key = (stat.st_mtime_ns, stat.st_size)
+        entry = cached.get(challenge_file)
+        if entry is not None and entry[0] == key:
+            results[challenge_file] = (entry[1], None)
+        else:
+            misses.append((challenge_file, key))
+
+    parsed = _parse_all([challenge_file for challenge_file, _ in misses], workers)
+    for (challenge_file, key), (data, error) in zip(misses, parsed):
+        results[challenge_file] = (data, error)
+        if error is None and _cacheable(data):
+            cached[challenge_file] = (key, data)
+
+    if cache_path and (misses or len(cached) != len(challenge_files)):
+        _write_cache(cache_path, {path: cached[path] for path in challenge_files if path in cached})
+
+    if stats is not None:
+        stats['parsed'] = len(misses)
+        stats['cached'] = len(challenge_files) - len(misses)
+
+    challenges = []
+    errors = {}
+    for challenge_file in challenge_files:
+        data, error = results[challenge_file]
+        if error is None:
+            challenges.append((challenge_file, data))
+        else:
+            errors[challenge_file] = [error]
+
+    return challenges, errors
+
+
+def print_errors(errors):
+    """Rapport d'erreurs regroupé par fichier"""
+    for challenge_file, messages in sorted(errors.items()):
+        print(f"✗ {challenge_file}")
+        for message in messages:
+            print(f"    - {message}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Vérification des challenge.yml")
+    parser.add_argument('--path', type=Path, default=Path(__file__).parent.parent / 'challenges',
+                        help="dossier des challenges")
+    parser.add_argument('--workers', type=int, default=None, help="processus de lecture (défaut: nombre de CPU)")
+    parser.add_argument('--no-cache', action='store_true', help="relire tous les fichiers")
+    return parser.parse_args()
+
+
+def main():
+    """Fonction principale"""
+    args = parse_args()
+
+    if not args.path.exists():
+        print(f"Erreur: Le dossier {args.path} n'existe pas")
+        sys.exit(1)
+
+    start = time.perf_counter()
+    stats = {}
+    challenges, errors = load_challenges(args.path, cache=not args.no_cache, workers=args.workers, stats=stats)
+    errors.update(validate_challenges(challenges))
+    elapsed = time.perf_counter() - start
+
+    if errors:
+        print_errors(errors)
+        print(f"\n✗ {len(errors)} challenge(s) invalide(s) sur {stats['parsed'] + stats['cached']}")
+        sys.exit(1)
+
+    print(f"✓ {len(challenges)} challenges valides ({stats['cached']} depuis le cache, "
+          f"{stats['parsed']} lus) en {elapsed * 1000:.0f} ms")
+
+
+if __name__ == '__main__':
+    main()
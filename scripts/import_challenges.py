@@ -1,187 +1,802 @@
 #!/usr/bin/env python3
-
-
+"""
+Import des challenges (challenges/**/challenge.yml) dans CTFd via l'API
+Tous les fichiers sont lus d'abord, puis les challenges sont créés par un pool
+de workers sur une session HTTP partagée (connexions réutilisées); les flags,
+hints et tags d'un challenge sont créés en parallèle dès que son ID est connu.
+
+Mode --sync: les challenges existants sont listés en un seul appel et
+rapprochés par `id` (clé stable optionnelle du YAML) ou par nom. L'empreinte
+SHA-256 du contenu normalisé (challenge, flags, hints, tags) est comparée à
+celle du fichier d'état local: un challenge inchangé ne coûte aucune requête,
+sinon seuls le PATCH du challenge et les POST/DELETE des flags/hints/tags
+modifiés sont envoyés. --prune supprime de CTFd les challenges synchronisés
+dont le YAML a disparu.
+
+Pièces jointes (`files:` du YAML, chemins relatifs au challenge.yml): envoyées
+en multipart lu au fil de l'envoi (jamais chargées en mémoire), en parallèle
+(--upload-workers), avec une progression. Elles sont identifiées par leur
+SHA-256: en --sync, un fichier déjà présent sur CTFd n'est pas renvoyé.
+
+Prérequis (`requirements:`, noms de challenges): une fois tous les challenges
+créés, les noms sont résolus en IDs et envoyés par un PATCH du challenge; en
+--sync, seulement si les IDs résolus diffèrent de ceux déjà envoyés.
+
+Usage: CTFD_TOKEN=... python scripts/import_challenges.py [--workers 8] [--path challenges/]
+       CTFD_TOKEN=... python scripts/import_challenges.py --sync [--prune] [--state fichier.json]
+"""
+
+import io
 import os
 import sys
-import yaml
-import requests
+import json
+import time
+import uuid
+import hashlib
+import argparse
+import threading
 from pathlib import Path
+from collections import namedtuple
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from challenge_loader import DYNAMIC_FIELDS, load_challenges, validate_challenges, print_errors
 
 # Configuration CTFd
 CTFD_URL = os.getenv('CTFD_URL', 'http://localhost:8000')
 CTFD_TOKEN = os.getenv('CTFD_TOKEN', '')  # Admin API token
 
-# Headers pour l'API
-HEADERS = {
-    'Authorization': f'Token {CTFD_TOKEN}',
-    'Content-Type': 'application/json'
+DEFAULT_WORKERS = 8
+DEFAULT_UPLOAD_WORKERS = 4
+CHUNK_SIZE = 1024 * 1024
+STATE_VERSION = 1
+STATE_FILENAME = '.sync_state.json'
+
+# Champs comparés pour les flags, hints et tags (ceux envoyés à l'API)
+CHILD_FIELDS = {
+    'flags': ('content', 'type', 'data'),
+    'hints': ('content', 'cost'),
+    'tags': ('value',),
+    'files': ('name', 'sha256')
 }
 
+# Pools de threads: requêtes filles (flags, hints, tags) et envois de fichiers
+Pools = namedtuple('Pools', 'children uploads')
+
+# Empreintes des pièces jointes {chemin: {size, mtime_ns, sha256, sha1}}, gardées dans l'état de --sync
+file_hashes = {}
+
+
+def hash_file(path):
+    """SHA-256 (clé) et SHA-1 (comparé à CTFd) d'un fichier, recalculés seulement si taille ou mtime changent"""
+    stat = os.stat(path)
+    key = os.path.abspath(path)
+    cached = file_hashes.get(key)
+    if cached and cached['size'] == stat.st_size and cached['mtime_ns'] == stat.st_mtime_ns:
+        return cached
+
+    sha256 = hashlib.sha256()
+    sha1 = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            sha256.update(chunk)
+            sha1.update(chunk)
+
+    entry = {
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha256': sha256.hexdigest(),
+        'sha1': sha1.hexdigest()
+    }
+    file_hashes[key] = entry
+    return entry
+
+
+class UploadProgress:
+    """Octets et fichiers envoyés, affichés sur une ligne de stderr (terminal uniquement)"""
+
+    def __init__(self):
+        self.total_bytes = 0
+        self.sent_bytes = 0
+        self.total_files = 0
+        self.finished_files = 0
+        self.sent_files = 0
+        self.skipped_files = 0
+        self._shown_at = 0
+        self._lock = threading.Lock()
+
+    def add(self, size):
+        with self._lock:
+            self.total_files += 1
+            self.total_bytes += size
+        self.show()
+
+    def advance(self, size):
+        with self._lock:
+            self.sent_bytes += size
+        self.show()
+
+    def skip(self, count):
+        """Pièces jointes déjà présentes sur CTFd"""
+        with self._lock:
+            self.skipped_files += count
+
+    def done(self, ok):
+        with self._lock:
+            self.finished_files += 1
+            if ok:
+                self.sent_files += 1
+        self.show(force=True)
+
+    def clear(self):
+        """Effacer la ligne de progression avant d'écrire un compte rendu"""
+        if sys.stderr.isatty() and self.total_files:
+            sys.stderr.write('\r\033[K')
+            sys.stderr.flush()
+
+    def show(self, force=False):
+        if not sys.stderr.isatty():
+            return
+        now = time.monotonic()
+        if not force and now - self._shown_at < 0.2:
+            return
+        self._shown_at = now
+        percent = 100 * self.sent_bytes / self.total_bytes if self.total_bytes else 100
+        sys.stderr.write(
+            f"\rPièces jointes: {self.finished_files}/{self.total_files} fichiers, "
+            f"{self.sent_bytes / 1e6:.1f}/{self.total_bytes / 1e6:.1f} Mo ({percent:.0f}%)   "
+        )
+        sys.stderr.flush()
+
+
+class MultipartStream:
+    """
+    Corps multipart/form-data d'un envoi de fichier, lu par morceaux pendant
+    l'envoi; la taille est connue à l'avance (Content-Length, pas de chunked)
+    """
+
+    def __init__(self, fields, path, on_read):
+        boundary = uuid.uuid4().hex
+        filename = os.path.basename(path).replace('"', '%22')
+        head = ''.join(
+            f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'
+            for name, value in fields.items()
+        )
+        head += (
+            f'--{boundary}\r\nContent-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+            f'Content-Type: application/octet-stream\r\n\r\n'
+        )
+        tail = f'\r\n--{boundary}--\r\n'
+
+        self.content_type = f'multipart/form-data; boundary={boundary}'
+        self.len = len(head.encode('utf-8')) + os.path.getsize(path) + len(tail)
+        self._parts = [io.BytesIO(head.encode('utf-8')), open(path, 'rb'), io.BytesIO(tail.encode('utf-8'))]
+        self._on_read = on_read
+
+    def read(self, size=-1):
+        chunks = []
+        while self._parts and size != 0:
+            data = self._parts[0].read(size)
+            if not data:
+                self._parts.pop(0).close()
+                continue
+            chunks.append(data)
+            if size > 0:
+                size -= len(data)
+        data = b''.join(chunks)
+        self._on_read(len(data))
+        return data
+
+    def __iter__(self):
+        return iter(lambda: self.read(CHUNK_SIZE), b'')
+
+    def __len__(self):
+        return self.len
+
+    def close(self):
+        for part in self._parts:
+            part.close()
+        self._parts = []
+
+
+class CTFdClient:
+    """Session HTTP partagée par les workers, avec comptage des requêtes"""
+
+    def __init__(self, url, token, pool_size):
+        self.url = url.rstrip('/')
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'Token {token}',
+            'Content-Type': 'application/json'
+        })
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self.requests_made = 0
+        self.progress = UploadProgress()
+        self._lock = threading.Lock()
+
+    def request(self, method, path, **kwargs):
+        with self._lock:
+            self.requests_made += 1
+        return self.session.request(method, f'{self.url}/api/v1{path}', timeout=30, **kwargs)
+
+    def post(self, path, payload):
+        return self.request('POST', path, json=payload)
+
+    def upload(self, challenge_id, path):
+        """Envoyer une pièce jointe de challenge sans la charger en mémoire"""
+        body = MultipartStream({'challenge_id': challenge_id, 'type': 'challenge'}, path, self.progress.advance)
+        ok = False
+        try:
+            response = self.request('POST', '/files', data=body, headers={'Content-Type': body.content_type})
+            ok = response.status_code in [200, 201]
+            return response
+        finally:
+            body.close()
+            self.progress.done(ok)
 
-def load_challenge_yaml(yaml_path):
-    """Charger un fichier challenge.yml"""
-    with open(yaml_path, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
-
-
-def create_challenge(challenge_data):
-    """Créer un challenge via l'API CTFd"""
-    print(f"Création du challenge: {challenge_data['name']}")
 
-    # Préparer les données pour l'API
-    payload = {
+def challenge_payload(challenge_data):
+    """Préparer les données du challenge pour l'API"""
+    return {
         'name': challenge_data['name'],
         'category': challenge_data['category'],
         'description': challenge_data['description'],
         'value': challenge_data['value'],
         'type': challenge_data.get('type', 'standard'),
         'state': challenge_data.get('state', 'visible'),
-        'connection_info': challenge_data.get('connection_info', '')
+        'connection_info': challenge_data.get('connection_info', ''),
+        # Challenges dynamic: paramètres de décroissance (extra: initial, decay, minimum)
+        **{field: challenge_data['extra'][field] for field in DYNAMIC_FIELDS
+           if challenge_data.get('type') == 'dynamic'}
     }
 
-    # Créer le challenge
-    response = requests.post(
-        f'{CTFD_URL}/api/v1/challenges',
-        json=payload,
-        headers=HEADERS
-    )
 
-    if response.status_code not in [200, 201]:
-        print(f"Erreur lors de la création: {response.text}")
-        return None
+def flag_payload(challenge_id, flag):
+    """Flag: chaîne, ou dictionnaire {content, type, data}"""
+    if not isinstance(flag, dict):
+        flag = {'content': flag}
+    payload = {
+        'challenge_id': challenge_id,
+        'content': flag['content'],
+        'type': flag.get('type', 'static')
+    }
+    if flag.get('data'):
+        payload['data'] = flag['data']
+    return payload
 
-    challenge_id = response.json()['data']['id']
-    print(f"✓ Challenge créé avec l'ID: {challenge_id}")
 
-    # Ajouter les flags
-    for flag_text in challenge_data.get('flags', []):
-        add_flag(challenge_id, flag_text)
+def hint_payload(challenge_id, hint_data):
+    return {
+        'challenge_id': challenge_id,
+        'content': hint_data['content'],
+        'cost': hint_data.get('cost', 0)
+    }
+
 
-    # Ajouter les hints
-    for hint in challenge_data.get('hints', []):
-        add_hint(challenge_id, hint)
+def tag_payload(challenge_id, tag_name):
+    return {
+        'challenge_id': challenge_id,
+        'value': tag_name
+    }
 
-    # Ajouter les tags
-    for tag in challenge_data.get('tags', []):
-        add_tag(challenge_id, tag)
 
-    return challenge_id
+def normalise(value):
+    """Normaliser un contenu avant empreinte (fins de ligne, espaces en fin de texte)"""
+    if isinstance(value, str):
+        return '\n'.join(line.rstrip() for line in value.replace('\r\n', '\n').strip().split('\n'))
+    if isinstance(value, dict):
+        return {key: normalise(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [normalise(item) for item in value]
+    return value
 
 
-def add_flag(challenge_id, flag_text):
-    """Ajouter un flag à un challenge"""
-    payload = {
-        'challenge_id': challenge_id,
-        'content': flag_text,
-        'type': 'static'
-    }
+def fingerprint(content):
+    """Empreinte SHA-256 d'un contenu JSON normalisé"""
+    encoded = json.dumps(normalise(content), sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
 
-    response = requests.post(
-        f'{CTFD_URL}/api/v1/flags',
-        json=payload,
-        headers=HEADERS
-    )
 
-    if response.status_code in [200, 201]:
-        print(f"  ✓ Flag ajouté: {flag_text}")
-    else:
-        print(f"  ✗ Erreur flag: {response.text}")
+def child_content(kind, item):
+    """Champs comparés d'un flag/hint/tag (les champs vides, comme `data` d'un flag, sont omis)"""
+    return {field: item.get(field) for field in CHILD_FIELDS[kind] if item.get(field) not in (None, '')}
 
 
-def add_hint(challenge_id, hint_data):
-    """Ajouter un hint à un challenge"""
-    payload = {
-        'challenge_id': challenge_id,
-        'content': hint_data['content'],
-        'cost': hint_data.get('cost', 0)
-    }
+def child_key(kind, content):
+    """Clé d'un flag/hint/tag: type et empreinte de ses champs"""
+    return f"{kind}:{fingerprint(content)[:16]}"
+
 
-    response = requests.post(
-        f'{CTFD_URL}/api/v1/hints',
-        json=payload,
-        headers=HEADERS
+def child_specs(challenge_data, base_dir):
+    """
+    Flags, hints, tags et pièces jointes du YAML: {clé: (type, champs, fichier local ou None)}
+    Une pièce jointe est identifiée par son nom et son SHA-256.
+    """
+    payloads = (
+        [('flags', flag_payload(None, flag)) for flag in challenge_data.get('flags', [])]
+        + [('hints', hint_payload(None, hint)) for hint in challenge_data.get('hints', [])]
+        + [('tags', tag_payload(None, tag)) for tag in challenge_data.get('tags', [])]
     )
 
-    if response.status_code in [200, 201]:
-        print(f"  ✓ Hint ajouté (coût: {hint_data.get('cost', 0)})")
-    else:
-        print(f"  ✗ Erreur hint: {response.text}")
+    specs = {}
+    for kind, payload in payloads:
+        content = child_content(kind, payload)
+        specs[child_key(kind, content)] = (kind, content, None)
+
+    for relative_path in challenge_data.get('files', []):
+        path = os.path.join(base_dir, relative_path)
+        content = {'name': os.path.basename(path), 'sha256': hash_file(path)['sha256']}
+        specs[child_key('files', content)] = ('files', content, path)
+
+    return specs
+
+
+def child_label(kind, content):
+    if kind == 'flags':
+        return f"Flag {content['content']}"
+    if kind == 'hints':
+        return f"Hint (coût: {content['cost']})"
+    if kind == 'files':
+        return f"Fichier {content['name']}"
+    return f"Tag {content['value']}"
+
+
+def created_id(response):
+    """ID de l'objet créé (POST /files retourne une liste)"""
+    data = response.json()['data']
+    return data[0]['id'] if isinstance(data, list) else data['id']
+
+
+@contextmanager
+def open_pools(workers, upload_workers):
+    """
+    Pools des requêtes filles: un worker qui attend ses flags/hints/tags ne les
+    bloque pas, et les envois de fichiers (limités par la bande passante) ont
+    leur propre limite de parallélisme
+    """
+    with ThreadPoolExecutor(max_workers=workers * 3) as children, \
+            ThreadPoolExecutor(max_workers=upload_workers) as uploads:
+        yield Pools(children, uploads)
+
+
+def challenge_key(challenge_data):
+    """Clé stable d'un challenge: `id` du YAML s'il est défini, sinon son nom"""
+    return str(challenge_data.get('id') or challenge_data['name'])
+
+
+def apply_children(client, pools, challenge_id, creates, deletes, report):
+    """
+    Créer et supprimer en parallèle des flags/hints/tags/fichiers d'un challenge
+    creates: {clé: (type, champs, fichier)}, deletes: {clé: id distant}
+    Retourne ({clé: id créé}, clés supprimées, tout a réussi)
+    """
+    futures = []
+    for key, (kind, content, path) in creates.items():
+        if kind == 'files':
+            client.progress.add(os.path.getsize(path))
+            future = pools.uploads.submit(client.upload, challenge_id, path)
+        else:
+            future = pools.children.submit(client.post, f'/{kind}', dict(content, challenge_id=challenge_id))
+        futures.append((key, child_label(kind, content), future))
+    for key, child_id in deletes.items():
+        kind = key.split(':', 1)[0]
+        path = f'/{kind}/{child_id}'
+        futures.append((key, f"Suppression {kind} #{child_id}", pools.children.submit(client.request, 'DELETE', path)))
+
+    created, removed, ok = {}, [], True
+    for key, label, future in futures:
+        try:
+            response = future.result()
+        except requests.exceptions.RequestException as e:
+            report.append(f"  ✗ {label}: {e}")
+            ok = False
+            continue
+
+        # Un élément déjà supprimé sur CTFd (404) n'est plus à supprimer
+        if response.status_code in [200, 201] or (key in deletes and response.status_code == 404):
+            report.append(f"  ✓ {label}")
+            if key in creates:
+                created[key] = created_id(response)
+            else:
+                removed.append(key)
+        else:
+            report.append(f"  ✗ {label}: {response.text}")
+            ok = False
 
+    return created, removed, ok
 
-def add_tag(challenge_id, tag_name):
-    """Ajouter un tag à un challenge"""
-    payload = {
-        'challenge_id': challenge_id,
-        'value': tag_name
+
+def create_challenge(client, pools, challenge_data, base_dir, specs=None):
+    """
+    Créer un challenge puis, en parallèle, ses flags, hints, tags et pièces jointes
+    Retourne (id du challenge ou None, lignes de compte rendu, {clé: id} des éléments créés, tout a réussi)
+    """
+    report = [f"Création du challenge: {challenge_data['name']}"]
+
+    # Pièces jointes lues avant la création: un fichier manquant n'en laisse pas la moitié
+    if specs is None:
+        specs = child_specs(challenge_data, base_dir)
+
+    response = client.post('/challenges', challenge_payload(challenge_data))
+    if response.status_code not in [200, 201]:
+        report.append(f"✗ Erreur lors de la création: {response.text}")
+        return None, report, {}, False
+
+    challenge_id = response.json()['data']['id']
+    report.append(f"✓ Challenge créé avec l'ID: {challenge_id}")
+
+    created, _, ok = apply_children(client, pools, challenge_id, specs, {}, report)
+    return challenge_id, report, created, ok
+
+
+def fetch_remote_children(client, challenge_id, specs):
+    """
+    Flags, hints, tags et fichiers existants d'un challenge: {clé: id distant}
+    Les doublons (imports répétés) reçoivent une clé propre pour être supprimés.
+    """
+    known = {}
+
+    def add(kind, key, child_id):
+        if key in known:
+            key = f"{kind}:doublon-{child_id}"
+        known[key] = child_id
+
+    for kind in CHILD_FIELDS:
+        if kind == 'files':
+            continue
+        response = client.request('GET', f'/{kind}', params={'challenge_id': challenge_id})
+        response.raise_for_status()
+        for item in response.json()['data']:
+            if item.get('challenge_id', challenge_id) != challenge_id:
+                continue
+            add(kind, child_key(kind, child_content(kind, item)), item['id'])
+
+    # CTFd ne connaît que le SHA-1 de ses fichiers: un fichier distant n'est
+    # repris que si son nom et son SHA-1 correspondent à une pièce jointe locale
+    local_files = {
+        (content['name'], hash_file(path)['sha1']): key
+        for key, (kind, content, path) in specs.items() if kind == 'files'
     }
+    response = client.request('GET', f'/challenges/{challenge_id}/files')
+    response.raise_for_status()
+    for item in response.json()['data']:
+        detail = client.request('GET', f"/files/{item['id']}")
+        detail.raise_for_status()
+        name = os.path.basename(item['location'])
+        key = local_files.get((name, detail.json()['data'].get('sha1sum')))
+        add('files', key or f"files:distant-{item['id']}", item['id'])
+
+    return known
+
+
+def sync_challenge(client, pools, challenge_data, base_dir, remote, entry):
+    """
+    Synchroniser un challenge avec son état sur CTFd
+    remote: challenge existant (liste de l'API) ou None; entry: état local précédent ou None
+    Retourne (action, nouvel état ou None, lignes de compte rendu)
+    """
+    payload = challenge_payload(challenge_data)
+    specs = child_specs(challenge_data, base_dir)
+    payload_fingerprint = fingerprint(payload)
+    content = {'challenge': payload, 'children': sorted(specs)}
+    if challenge_data.get('requirements'):
+        content['requirements'] = sorted(challenge_data['requirements'])
+    full_fingerprint = fingerprint(content)
+
+    def state(challenge_id, known, ok, challenge_fingerprint):
+        # Empreinte complète enregistrée seulement si tout a réussi: sinon réessai au prochain passage
+        return {
+            'id': challenge_id,
+            'name': challenge_data['name'],
+            'fingerprint': full_fingerprint if ok else None,
+            'challenge': challenge_fingerprint,
+            'children': known,
+            # IDs des prérequis déjà envoyés (mis à jour par apply_requirements)
+            'requirements': entry.get('requirements') if entry is not None and entry['id'] == challenge_id else None
+        }
+
+    if remote is None:
+        challenge_id, report, created, ok = create_challenge(client, pools, challenge_data, base_dir, specs)
+        if challenge_id is None:
+            return 'error', None, report
+        return 'created', state(challenge_id, created, ok, payload_fingerprint), report
+
+    challenge_id = remote['id']
+    same_challenge = entry is not None and entry['id'] == challenge_id
+    if same_challenge and entry['fingerprint'] == full_fingerprint:
+        client.progress.skip(sum(1 for spec in specs.values() if spec[0] == 'files'))
+        return 'unchanged', entry, []
+
+    report = [f"Mise à jour du challenge: {challenge_data['name']} (ID {challenge_id})"]
+
+    challenge_fingerprint = entry.get('challenge') if same_challenge else None
+    if challenge_fingerprint != payload_fingerprint:
+        response = client.request('PATCH', f'/challenges/{challenge_id}', json=payload)
+        if response.status_code not in [200, 201]:
+            report.append(f"✗ Erreur lors de la mise à jour: {response.text}")
+            return 'error', entry, report
+        report.append("✓ Challenge mis à jour")
+        challenge_fingerprint = payload_fingerprint
+
+    # Éléments connus: état local, ou lus sur CTFd pour un challenge pas encore synchronisé
+    known = dict(entry['children']) if same_challenge else fetch_remote_children(client, challenge_id, specs)
+    creates = {key: spec for key, spec in specs.items() if key not in known}
+    deletes = {key: child_id for key, child_id in known.items() if key not in specs}
+    client.progress.skip(sum(1 for key, spec in specs.items() if spec[0] == 'files' and key in known))
+
+    created, removed, ok = apply_children(client, pools, challenge_id, creates, deletes, report)
+    known.update(created)
+    for key in removed:
+        del known[key]
+
+    return 'updated', state(challenge_id, known, ok, challenge_fingerprint), report
+
+
+def apply_requirements(client, challenges, ids, previous=None):
+    """
+    Envoyer les prérequis une fois tous les challenges créés
+    ids: {nom: ID CTFd} des challenges importés; previous: {nom: IDs déjà envoyés} (--sync)
+    Retourne ({nom: IDs envoyés}, noms en échec, lignes de compte rendu)
+    """
+    previous = previous or {}
+    sent, failed, report = {}, set(), []
+
+    for _, challenge_data in challenges:
+        name = challenge_data['name']
+        if name not in ids:
+            continue
+
+        names = challenge_data.get('requirements') or []
+        missing = [required for required in names if required not in ids]
+        if missing:
+            report.append(f"✗ Prérequis de {name}: challenge(s) non importé(s) {', '.join(missing)}")
+            failed.add(name)
+            continue
+
+        prerequisites = sorted(ids[required] for required in names)
+        if prerequisites == (previous.get(name) or []):
+            sent[name] = prerequisites
+            continue
+
+        response = client.request('PATCH', f'/challenges/{ids[name]}',
+                                  json={'requirements': {'prerequisites': prerequisites}})
+        if response.status_code in [200, 201]:
+            report.append(f"✓ Prérequis de {name}: {', '.join(names) or 'aucun'}")
+            sent[name] = prerequisites
+        else:
+            report.append(f"✗ Prérequis de {name}: {response.text}")
+            failed.add(name)
+
+    return sent, failed, report
+
+
+def load_state(path, url):
+    """État de la dernière synchronisation vers `url`: {clé: état du challenge}"""
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        print(f"⚠ Fichier d'état illisible ({path}), synchronisation complète: {e}")
+        return {}
+
+    if state.get('version') != STATE_VERSION:
+        return {}
+    file_hashes.update(state.get('files', {}))
+    if state.get('url') != url:
+        return {}
+    return state.get('challenges', {})
+
+
+def save_state(path, url, challenges):
+    """Écrire l'état de synchronisation (écriture atomique)"""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump({'version': STATE_VERSION, 'url': url, 'challenges': challenges, 'files': file_hashes}, f,
+                  indent=2, sort_keys=True, ensure_ascii=False)
+    os.replace(tmp_path, path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Import des challenges dans CTFd")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="challenges créés en parallèle")
+    parser.add_argument('--path', type=Path, default=Path(__file__).parent.parent / 'challenges',
+                        help="dossier des challenges")
+    parser.add_argument('--sync', action='store_true',
+                        help="mettre à jour les challenges existants au lieu de les recréer")
+    parser.add_argument('--prune', action='store_true',
+                        help="avec --sync: supprimer les challenges synchronisés dont le YAML a disparu")
+    parser.add_argument('--state', type=Path, default=None,
+                        help=f"fichier d'état de --sync (défaut: <path>/{STATE_FILENAME})")
+    parser.add_argument('--upload-workers', type=int, default=DEFAULT_UPLOAD_WORKERS,
+                        help="pièces jointes envoyées en parallèle")
+    return parser.parse_args()
+
+
+def run_import(client, challenges, workers, upload_workers):
+    """Créer tous les challenges; retourne (réussis, erreurs)"""
+    success_count = 0
+    error_count = 0
 
-    response = requests.post(
-        f'{CTFD_URL}/api/v1/tags',
-        json=payload,
-        headers=HEADERS
-    )
+    ids = {}
 
-    if response.status_code in [200, 201]:
-        print(f"  ✓ Tag ajouté: {tag_name}")
+    with open_pools(workers, upload_workers) as pools, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (challenge_file, challenge_data, pool.submit(
+                create_challenge, client, pools, challenge_data, os.path.dirname(challenge_file)
+            ))
+            for challenge_file, challenge_data in challenges
+        ]
 
+        for challenge_file, challenge_data, future in futures:
+            try:
+                challenge_id, report, _, _ = future.result()
+            except Exception as e:
+                challenge_id, report = None, [f"✗ Erreur: {e}"]
 
-def find_challenge_files(base_path):
-    """Trouver tous les fichiers challenge.yml"""
-    challenge_files = []
+            client.progress.clear()
+            print(f"\nTraitement: {challenge_file}")
+            print('\n'.join(report))
 
-    for root, dirs, files in os.walk(base_path):
-        if 'challenge.yml' in files:
-            challenge_files.append(os.path.join(root, 'challenge.yml'))
+            if challenge_id:
+                ids[challenge_data['name']] = challenge_id
+                success_count += 1
+            else:
+                error_count += 1
 
-    return sorted(challenge_files)
+    _, failed, report = apply_requirements(client, challenges, ids)
+    if report:
+        print('\n' + '\n'.join(report))
+    error_count += len(failed)
+
+    return success_count, error_count
+
+
+def run_sync(client, challenges, workers, upload_workers, state_path, prune):
+    """Synchroniser les challenges modifiés; retourne les compteurs par action"""
+    state = load_state(state_path, client.url)
+    counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'deleted': 0, 'error': 0}
+
+    # Un seul appel pour tous les challenges existants (visibles ou non)
+    response = client.request('GET', '/challenges', params={'view': 'admin'})
+    response.raise_for_status()
+    remote_by_id = {}
+    remote_by_name = {}
+    for remote in sorted(response.json()['data'], key=lambda c: c['id']):
+        remote_by_id[remote['id']] = remote
+        remote_by_name.setdefault(remote['name'], remote)
+
+    new_state = {}
+    with open_pools(workers, upload_workers) as pools, ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = []
+        for challenge_file, challenge_data in challenges:
+            key = challenge_key(challenge_data)
+            entry = state.get(key)
+            # Rapprochement: ID déjà synchronisé (survit à un renommage), sinon nom
+            remote = remote_by_id.get(entry['id']) if entry else None
+            if remote is None:
+                remote = remote_by_name.get(challenge_data['name'])
+            futures.append((challenge_file, key, entry, pool.submit(
+                sync_challenge, client, pools, challenge_data, os.path.dirname(challenge_file), remote, entry
+            )))
+
+        for challenge_file, key, entry, future in futures:
+            try:
+                action, entry, report = future.result()
+            except Exception as e:
+                # État précédent gardé: le challenge sera réessayé
+                action, report = 'error', [f"✗ Erreur: {e}"]
+
+            counts[action] += 1
+            if entry is not None:
+                new_state[key] = entry
+            if report:
+                client.progress.clear()
+                print(f"\nTraitement: {challenge_file}")
+                print('\n'.join(report))
+
+    # Prérequis: IDs résolus après les créations, envoyés s'ils ont changé
+    keys_by_name = {challenge_data['name']: challenge_key(challenge_data)
+                    for _, challenge_data in challenges if challenge_key(challenge_data) in new_state}
+    sent, failed, report = apply_requirements(
+        client, challenges,
+        {name: new_state[key]['id'] for name, key in keys_by_name.items()},
+        {name: new_state[key].get('requirements') for name, key in keys_by_name.items()}
+    )
+    if report:
+        print('\n' + '\n'.join(report))
+    for name, prerequisites in sent.items():
+        new_state[keys_by_name[name]] = dict(new_state[keys_by_name[name]], requirements=prerequisites)
+    for name in failed:
+        # Réessai au prochain passage
+        new_state[keys_by_name[name]] = dict(new_state[keys_by_name[name]], fingerprint=None)
+        counts['error'] += 1
+
+    # Challenges synchronisés dont le YAML a disparu
+    keys = {challenge_key(challenge_data) for _, challenge_data in challenges}
+    for key, entry in state.items():
+        if key in keys or entry['id'] not in remote_by_id:
+            continue
+        if not prune:
+            new_state[key] = entry
+            continue
+
+        response = client.request('DELETE', f"/challenges/{entry['id']}")
+        if response.status_code in [200, 404]:
+            print(f"\n✓ Challenge supprimé: {entry['name']} (ID {entry['id']})")
+            counts['deleted'] += 1
+        else:
+            print(f"\n✗ Suppression de {entry['name']} échouée: {response.text}")
+            new_state[key] = entry
+            counts['error'] += 1
+
+    save_state(state_path, client.url, new_state)
+    return counts
 
 
 def main():
     """Fonction principale"""
+    args = parse_args()
+
     if not CTFD_TOKEN:
         print("Erreur: CTFD_TOKEN non défini")
         print("Obtenez un token admin depuis CTFd > Settings > Access Tokens")
         sys.exit(1)
 
     # Chemin de base des challenges
-    base_path = Path(__file__).parent.parent / 'challenges'
+    base_path = args.path
 
     if not base_path.exists():
         print(f"Erreur: Le dossier {base_path} n'existe pas")
         sys.exit(1)
 
-    # Trouver tous les challenges
-    challenge_files = find_challenge_files(base_path)
+    # Lire et valider tous les challenges avant le premier appel à l'API
+    challenges, errors = load_challenges(base_path)
+    errors.update(validate_challenges(challenges))
 
-    if not challenge_files:
+    if errors:
+        print(f"✗ {len(errors)} challenge(s) invalide(s), aucun appel à l'API:\n")
+        print_errors(errors)
+        sys.exit(1)
+
+    if not challenges:
         print("Aucun challenge trouvé")
         sys.exit(0)
 
+    mode = "Synchronisation" if args.sync else "Importation"
     print(f"\n{'='*60}")
-    print(f"Importation de {len(challenge_files)} challenges")
+    print(f"{mode} de {len(challenges)} challenges ({args.workers} workers)")
     print(f"{'='*60}\n")
 
-    success_count = 0
-    error_count = 0
+    client = CTFdClient(CTFD_URL, CTFD_TOKEN, pool_size=args.workers * 4)
+    start = time.perf_counter()
 
-    for challenge_file in challenge_files:
-        try:
-            print(f"\nTraitement: {challenge_file}")
-            challenge_data = load_challenge_yaml(challenge_file)
-
-            challenge_id = create_challenge(challenge_data)
-
-            if challenge_id:
-                success_count += 1
-            else:
-                error_count += 1
+    if args.sync:
+        counts = run_sync(client, challenges, args.workers, args.upload_workers,
+                          args.state or base_path / STATE_FILENAME, args.prune)
+        summary = (f"Résultat: {counts['created']} créés, {counts['updated']} mis à jour, "
+                   f"{counts['unchanged']} inchangés, {counts['deleted']} supprimés, "
+                   f"{counts['error']} erreurs")
+    else:
+        success_count, error_count = run_import(client, challenges, args.workers, args.upload_workers)
+        summary = f"Résultat: {success_count} réussis, {error_count} erreurs"
 
-        except Exception as e:
-            print(f"✗ Erreur: {e}")
-            error_count += 1
+    elapsed = time.perf_counter() - start
+    progress = client.progress
+    progress.clear()
 
     print(f"\n{'='*60}")
-    print(f"Résultat: {success_count} réussis, {error_count} erreurs")
+    print(summary)
+    if progress.total_files or progress.skipped_files:
+        print(f"Pièces jointes: {progress.sent_files} envoyées ({progress.sent_bytes / 1e6:.1f} Mo), "
+              f"{progress.skipped_files} déjà présentes")
+    print(f"Durée: {elapsed:.1f}s, {client.requests_made} requêtes API")
     print(f"{'='*60}\n")
 
 
@@ -0,0 +1,281 @@
+#!/usr/bin/env python3
+"""
+Faux backend du site d'inscription pour les benchmarks
+Implémente les routes utilisées par les plugins (/auth/login, /admin/teams
+avec ?updatedSince, /admin/teams/<id>, /admin/users/<id>,
+/admin/ctfd/sync-scores) sur un serveur HTTP local, avec des équipes générées
+et un compteur d'appels par route. churn() modifie une partie des équipes comme
+pendant les inscriptions et retourne les webhooks correspondants.
+
+Usage autonome: python scripts/mock_registration.py [port] [equipes] [membres]
+"""
+
+import re
+import sys
+import json
+import time
+import uuid
+import threading
+from datetime import datetime, timezone
+from collections import Counter
+from urllib.parse import urlparse, parse_qs
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import jwt
+
+ADMIN_EMAIL = 'admin@ace-escapegame.com'
+
+
+def now_iso():
+    """Horodatage ISO 8601 UTC, comme updatedAt du site"""
+    return datetime.now(timezone.utc).isoformat(timespec='milliseconds').replace('+00:00', 'Z')
+
+
+def generate_member(team_index, member_index):
+    return {
+        'id': str(uuid.uuid4()),
+        'email': f"team{team_index}.member{member_index}@bench.local",
+        'firstName': f"Membre {member_index}",
+        'lastName': f"Équipe {team_index}"
+    }
+
+
+def generate_teams(team_count, members_per_team, first_index=1):
+    """Générer des équipes au format de /admin/teams"""
+    teams = []
+    for team_index in range(first_index, first_index + team_count):
+        members = [generate_member(team_index, member_index) for member_index in range(1, members_per_team + 1)]
+        teams.append({
+            'id': str(uuid.uuid4()),
+            'name': f"Équipe {team_index}",
+            'inviteCode': uuid.uuid4().hex[:8].upper(),
+            'captainId': members[0]['id'] if members else None,
+            'members': members,
+            'memberCount': len(members),
+            'roomNumber': str((team_index - 1) % 10 + 1),
+            'ctfdTeamId': None,
+            'updatedAt': now_iso()
+        })
+    return teams
+
+
+class MockRegistrationBackend:
+    """Serveur local imitant l'API du site d'inscription"""
+
+    def __init__(self, team_count=50, members_per_team=4, jwt_secret='bench-jwt-secret', port=0, latency=0.0):
+        self.jwt_secret = jwt_secret
+        self.latency = latency
+        self.members_per_team = members_per_team
+        self.teams = generate_teams(team_count, members_per_team)
+        self.former_members = {}    # membres retirés par churn(), encore visibles sur /admin/users/<id>
+        self._next_member = members_per_team + 1
+        self.calls = Counter()
+        self.scores_received = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_port}/api"
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='mock-registration', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def members(self):
+        """Itérer sur (équipe, membre)"""
+        for team in self.teams:
+            for member in team['members']:
+                yield team, member
+
+    def mint_token(self, member, team=None, is_admin=False, expires_in=3600):
+        """JWT HS256 identique à celui du site d'inscription"""
+        return jwt.encode(
+            {
+                'id': member['id'],
+                'email': member['email'],
+                'isAdmin': is_admin,
+                'teamId': team['id'] if team else None,
+                'exp': int(time.time()) + expires_in
+            },
+            self.jwt_secret,
+            algorithm='HS256'
+        )
+
+    def churn(self, fraction, rng):
+        """
+        Modifier `fraction` des équipes (membre ajouté ou retiré, changement de
+        salle) et créer une équipe pour dix modifiées, comme pendant les
+        inscriptions; retourne les webhooks envoyés par le site [{event, data}]
+        """
+        events = []
+        count = min(len(self.teams), max(1, round(fraction * len(self.teams))))
+
+        with self._lock:
+            for team in rng.sample(self.teams, count):
+                team_index = int(team['name'].rsplit(' ', 1)[-1])
+                action = rng.choice(('member_added', 'member_removed', 'room'))
+
+                if action == 'member_removed' and len(team['members']) > 1:
+                    # Le capitaine (premier membre) reste
+                    member = team['members'].pop()
+                    self.former_members[member['id']] = member
+                    events.append({'event': 'team.member_removed', 'data': {'teamId': team['id'], 'userId': member['id']}})
+                elif action == 'room':
+                    team['roomNumber'] = str(rng.randint(1, 10))
+                    events.append({'event': 'team.updated', 'data': {'teamId': team['id']}})
+                else:
+                    member = generate_member(team_index, self._next_member)
+                    self._next_member += 1
+                    team['members'].append(member)
+                    events.append({'event': 'team.member_added', 'data': {'teamId': team['id'], 'userId': member['id']}})
+
+                team['memberCount'] = len(team['members'])
+                team['updatedAt'] = now_iso()
+
+            first_index = max(int(team['name'].rsplit(' ', 1)[-1]) for team in self.teams) + 1
+            for team in generate_teams(max(1, count // 10), self.members_per_team, first_index):
+                self.teams.append(team)
+                events.append({'event': 'team.created', 'data': {'teamId': team['id']}})
+
+        return events
+
+    def find_team(self, team_id):
+        for team in self.teams:
+            if team['id'] == team_id:
+                return team
+        return None
+
+    def find_user(self, user_id):
+        for team, member in self.members():
+            if member['id'] == user_id:
+                return dict(member, teamId=team['id'])
+        if user_id in self.former_members:
+            return dict(self.former_members[user_id], teamId=None)
+        return None
+
+    def _handler_class(self):
+        backend = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, format, *args):
+                pass
+
+            def _send(self, status, payload):
+                body = json.dumps(payload).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def _body(self):
+                length = int(self.headers.get('Content-Length') or 0)
+                return self.rfile.read(length) if length else b''
+
+            def _route(self, method):
+                path = self.path.split('?')[0]
+                if path.startswith('/api'):
+                    path = path[len('/api'):]
+
+                # Routes paramétrées comptées sous leur forme générique
+                route = re.sub(r'/[0-9a-f-]{36}$', '/<id>', path)
+                with backend._lock:
+                    backend.calls[f"{method} {route}"] += 1
+
+                if backend.latency:
+                    time.sleep(backend.latency)
+
+                return path
+
+            def do_POST(self):
+                path = self._route('POST')
+                body = self._body()
+
+                if path == '/auth/login':
+                    credentials = json.loads(body or b'{}')
+                    token = jwt.encode(
+                        {'id': 'admin', 'email': credentials.get('email', ADMIN_EMAIL), 'isAdmin': True,
+                         'exp': int(time.time()) + 3600},
+                        backend.jwt_secret,
+                        algorithm='HS256'
+                    )
+                    return self._send(200, {'success': True, 'data': {'token': token, 'user': {}}})
+
+                if path == '/admin/ctfd/sync-scores':
+                    with backend._lock:
+                        backend.scores_received += 1
+                    return self._send(200, {'success': True})
+
+                return self._send(404, {'success': False})
+
+            def do_GET(self):
+                path = self._route('GET')
+
+                if path == '/admin/teams':
+                    # ?updatedSince=<ISO>: seulement les équipes modifiées depuis
+                    since = parse_qs(urlparse(self.path).query).get('updatedSince', [None])[0]
+                    teams = [team for team in backend.teams if not since or team['updatedAt'] > since]
+                    return self._send(200, {'success': True, 'data': {'teams': teams}})
+
+                match = re.match(r'^/admin/teams/([^/]+)$', path)
+                if match:
+                    team = backend.find_team(match.group(1))
+                    if team is None:
+                        return self._send(404, {'success': False})
+                    return self._send(200, {'success': True, 'data': {'team': team}})
+
+                match = re.match(r'^/admin/users/([^/]+)$', path)
+                if match:
+                    user = backend.find_user(match.group(1))
+                    if user is None:
+                        return self._send(404, {'success': False})
+                    return self._send(200, {'success': True, 'data': {'user': user}})
+
+                if path in ('', '/'):
+                    return self._send(200, {'success': True})
+
+                return self._send(404, {'success': False})
+
+            def do_PATCH(self):
+                path = self._route('PATCH')
+                body = json.loads(self._body() or b'{}')
+
+                match = re.match(r'^/admin/teams/([^/]+)$', path)
+                team = backend.find_team(match.group(1)) if match else None
+                if team is None:
+                    return self._send(404, {'success': False})
+
+                if 'ctfdTeamId' in body:
+                    team['ctfdTeamId'] = body['ctfdTeamId']
+                    team['updatedAt'] = now_iso()
+                return self._send(200, {'success': True, 'data': {'team': team}})
+
+        return Handler
+
+
+def main():
+    """Lancer le faux backend en avant-plan"""
+    port = int(sys.argv[1]) if len(sys.argv) > 1 else 5001
+    team_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    members_per_team = int(sys.argv[3]) if len(sys.argv) > 3 else 4
+
+    backend = MockRegistrationBackend(team_count, members_per_team, port=port).start()
+    print(f"✓ Faux site d'inscription sur {backend.url} ({team_count} équipes x {members_per_team} membres)")
+
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        backend.stop()
+
+
+if __name__ == '__main__':
+    main()
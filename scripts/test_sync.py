@@ -1,7 +1,47 @@
+#!/usr/bin/env python3
+"""
+Tests de la synchronisation CTFd <-> site d'inscription ACE 2025
+
+Par défaut: suite de benchmarks reproductible des plugins registration_sync
+et score_sync, contre le faux site d'inscription (mock_registration.py) et une
+application CTFd de test (SQLite temporaire, ou --database-url vers une base
+MariaDB vide). Scénarios, dans l'ordre d'un événement:
+1. first_sync       première synchronisation (base vide)
+2. noop_delta       synchronisation périodique sans changement
+3. noop_full        synchronisation complète sans changement
+4. churn_delta      synchronisation après --churn des équipes modifiées
+5. webhook_burst    webhooks signés envoyés en parallèle après un nouveau churn
+6. score_push       envoi des scores après des solves
+7. score_push_noop  envoi suivant, classement inchangé
+noop_delta et churn_delta reposent sur ?updatedSince, que seul le faux site
+implémente pour l'instant: leurs résultats ne valent pas pour le vrai site.
+Pour chacun: durée, requêtes SQL, commits, appels HTTP au site et pic
+mémoire Python (tracemalloc, --no-memory pour des durées sans surcoût).
+--save enregistre les résultats, --compare les compare à une référence et
+sort en erreur si un scénario régresse au-delà de --tolerance.
+
+À lancer dans le conteneur CTFd:
+    docker compose cp scripts/. ctfd:/tmp/bench/
+    docker compose exec ctfd python /tmp/bench/test_sync.py --teams 200 --save /tmp/bench/baseline.json
+
+--live: vérifications de connexion au vrai site d'inscription et à CTFd
+(REGISTRATION_SITE_URL, REGISTRATION_SITE_ADMIN_PASSWORD, CTFD_URL)
+"""
+
 import os
 import sys
+import hmac
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import tracemalloc
 import requests
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
 
 # Configuration
 REGISTRATION_SITE_URL = os.getenv('REGISTRATION_SITE_URL', 'http://localhost:5000/api')
@@ -10,6 +50,11 @@ ADMIN_PASSWORD = os.getenv('REGISTRATION_SITE_ADMIN_PASSWORD', '')
 
 CTFD_URL = os.getenv('CTFD_URL', 'http://localhost:8000')
 
+BENCH_WEBHOOK_SECRET = 'bench-webhook-secret'
+
+# Écarts absolus ignorés par --compare (bruit de mesure)
+COMPARE_FLOORS = {'wall_ms': 5.0, 'queries': 2, 'commits': 1, 'http_calls': 1, 'peak_kb': 256.0}
+
 
 def test_connection(url):
     """Tester la connexion à une URL"""
@@ -147,8 +192,8 @@ def test_ctfd_connection():
     return test_connection(CTFD_URL)
 
 
-def main():
-    """Fonction principale"""
+def run_live_checks():
+    """Vérifications de connexion au vrai site d'inscription"""
     print("=" * 70)
     print("TEST DE SYNCHRONISATION CTFd <-> Site d'inscription ACE 2025")
     print("=" * 70)
@@ -207,7 +252,257 @@ def main():
 
     print("=" * 70 + "\n")
 
-    sys.exit(0 if all_passed else 1)
+    return 0 if all_passed else 1
+
+
+class BenchRunner:
+    """Exécution et mesure des scénarios"""
+
+    def __init__(self, backend, counter, memory=True):
+        self.backend = backend
+        self.counter = counter
+        self.memory = memory
+        self.results = {}
+
+    def measure(self, name, func):
+        self.backend.calls.clear()
+        self.counter.reset()
+        if self.memory:
+            tracemalloc.reset_peak()
+            baseline = tracemalloc.get_traced_memory()[0]
+
+        start = time.perf_counter()
+        func()
+        wall = time.perf_counter() - start
+
+        result = {
+            'wall_ms': round(wall * 1000, 1),
+            'queries': self.counter.queries,
+            'commits': self.counter.commits,
+            'http_calls': sum(self.backend.calls.values()),
+            'http_routes': dict(self.backend.calls)
+        }
+        if self.memory:
+            result['peak_kb'] = round((tracemalloc.get_traced_memory()[1] - baseline) / 1024, 1)
+
+        self.results[name] = result
+        peak = f"{result['peak_kb'] / 1024:7.1f} Mo" if self.memory else '      -'
+        print(f"  {name:<17} {result['wall_ms']:10.1f} ms {result['queries']:8d} {result['commits']:8d} "
+              f"{result['http_calls']:6d} {peak}")
+        return result
+
+
+def sign(body):
+    return hmac.new(BENCH_WEBHOOK_SECRET.encode(), body, hashlib.sha256).hexdigest()
+
+
+def send_webhooks(url, events, concurrency):
+    """Envoyer des webhooks signés en parallèle; retourne les statuts HTTP"""
+    def send(event):
+        body = json.dumps(dict(event, timestamp=time.time())).encode('utf-8')
+        response = requests.post(
+            url,
+            data=body,
+            headers={'Content-Type': 'application/json', 'X-Webhook-Signature': sign(body)},
+            timeout=120
+        )
+        return response.status_code
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        return list(pool.map(send, events))
+
+
+def seed_solves(app, rng, challenge_count):
+    """Créer des challenges et des solves (une partie des challenges par équipe), hors mesure"""
+    from CTFd.models import db, Challenges, Solves, Teams, Users
+    from CTFd.cache import clear_standings
+
+    with app.app_context():
+        challenges = [
+            Challenges(name=f"Bench {index}", category='bench', description='bench',
+                       value=rng.choice([50, 100, 200, 500]), state='visible', type='standard')
+            for index in range(challenge_count)
+        ]
+        db.session.add_all(challenges)
+        db.session.flush()
+
+        members = {}
+        for user_id, team_id in db.session.query(Users.id, Users.team_id).filter(Users.team_id.isnot(None)):
+            members.setdefault(team_id, []).append(user_id)
+
+        solves = []
+        for (team_id,) in db.session.query(Teams.id).order_by(Teams.id):
+            if team_id not in members:
+                continue
+            for challenge in rng.sample(challenges, rng.randint(0, challenge_count)):
+                solves.append(Solves(
+                    user_id=rng.choice(members[team_id]),
+                    team_id=team_id,
+                    challenge_id=challenge.id,
+                    ip='127.0.0.1',
+                    provided='bench'
+                ))
+
+        db.session.add_all(solves)
+        db.session.commit()
+        clear_standings()
+        return len(solves)
+
+
+def compare(results, baseline, tolerance):
+    """Régressions par rapport à la référence [(scénario, métrique, référence, mesure)]"""
+    regressions = []
+    for name, result in results.items():
+        reference = baseline.get('results', {}).get(name)
+        if reference is None:
+            continue
+        for metric, floor in COMPARE_FLOORS.items():
+            if metric not in result or metric not in reference:
+                continue
+            limit = reference[metric] * (1 + tolerance)
+            if result[metric] > limit and result[metric] - reference[metric] > floor:
+                regressions.append((name, metric, reference[metric], result[metric]))
+    return regressions
+
+
+def run_benchmarks(args):
+    """Suite de benchmarks contre le faux site d'inscription"""
+    from mock_registration import MockRegistrationBackend
+
+    rng = random.Random(args.seed)
+    backend = MockRegistrationBackend(args.teams, args.members, latency=args.latency).start()
+
+    # Les plugins lisent leur configuration à l'import
+    os.environ['REGISTRATION_SITE_URL'] = backend.url
+    os.environ['JWT_SECRET'] = backend.jwt_secret
+    os.environ['WEBHOOK_SECRET'] = BENCH_WEBHOOK_SECRET
+
+    from bench_sso_login import create_test_app, QueryCounter, BENCH_DIR
+    from werkzeug.serving import make_server
+
+    database = None
+    database_url = args.database_url
+    if not database_url:
+        database = tempfile.NamedTemporaryFile(suffix='.db', dir=BENCH_DIR, delete=False)
+        database_url = f"sqlite:///{database.name}"
+
+    app = create_test_app(database_url)
+
+    with app.app_context():
+        from CTFd.models import db
+        from CTFd.plugins.registration_sync import sync_teams_from_registration_site
+        from CTFd.plugins.score_sync import sync_scores_to_registration_site
+        counter = QueryCounter(db.engine)
+
+    # Webhooks reçus en HTTP, plusieurs à la fois, comme en production
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    webhook_url = f"http://127.0.0.1:{server.server_port}/api/registration-sync/webhook"
+
+    if not args.no_memory:
+        tracemalloc.start()
+
+    print(f"\n{'='*70}")
+    print(f"BENCHMARKS SYNCHRONISATION: {args.teams} équipes x {args.members} membres, "
+          f"churn {args.churn:.0%}, graine {args.seed}")
+    print(f"Base: {database_url.split('@')[-1]}")
+    print(f"{'='*70}")
+    print(f"  {'scénario':<17} {'durée':>13} {'SQL':>8} {'commits':>8} {'HTTP':>6} {'pic mém.':>10}")
+
+    runner = BenchRunner(backend, counter, memory=not args.no_memory)
+    failures = []
+
+    with app.app_context():
+        runner.measure('first_sync', lambda: sync_teams_from_registration_site(full=True))
+        runner.measure('noop_delta', lambda: sync_teams_from_registration_site(full=False))
+        runner.measure('noop_full', lambda: sync_teams_from_registration_site(full=True))
+
+        backend.churn(args.churn, rng)
+        runner.measure('churn_delta', lambda: sync_teams_from_registration_site(full=False))
+
+        events = backend.churn(args.churn, rng)
+        statuses = []
+        runner.measure('webhook_burst', lambda: statuses.extend(send_webhooks(webhook_url, events, args.concurrency)))
+        if any(status != 200 for status in statuses):
+            failures.append(f"webhooks: statuts {sorted(set(statuses))}")
+        runner.results['webhook_burst']['webhooks'] = len(events)
+
+        solves = seed_solves(app, rng, args.challenges)
+        runner.measure('score_push', sync_scores_to_registration_site)
+        runner.measure('score_push_noop', sync_scores_to_registration_site)
+
+        # Contrôles de cohérence: toutes les équipes du site existent dans CTFd
+        from CTFd.models import Teams
+        team_count = Teams.query.count()
+        if team_count != len(backend.teams):
+            failures.append(f"{team_count} équipes dans CTFd pour {len(backend.teams)} sur le site")
+        if backend.scores_received < 1:
+            failures.append("aucun envoi de scores reçu par le site")
+
+    server.shutdown()
+    backend.stop()
+    if database is not None:
+        os.unlink(database.name)
+
+    print(f"{'='*70}")
+    print(f"  {len(events)} webhooks (concurrence {args.concurrency}), {solves} solves sur {args.challenges} challenges")
+
+    status = 0
+    for failure in failures:
+        print(f"✗ {failure}")
+        status = 1
+
+    report = {
+        'config': {key: getattr(args, key) for key in ('teams', 'members', 'churn', 'seed', 'challenges', 'concurrency')},
+        'database': database_url.split(':', 1)[0],
+        'results': runner.results
+    }
+
+    if args.save:
+        with open(args.save, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"✓ Résultats enregistrés dans {args.save}")
+
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+        if baseline.get('config') != report['config']:
+            print(f"⚠ Configuration différente de la référence: {baseline.get('config')}")
+        regressions = compare(runner.results, baseline, args.tolerance)
+        if regressions:
+            print(f"✗ {len(regressions)} régression(s) au-delà de {args.tolerance:.0%}:")
+            for name, metric, reference, measured in regressions:
+                print(f"    - {name} {metric}: {reference} -> {measured}")
+            status = 1
+        else:
+            print(f"✓ Aucune régression par rapport à {args.compare} (tolérance {args.tolerance:.0%})")
+
+    print()
+    return status
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Tests et benchmarks de la synchronisation CTFd <-> site d'inscription")
+    parser.add_argument('--live', action='store_true', help="vérifier la connexion au vrai site (pas de benchmark)")
+    parser.add_argument('--teams', type=int, default=200)
+    parser.add_argument('--members', type=int, default=4)
+    parser.add_argument('--churn', type=float, default=0.10, help="fraction des équipes modifiées par churn")
+    parser.add_argument('--challenges', type=int, default=20, help="challenges du scénario des scores")
+    parser.add_argument('--concurrency', type=int, default=5, help="webhooks envoyés en parallèle")
+    parser.add_argument('--latency', type=float, default=0.0, help="latence ajoutée par le faux site (s)")
+    parser.add_argument('--seed', type=int, default=2025)
+    parser.add_argument('--database-url', help="base CTFd vide (défaut: SQLite temporaire)")
+    parser.add_argument('--no-memory', action='store_true', help="sans tracemalloc (durées sans surcoût)")
+    parser.add_argument('--save', help="enregistrer les résultats (JSON)")
+    parser.add_argument('--compare', help="comparer à des résultats enregistrés")
+    parser.add_argument('--tolerance', type=float, default=0.25, help="écart toléré par --compare")
+    return parser.parse_args()
+
+
+def main():
+    """Fonction principale"""
+    args = parse_args()
+    sys.exit(run_live_checks() if args.live else run_benchmarks(args))
 
 
 if __name__ == '__main__':